@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+cancel_job.py - POST /jobs/<job_id>/cancel：取消异步任务
+Worker收到取消请求后停止执行并返回，未及时响应时被终止；已结束的任务（包括插件重启后从插件存储恢复的）原样返回当前状态
+"""
+
+from collections.abc import Mapping
+
+from dify_plugin import Endpoint
+from werkzeug import Request, Response
+
+from endpoints.jobs_common import PERSISTENCE_NOTE, check_access, error_response, json_response, plugin_storage
+from tools.job_manager import get_job_manager
+
+
+class CancelJobEndpoint(Endpoint):
+    def _invoke(self, r: Request, values: Mapping, settings: Mapping) -> Response:
+        denied = check_access(r, settings)
+        if denied is not None:
+            return denied
+
+        job = get_job_manager().cancel(values.get("job_id", ""), plugin_storage(self))
+        if job is None:
+            return error_response("任务不存在或已过期", 404)
+        snapshot = job.snapshot()
+        return json_response({
+            "job_id": job.job_id,
+            "status": job.status,
+            "cancel_requested": job.cancel_requested,
+            "result": snapshot["result"],
+            "persisted": job.persisted,
+            "persistence": PERSISTENCE_NOTE,
+        }, 202 if not job.finished else 200)
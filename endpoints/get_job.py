@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+get_job.py - GET /jobs/<job_id>：查询异步任务的状态、进度（部分结果）和最终结果
+?since=N只返回序号不小于N的进度，下次查询时传入响应中的next_event即可增量获取
+"""
+
+from collections.abc import Mapping
+
+from dify_plugin import Endpoint
+from werkzeug import Request, Response
+
+from endpoints.jobs_common import check_access, error_response, int_arg, json_response, plugin_storage
+from tools.job_manager import get_job_manager
+
+
+class GetJobEndpoint(Endpoint):
+    def _invoke(self, r: Request, values: Mapping, settings: Mapping) -> Response:
+        denied = check_access(r, settings)
+        if denied is not None:
+            return denied
+
+        job = get_job_manager().get(values.get("job_id", ""), plugin_storage(self))
+        if job is None:
+            return error_response("任务不存在或已过期", 404)
+        return json_response(job.snapshot(since=int_arg(r, "since")))
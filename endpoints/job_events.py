@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+job_events.py - GET /jobs/<job_id>/events：以Server-Sent Events推送异步任务的进度
+事件类型: progress（每个Agent步骤，id为进度序号）、result（最终状态和结果，之后连接关闭）；
+空闲时定期发送注释行保持连接。断线重连时通过Last-Event-ID请求头或?since=N从指定序号继续
+"""
+
+import json
+from collections.abc import Generator, Mapping
+
+from dify_plugin import Endpoint
+from werkzeug import Request, Response
+
+from endpoints.jobs_common import check_access, error_response, int_arg, plugin_storage
+from tools.job_manager import Job, get_job_manager
+
+# 没有新进度时发送保活注释的间隔（秒）
+KEEPALIVE_INTERVAL = 15.0
+
+
+def _event(name: str, data: dict, event_id: int = None) -> str:
+    lines = [f"event: {name}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+
+class JobEventsEndpoint(Endpoint):
+    def _invoke(self, r: Request, values: Mapping, settings: Mapping) -> Response:
+        denied = check_access(r, settings)
+        if denied is not None:
+            return denied
+
+        manager = get_job_manager()
+        storage = plugin_storage(self)
+        job = manager.get(values.get("job_id", ""), storage)
+        if job is None:
+            return error_response("任务不存在或已过期", 404)
+        last_event_id = r.headers.get("Last-Event-ID", "")
+        since = int(last_event_id) + 1 if last_event_id.isdigit() else int_arg(r, "since")
+
+        def stream(job: Job, since: int) -> Generator[str, None, None]:
+            while True:
+                snapshot = job.snapshot(since=since)
+                first_id = snapshot["next_event"] - len(snapshot["progress"])
+                for offset, event in enumerate(snapshot["progress"]):
+                    yield _event("progress", event, first_id + offset)
+                since = snapshot["next_event"]
+                if job.finished:
+                    manager.persist(job, storage)
+                    yield _event("result", {"job_id": job.job_id, "status": job.status, "result": job.result})
+                    return
+                if not manager.wait(job, since, KEEPALIVE_INTERVAL):
+                    yield ": keepalive\n\n"
+
+        return Response(stream(job, since), status=200, content_type="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
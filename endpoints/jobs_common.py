@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+jobs_common.py - 异步任务端点的公共部分：访问密钥校验、JSON响应和任务查询
+"""
+
+import hashlib
+import hmac
+import json
+from collections.abc import Mapping
+from typing import Any, Optional
+
+from werkzeug import Request, Response
+
+from tools.task_scheduler import PRIORITY_BATCH, PRIORITY_INTERACTIVE
+
+# 结果是延迟持久化的（见tools/job_manager.py），提交和取消的响应里说明这一点
+PERSISTENCE_NOTE = "任务结束后，结果在下一次查询、进度流或取消请求时才写入插件存储；在此之前插件重启会丢失结果"
+
+
+def json_response(data: dict, status: int = 200) -> Response:
+    return Response(json.dumps(data, ensure_ascii=False), status=status, content_type="application/json")
+
+
+def error_response(error: str, status: int) -> Response:
+    return json_response({"success": False, "error": error}, status)
+
+
+def check_access(r: Request, settings: Mapping) -> Optional[Response]:
+    """配置了访问密钥时校验Authorization: Bearer请求头，失败返回401响应"""
+    api_key = settings.get("api_key") or ""
+    if not api_key:
+        return None
+    header = r.headers.get("Authorization", "")
+    token = header[7:].strip() if header.lower().startswith("bearer ") else ""
+    if not token or not hmac.compare_digest(token.encode("utf-8"), api_key.encode("utf-8")):
+        return error_response("访问密钥无效", 401)
+    return None
+
+
+def job_tenant(settings: Mapping) -> str:
+    """
+    公平排队的租户标识，由服务端决定而不是取自请求体：同一访问密钥的调用方共用一个租户，
+    密钥只以哈希形式出现在调度统计中；未配置密钥时所有调用方共用endpoint租户
+    """
+    api_key = settings.get("api_key") or ""
+    if not api_key:
+        return "endpoint"
+    return "endpoint:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+
+
+def job_priority(body: dict, settings: Mapping) -> str:
+    """异步任务按batch调度，只有端点设置允许时才接受请求体中的interactive"""
+    if settings.get("allow_interactive") and body.get("priority") == PRIORITY_INTERACTIVE:
+        return PRIORITY_INTERACTIVE
+    return PRIORITY_BATCH
+
+
+def plugin_storage(endpoint: Any):
+    """Dify插件持久化存储，不可用时（如本地调试）返回None，任务结果只保留在内存中"""
+    try:
+        return endpoint.session.storage
+    except Exception:
+        return None
+
+
+def int_arg(r: Request, name: str, default: int = 0) -> int:
+    try:
+        return max(0, int(r.args.get(name, default)))
+    except (TypeError, ValueError):
+        return default
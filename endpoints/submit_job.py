@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+submit_job.py - POST /jobs：提交异步浏览器任务，立即返回job_id
+请求体为JSON，字段与dify_browseruse工具参数相同（query必填，另可传max_steps、max_wall_seconds、max_llm_tokens、
+fast_path、dom_token_budget、action_replay、block_preset、block_allow、block_deny）；LLM端点配置来自端点设置
+任务按batch优先级调度，端点设置开启allow_interactive时可传priority=interactive；公平排队的租户由访问密钥决定，见jobs_common.py；
+Worker池排队已满时返回429和Retry-After；结果延迟持久化，见响应中的persistence
+"""
+
+from collections.abc import Mapping
+
+from dify_plugin import Endpoint
+from werkzeug import Request, Response
+
+from endpoints.jobs_common import (PERSISTENCE_NOTE, check_access, error_response, job_priority, job_tenant,
+                                   json_response)
+from tools.dify_browseruse import build_task_options
+from tools.job_manager import get_job_manager
+from tools.llm_client import LLMConfig
+from tools.worker_pool import WORKER_SCRIPT, get_worker_pool
+
+
+class SubmitJobEndpoint(Endpoint):
+    def _invoke(self, r: Request, values: Mapping, settings: Mapping) -> Response:
+        denied = check_access(r, settings)
+        if denied is not None:
+            return denied
+
+        body = r.get_json(silent=True)
+        if not isinstance(body, dict):
+            return error_response("请求体必须是JSON对象", 400)
+        query = str(body.get("query") or "").strip()
+        if not query:
+            return error_response("查询指令不能为空", 400)
+        if not WORKER_SCRIPT.exists():
+            return error_response(f"找不到browser_worker_file.py文件，路径: {WORKER_SCRIPT}", 500)
+
+        try:
+            task_options, task_timeout = build_task_options(body, LLMConfig.from_credentials(settings))
+        except (TypeError, ValueError) as e:
+            return error_response(f"任务参数无效: {str(e)}", 400)
+        tenant = job_tenant(settings)
+        priority = job_priority(body, settings)
+        busy = get_worker_pool().check_busy(tenant)
+        if busy is not None:
+            response = json_response({"success": False, "error": f"{busy}，请{busy.retry_after}秒后重试",
+                                      "retry_after": busy.retry_after}, 429)
+            response.headers["Retry-After"] = str(busy.retry_after)
+            return response
+        job = get_job_manager().submit({"query": query, **task_options}, timeout=task_timeout,
+                                       tenant=tenant, priority=priority)
+        return json_response({
+            "job_id": job.job_id,
+            "status": job.status,
+            "status_url": f"/jobs/{job.job_id}",
+            "events_url": f"/jobs/{job.job_id}/events",
+            "cancel_url": f"/jobs/{job.job_id}/cancel",
+            "persistence": PERSISTENCE_NOTE,
+        }, 202)
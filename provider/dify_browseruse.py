@@ -3,12 +3,15 @@ from typing import Any
 from dify_plugin import ToolProvider
 from dify_plugin.errors.tool import ToolProviderCredentialValidationError
 
+from tools.llm_client import LLMConfig, probe_endpoint
+
 
 class DifyBrowseruseProvider(ToolProvider):
     def _validate_credentials(self, credentials: dict[str, Any]) -> None:
         try:
-            """
-            IMPLEMENT YOUR VALIDATION HERE
-            """
+            # 向LLM端点发送一次最小请求，确认地址、模型和密钥可用
+            config = LLMConfig.from_credentials(credentials)
+            latency = probe_endpoint(config)
+            print(f"✅ LLM端点可用: {config.base_url}（{config.model}），延迟{latency * 1000:.0f}ms")
         except Exception as e:
             raise ToolProviderCredentialValidationError(str(e))
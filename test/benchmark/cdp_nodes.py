@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+cdp_nodes.py - 以本机无头Chromium模拟远程浏览器节点（见tools/browser_nodes.py）
+每个节点是一个以--remote-debugging-port启动的独立Chromium进程，Worker通过BROWSER_CDP_NODES以CDP连接：
+  - serve:    只启动节点并输出BROWSER_CDP_NODES的值，供手动运行插件或其他基准测试使用，Ctrl+C退出
+  - failover: 启动节点、本地测试站点和模拟LLM服务，在Worker池上并发执行任务，中途杀掉一个节点，
+              检查所有任务仍然成功，并统计各节点承担的任务数和换节点重试的次数
+用法: python test/benchmark/cdp_nodes.py serve --nodes 2
+      python test/benchmark/cdp_nodes.py failover --nodes 2 --tasks 8 --kill-after 5 [--output cdp_result.json]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+
+BENCHMARK_DIR = Path(__file__).parent
+REPO_ROOT = BENCHMARK_DIR.parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+sys.path.insert(0, str(BENCHMARK_DIR))
+
+from fixture_site import FixtureSite
+from mock_llm import MockLLMServer
+from run_benchmark import SCENARIOS, git_commit
+from tools.process_reaper import kill_process_tree
+
+NODE_START_TIMEOUT = 20.0
+DEFAULT_BASE_PORT = 9300
+
+
+def chromium_executable() -> str:
+    """Playwright安装的Chromium，可通过CHROMIUM_PATH指定其他Chromium"""
+    if os.environ.get("CHROMIUM_PATH"):
+        return os.environ["CHROMIUM_PATH"]
+    from playwright.sync_api import sync_playwright
+    with sync_playwright() as playwright:
+        return playwright.chromium.executable_path
+
+
+class LocalChromiumNode:
+    """本机以远程调试端口启动的无头Chromium，对Worker而言与远程节点相同"""
+
+    def __init__(self, port: int, executable: str):
+        self.port = port
+        self.executable = executable
+        self.process: Optional[subprocess.Popen] = None
+        self.user_data_dir = ""
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self) -> "LocalChromiumNode":
+        self.user_data_dir = tempfile.mkdtemp(prefix=f"cdp_node_{self.port}_")
+        self.process = subprocess.Popen([
+            self.executable,
+            "--headless=new",
+            f"--remote-debugging-port={self.port}",
+            "--remote-debugging-address=127.0.0.1",
+            f"--user-data-dir={self.user_data_dir}",
+            "--no-sandbox",
+            "--disable-gpu",
+            "--disable-dev-shm-usage",
+            "--no-first-run",
+            "about:blank",
+        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+        deadline = time.monotonic() + NODE_START_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Chromium节点启动失败，返回码: {self.process.returncode}")
+            try:
+                with urllib.request.urlopen(f"{self.url}/json/version", timeout=1):
+                    return self
+            except OSError:
+                time.sleep(0.2)
+        self.stop()
+        raise RuntimeError(f"Chromium节点启动超时（{int(NODE_START_TIMEOUT)}秒）: {self.url}")
+
+    def stop(self) -> None:
+        if self.process is not None and self.process.poll() is None:
+            kill_process_tree(self.process.pid)
+            self.process.wait()
+        if self.user_data_dir:
+            shutil.rmtree(self.user_data_dir, ignore_errors=True)
+            self.user_data_dir = ""
+
+
+def start_nodes(count: int, base_port: int) -> list[LocalChromiumNode]:
+    executable = chromium_executable()
+    nodes = []
+    try:
+        for index in range(count):
+            nodes.append(LocalChromiumNode(base_port + index, executable).start())
+            print(f"🌐 Chromium节点已启动: {nodes[-1].url}")
+    except Exception:
+        for node in nodes:
+            node.stop()
+        raise
+    return nodes
+
+
+def run_serve(args) -> int:
+    nodes = start_nodes(args.nodes, args.base_port)
+    print(f"\nBROWSER_CDP_NODES={','.join(node.url for node in nodes)}\n按Ctrl+C退出")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for node in nodes:
+            node.stop()
+    return 0
+
+
+def run_failover(args) -> int:
+    nodes = start_nodes(args.nodes, args.base_port)
+    site = FixtureSite().start()
+    llm = MockLLMServer(latency=args.llm_latency).start()
+    # Worker池启动的Worker继承这些环境变量，连接本地节点和模拟服务
+    os.environ["BROWSER_CDP_NODES"] = ",".join(node.url for node in nodes)
+    os.environ["BROWSER_NODE_HEALTH_INTERVAL"] = "1"
+    os.environ["BROWSER_LLM_BASE_URL"] = llm.base_url
+    os.environ["BROWSER_LLM_MODEL"] = "DeepSeek"
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+    from tools.worker_pool import WorkerPool
+
+    query = SCENARIOS[args.scenario].format(url=site.url, tls_url=site.tls_url)
+    pool = WorkerPool(size=args.workers)
+    results: list[dict] = []
+    lock = threading.Lock()
+
+    def run_one(index: int) -> None:
+        started = time.monotonic()
+        result = pool.submit({"task_id": f"cdp-{index}", "query": query, "fast_path": False,
+                              "max_wall_seconds": 120}, timeout=150)
+        with lock:
+            results.append({
+                "index": index,
+                "success": bool(result.get("success")),
+                "error": result.get("error") or "",
+                "latency_s": round(time.monotonic() - started, 3),
+                "node": (result.get("browser") or {}).get("node"),
+                "node_failovers": result.get("node_failovers", []),
+            })
+
+    killed = None
+    started = time.time()
+    try:
+        pool.prewarm()
+        threads = [threading.Thread(target=run_one, args=(index,)) for index in range(args.tasks)]
+        for thread in threads:
+            thread.start()
+        if args.kill_after >= 0 and nodes:
+            time.sleep(args.kill_after)
+            killed = nodes[0].url
+            print(f"💥 杀掉节点: {killed}")
+            nodes[0].stop()
+        for thread in threads:
+            thread.join()
+    finally:
+        pool.shutdown()
+        llm.stop()
+        site.stop()
+        for node in nodes:
+            node.stop()
+
+    succeeded = sum(result["success"] for result in results)
+    report = {
+        **git_commit(),
+        "duration_s": round(time.time() - started, 1),
+        "nodes": [node.url for node in nodes],
+        "killed_node": killed,
+        "tasks": len(results),
+        "succeeded": succeeded,
+        "tasks_by_node": dict(Counter(result["node"] for result in results)),
+        "failovers": sum(len(result["node_failovers"]) for result in results),
+        "results": sorted(results, key=lambda result: result["index"]),
+    }
+    Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"\n📊 成功{succeeded}/{len(results)}，各节点任务数: {report['tasks_by_node']}，换节点重试: {report['failovers']}次")
+    print(f"💾 结果已写入: {args.output}")
+    if succeeded < len(results):
+        for result in results:
+            if not result["success"]:
+                print(f"  ❌ #{result['index']} {result['error']}")
+        return 1
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="以本机无头Chromium模拟远程浏览器节点")
+    parser.add_argument("mode", choices=("serve", "failover"))
+    parser.add_argument("--nodes", type=int, default=2)
+    parser.add_argument("--base-port", type=int, default=DEFAULT_BASE_PORT)
+    parser.add_argument("--workers", type=int, default=2, help="failover: Worker池大小")
+    parser.add_argument("--tasks", type=int, default=8, help="failover: 并发执行的任务数")
+    parser.add_argument("--scenario", choices=tuple(SCENARIOS), default="slow")
+    parser.add_argument("--kill-after", type=float, default=5.0, help="failover: 开始后多少秒杀掉第一个节点，负数表示不杀")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="模拟LLM每次响应的延迟（秒）")
+    parser.add_argument("--output", default="cdp_result.json")
+    args = parser.parse_args()
+    return run_serve(args) if args.mode == "serve" else run_failover(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
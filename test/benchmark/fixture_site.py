@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+fixture_site.py - 基准测试用的本地站点
+在127.0.0.1上提供固定内容的测试页面，不依赖外网和内网系统：
+  /article   长文章
+  /table     大表格（500行）
+  /form      表单，提交后跳转到/form/result
+  /slow      引用了慢速脚本、样式和图片的页面
+  HTTPS端口上的所有页面使用自签名证书，用于模拟证书告警页面
+单独运行: python fixture_site.py [--port 8765]
+"""
+
+import argparse
+import html
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+SLOW_ASSET_DELAY = 1.5
+TABLE_ROWS = 500
+ARTICLE_PARAGRAPHS = 120
+
+
+def _page(title: str, body: str, head: str = "") -> bytes:
+    return (f"<!DOCTYPE html><html lang='zh'><head><meta charset='utf-8'><title>{html.escape(title)}</title>"
+            f"{head}</head><body>{body}</body></html>").encode("utf-8")
+
+
+def article_page() -> bytes:
+    paragraphs = "".join(
+        f"<p>第{i}段：这是基准测试用的长文章内容，用于衡量页面提取和元素列表序列化的开销。"
+        f"Paragraph {i} of the benchmark article, repeated to make the page long.</p>"
+        for i in range(1, ARTICLE_PARAGRAPHS + 1)
+    )
+    return _page("基准测试文章", f"<article><h1>基准测试文章</h1>{paragraphs}</article>")
+
+
+def table_page() -> bytes:
+    rows = "".join(
+        f"<tr><td>{i}</td><td><a href='/table/{i}'>项目{i}</a></td><td>{i * 37 % 1000}</td></tr>"
+        for i in range(1, TABLE_ROWS + 1)
+    )
+    return _page("基准测试表格", f"<h1>基准测试表格</h1><table><tr><th>编号</th><th>名称</th><th>数值</th></tr>"
+                           f"{rows}</table>")
+
+
+def form_page() -> bytes:
+    return _page("基准测试表单", "<h1>基准测试表单</h1><form action='/form/result' method='get'>"
+                           "<input name='q' placeholder='关键词'><button type='submit'>提交</button></form>")
+
+
+def form_result_page(query: str) -> bytes:
+    return _page("提交结果", f"<h1>提交结果</h1><p id='result'>收到关键词: {html.escape(query)}</p>")
+
+
+def slow_page() -> bytes:
+    head = "<link rel='stylesheet' href='/asset/slow.css'><script src='/asset/slow.js'></script>"
+    images = "".join(f"<img src='/asset/slow-{i}.png' width='10' height='10'>" for i in range(5))
+    return _page("慢速资源页面", f"<h1>慢速资源页面</h1><p>页面引用了多个延迟返回的资源。</p>{images}", head)
+
+
+# 1x1透明PNG
+PNG_PIXEL = bytes.fromhex(
+    "89504e470d0a1a0a0000000d49484452000000010000000108060000001f15c4890000000d49444154789c63f8ffff3f0005fe02fea7d6"
+    "a4db0000000049454e44ae426082"
+)
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def _send(self, body: bytes, content_type: str = "text/html; charset=utf-8", cache: str = "no-store") -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", cache)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        parts = urlsplit(self.path)
+        path = parts.path
+        if path in ("/", "/article"):
+            self._send(article_page())
+        elif path == "/table":
+            self._send(table_page())
+        elif path.startswith("/table/"):
+            self._send(_page("表格详情", f"<h1>项目{html.escape(path.rsplit('/', 1)[-1])}</h1>"))
+        elif path == "/form":
+            self._send(form_page())
+        elif path == "/form/result":
+            self._send(form_result_page(parse_qs(parts.query).get("q", [""])[0]))
+        elif path == "/slow":
+            self._send(slow_page())
+        elif path.startswith("/asset/"):
+            time.sleep(SLOW_ASSET_DELAY)
+            cache = "public, max-age=3600"
+            if path.endswith(".css"):
+                self._send(b"body{font-family:sans-serif}", "text/css", cache)
+            elif path.endswith(".js"):
+                self._send(b"window.slowLoaded=true;", "application/javascript", cache)
+            else:
+                self._send(PNG_PIXEL, "image/png", cache)
+        else:
+            self.send_error(404)
+
+
+def _self_signed_cert(directory: Path) -> tuple[Path, Path]:
+    """用openssl生成localhost的自签名证书"""
+    cert, key = directory / "cert.pem", directory / "key.pem"
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-subj", "/CN=localhost", "-keyout", str(key), "-out", str(cert)],
+        check=True, capture_output=True,
+    )
+    return cert, key
+
+
+class FixtureSite:
+    """后台线程中运行的HTTP与HTTPS测试站点"""
+
+    def __init__(self, port: int = 0, tls_port: int = 0):
+        self.http = ThreadingHTTPServer(("127.0.0.1", port), FixtureHandler)
+        self.https = ThreadingHTTPServer(("127.0.0.1", tls_port), FixtureHandler)
+        self._tmp = tempfile.TemporaryDirectory(prefix="fixture_tls_")
+        cert, key = _self_signed_cert(Path(self._tmp.name))
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        self.https.socket = context.wrap_socket(self.https.socket, server_side=True)
+        self._threads = []
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.http.server_address[1]}"
+
+    @property
+    def tls_url(self) -> str:
+        return f"https://localhost:{self.https.server_address[1]}"
+
+    def start(self) -> "FixtureSite":
+        for server in (self.http, self.https):
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self) -> None:
+        for server in (self.http, self.https):
+            server.shutdown()
+            server.server_close()
+        self._tmp.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="基准测试本地站点")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--tls-port", type=int, default=8766)
+    args = parser.parse_args()
+    site = FixtureSite(args.port, args.tls_port).start()
+    print(f"🌐 测试站点: {site.url}  {site.tls_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        site.stop()
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+load_test.py - 并发负载与长时间浸泡测试
+使用与run_benchmark.py相同的本地测试站点和模拟LLM服务，按指定到达率并发调用DifyBrowseruseTool._invoke：
+  - 负载: 吞吐量、端到端耗时p50/p95/p99、Worker池排队时间、失败率与超时率
+  - 浸泡: 定期采样进程数、Chromium僵尸进程、残留的browser_task_*.json临时文件、打开的文件描述符
+          和总RSS，运行结束并排空后与预热后的基线对比，发现泄漏时以非零状态退出
+用法: python test/benchmark/load_test.py --rate 2 --concurrency 20 --duration 3600
+      python test/benchmark/load_test.py --requests 50 --concurrency 10
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import psutil
+
+BENCHMARK_DIR = Path(__file__).parent
+REPO_ROOT = BENCHMARK_DIR.parent.parent
+sys.path.insert(0, str(BENCHMARK_DIR))
+sys.path.insert(0, str(REPO_ROOT))
+
+from fixture_site import FixtureSite
+from mock_llm import MockLLMServer
+from run_benchmark import SCENARIOS, git_commit
+
+CHROMIUM_PROCESS_NAMES = ("chrome", "chromium", "headless_shell")
+TIMEOUT_ERRORS = ("执行超时", "等待空闲Worker超时", "等待任务结果超时")
+# 排空后等待Worker回收浏览器上下文和子进程的时间（秒）
+SETTLE_SECONDS = 10
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * p / 100
+    low, high = int(k), min(int(k) + 1, len(ordered) - 1)
+    return round(ordered[low] + (ordered[high] - ordered[low]) * (k - low), 3)
+
+
+def resource_sample() -> dict:
+    """当前进程树的资源占用；Worker和Chromium都是本进程的子孙进程"""
+    me = psutil.Process()
+    processes = [me]
+    try:
+        processes += me.children(recursive=True)
+    except psutil.Error:
+        pass
+    sample = {"t": round(time.time(), 1), "processes": 0, "chromium": 0, "zombies": 0, "open_fds": 0, "rss_mb": 0.0}
+    for process in processes:
+        try:
+            status = process.status()
+            sample["processes"] += 1
+            if status == psutil.STATUS_ZOMBIE:
+                sample["zombies"] += 1
+                continue
+            if any(name in process.name().lower() for name in CHROMIUM_PROCESS_NAMES):
+                sample["chromium"] += 1
+            sample["rss_mb"] += process.memory_info().rss / (1024 * 1024)
+            sample["open_fds"] += process.num_fds()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+    sample["rss_mb"] = round(sample["rss_mb"], 1)
+    sample["temp_files"] = len(list(Path(tempfile.gettempdir()).glob("browser_task_*.json")))
+    return sample
+
+
+def rss_slope_mb_per_hour(samples: list[dict]) -> float:
+    """最小二乘拟合的RSS增长率"""
+    if len(samples) < 3:
+        return 0.0
+    xs = [s["t"] for s in samples]
+    ys = [s["rss_mb"] for s in samples]
+    mean_x, mean_y = statistics.fmean(xs), statistics.fmean(ys)
+    var_x = sum((x - mean_x) ** 2 for x in xs)
+    if var_x == 0:
+        return 0.0
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var_x
+    return round(slope * 3600, 1)
+
+
+class ResourceMonitor:
+    """后台线程按固定间隔采样资源"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples: list[dict] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.samples.append(resource_sample())
+            self._stop.wait(self.interval)
+
+    def start(self) -> "ResourceMonitor":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def invoke_once(query: str, arrived_at: float) -> dict:
+    """在工作线程中执行一次完整的_invoke调用，耗时从任务到达开始计算（包含压测端排队）"""
+    from tools.dify_browseruse import DifyBrowseruseTool
+
+    started_at = time.monotonic()
+    result = {}
+    try:
+        tool = DifyBrowseruseTool.from_credentials({})
+        for message in tool._invoke({"query": query, "cache": "bypass"}):
+            if message.type == message.MessageType.JSON:
+                result = message.message.json_object
+    except Exception as e:
+        result = {"success": False, "error": f"压测调用异常: {e}"}
+    error = result.get("error") or ""
+    return {
+        "latency_s": time.monotonic() - arrived_at,
+        "client_wait_s": started_at - arrived_at,
+        "queue_wait_ms": (result.get("pool") or {}).get("queue_wait_ms", 0.0),
+        "success": bool(result.get("success")),
+        "timeout": any(marker in error for marker in TIMEOUT_ERRORS),
+        "error": error,
+    }
+
+
+def run_load(queries: list[str], rate: float, concurrency: int, duration: float, total: int) -> tuple[list[dict], float]:
+    """按泊松到达（平均rate个/秒）提交任务，达到duration秒或total个任务后停止提交并等待全部完成"""
+    outcomes: list[dict] = []
+    lock = threading.Lock()
+    started = time.monotonic()
+    submitted = 0
+
+    def record(future) -> None:
+        with lock:
+            outcomes.append(future.result())
+            done = len(outcomes)
+        if done % 10 == 0:
+            print(f"📈 已完成 {done} 个任务，已运行 {time.monotonic() - started:.0f}s")
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="load") as executor:
+        next_arrival = started
+        while (not duration or time.monotonic() - started < duration) and (not total or submitted < total):
+            delay = next_arrival - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            query = queries[submitted % len(queries)]
+            executor.submit(invoke_once, query, time.monotonic()).add_done_callback(record)
+            submitted += 1
+            next_arrival += random.expovariate(rate) if rate > 0 else 0
+    return outcomes, time.monotonic() - started
+
+
+def summarize_load(outcomes: list[dict], elapsed: float) -> dict:
+    latencies = [o["latency_s"] for o in outcomes]
+    waits = [o["queue_wait_ms"] for o in outcomes]
+    client_waits = [o["client_wait_s"] for o in outcomes]
+    count = len(outcomes)
+    failures = sum(1 for o in outcomes if not o["success"])
+    timeouts = sum(1 for o in outcomes if o["timeout"])
+    errors: dict[str, int] = {}
+    for o in outcomes:
+        if o["error"]:
+            key = o["error"][:80]
+            errors[key] = errors.get(key, 0) + 1
+    return {
+        "tasks": count,
+        "elapsed_s": round(elapsed, 1),
+        "throughput_per_min": round(count / elapsed * 60, 2) if elapsed else 0.0,
+        "latency_s": {"p50": percentile(latencies, 50), "p95": percentile(latencies, 95),
+                      "p99": percentile(latencies, 99), "max": round(max(latencies, default=0.0), 3)},
+        "queue_wait_ms": {"p50": percentile(waits, 50), "p95": percentile(waits, 95),
+                          "p99": percentile(waits, 99), "max": round(max(waits, default=0.0), 1)},
+        "client_wait_s_p95": percentile(client_waits, 95),
+        "failure_rate": round(failures / count, 4) if count else 0.0,
+        "timeout_rate": round(timeouts / count, 4) if count else 0.0,
+        "errors": dict(sorted(errors.items(), key=lambda item: -item[1])[:10]),
+    }
+
+
+def detect_leaks(baseline: dict, final: dict, samples: list[dict], args) -> list[str]:
+    """对比预热后的基线与排空后的最终采样"""
+    leaks = []
+    if final["zombies"] > 0:
+        leaks.append(f"存在{final['zombies']}个僵尸进程")
+    if final["processes"] > baseline["processes"] + args.max_process_growth:
+        leaks.append(f"进程数从{baseline['processes']}增长到{final['processes']}")
+    if final["chromium"] > baseline["chromium"]:
+        leaks.append(f"Chromium进程数从{baseline['chromium']}增长到{final['chromium']}")
+    if final["temp_files"] > baseline["temp_files"]:
+        leaks.append(f"残留browser_task_*.json临时文件{final['temp_files'] - baseline['temp_files']}个")
+    if final["open_fds"] > baseline["open_fds"] + args.max_fd_growth:
+        leaks.append(f"打开的文件描述符从{baseline['open_fds']}增长到{final['open_fds']}")
+    slope = rss_slope_mb_per_hour(samples)
+    if slope > args.max_rss_growth:
+        leaks.append(f"RSS持续增长 {slope}MB/小时（允许{args.max_rss_growth}MB/小时）")
+    return leaks
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Browser-Use插件并发负载与浸泡测试")
+    parser.add_argument("--rate", type=float, default=1.0, help="平均到达率（个/秒），0表示一次性全部提交")
+    parser.add_argument("--concurrency", type=int, default=10, help="同时进行的_invoke调用数上限")
+    parser.add_argument("--duration", type=float, default=0, help="持续提交的秒数（浸泡测试）")
+    parser.add_argument("--requests", type=int, default=0, help="提交的任务总数；与--duration都为0时默认50")
+    parser.add_argument("--scenarios", default="table,form,article", help="逗号分隔的场景名，轮流使用")
+    parser.add_argument("--pool-size", type=int, help="覆盖BROWSER_POOL_SIZE")
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--warmup", type=int, default=2, help="记录基线前执行的预热任务数")
+    parser.add_argument("--sample-interval", type=float, default=5.0)
+    parser.add_argument("--max-failure-rate", type=float, default=0.01)
+    parser.add_argument("--max-process-growth", type=int, default=0)
+    parser.add_argument("--max-fd-growth", type=int, default=50)
+    parser.add_argument("--max-rss-growth", type=float, default=100.0, help="允许的RSS增长率（MB/小时）")
+    parser.add_argument("--output", default="load_result.json")
+    args = parser.parse_args()
+    if not args.duration and not args.requests:
+        args.requests = 50
+    if args.rate <= 0 and not args.requests:
+        parser.error("--rate为0时必须指定--requests")
+
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"未知场景: {', '.join(unknown)}")
+
+    site = FixtureSite().start()
+    llm = MockLLMServer(latency=args.llm_latency).start()
+    # 必须在导入tools.worker_pool之前设置，Worker池在导入时读取池大小，子进程继承LLM配置
+    os.environ["BROWSER_LLM_BASE_URL"] = llm.base_url
+    os.environ["BROWSER_LLM_MODEL"] = "DeepSeek"
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    if args.pool_size:
+        os.environ["BROWSER_POOL_SIZE"] = str(args.pool_size)
+    queries = [SCENARIOS[name].format(url=site.url, tls_url=site.tls_url) for name in names]
+
+    from tools.worker_pool import get_worker_pool
+
+    try:
+        print(f"🔥 预热 {args.warmup} 个任务...")
+        for i in range(args.warmup):
+            invoke_once(queries[i % len(queries)], time.monotonic())
+        time.sleep(SETTLE_SECONDS)
+        baseline = resource_sample()
+        print(f"📏 基线: {baseline}")
+
+        monitor = ResourceMonitor(args.sample_interval).start()
+        outcomes, elapsed = run_load(queries, args.rate, args.concurrency, args.duration, args.requests)
+        print(f"⏳ 负载结束，等待 {SETTLE_SECONDS}s 让Worker回收资源...")
+        time.sleep(SETTLE_SECONDS)
+        monitor.stop()
+        final = resource_sample()
+        pool = get_worker_pool().snapshot()
+    finally:
+        llm.stop()
+        site.stop()
+
+    load = summarize_load(outcomes, elapsed)
+    leaks = detect_leaks(baseline, final, monitor.samples, args)
+    report = {
+        **git_commit(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "load": load,
+        "pool": pool,
+        "resources": {
+            "baseline": baseline,
+            "final": final,
+            "peak_rss_mb": max((s["rss_mb"] for s in monitor.samples), default=0.0),
+            "peak_processes": max((s["processes"] for s in monitor.samples), default=0),
+            "rss_growth_mb_per_hour": rss_slope_mb_per_hour(monitor.samples),
+            "samples": monitor.samples,
+        },
+        "leaks": leaks,
+    }
+    Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    print(f"\n📊 {load['tasks']}个任务，用时{load['elapsed_s']}s，吞吐量{load['throughput_per_min']}个/分钟")
+    print(f"   耗时 p50/p95/p99: {load['latency_s']['p50']}/{load['latency_s']['p95']}/{load['latency_s']['p99']}s")
+    print(f"   排队 p50/p95/p99: {load['queue_wait_ms']['p50']}/{load['queue_wait_ms']['p95']}/"
+          f"{load['queue_wait_ms']['p99']}ms")
+    print(f"   失败率: {load['failure_rate'] * 100:.2f}%  超时率: {load['timeout_rate'] * 100:.2f}%")
+    print(f"💾 结果已写入: {args.output}")
+
+    failed = False
+    if load["failure_rate"] > args.max_failure_rate:
+        print(f"❌ 失败率超过 {args.max_failure_rate * 100:.2f}%: {load['errors']}")
+        failed = True
+    for leak in leaks:
+        print(f"💧 疑似泄漏: {leak}")
+        failed = True
+    if not failed:
+        print("✅ 未发现失败率超标或资源泄漏")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+mock_llm.py - 基准测试用的OpenAI兼容模拟服务
+替代内网的DeepSeek端点，按测试场景返回预先编排的Agent动作，并可配置每次响应的延迟：
+  - browser_use创建Agent时的工具调用能力探测（"What is the capital of France?"）直接返回paris
+  - Agent步骤请求：根据任务中的测试页面路径选择场景，根据"Current step: N/"确定第几步
+  - 没有工具定义的普通请求（如extract_content、快速通道的总结）返回固定文本
+支持/v1/chat/completions（含stream）和/v1/models
+单独运行: python mock_llm.py [--port 8799] [--latency 0.5]
+"""
+
+import argparse
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STEP_PATTERN = re.compile(r"Current step: (\d+)/")
+SCENARIO_PATTERN = re.compile(r"(https?://[^\s'\"]+?)/(article|table|form|slow)\b")
+ELEMENT_PATTERN = r"\[(\d+)\]<{tag}\b"
+
+
+def _brain(goal: str) -> dict:
+    return {"evaluation_previous_goal": "Success", "memory": "benchmark scenario", "next_goal": goal}
+
+
+def _find_index(state: str, tag: str) -> int:
+    match = re.search(ELEMENT_PATTERN.format(tag=tag), state)
+    return int(match.group(1)) if match else 0
+
+
+def scripted_action(scenario: str, base_url: str, step: int, state: str) -> dict:
+    """场景脚本：第1步打开页面，表单场景再输入并提交，最后done"""
+    url = f"{base_url}/{scenario}"
+    if step == 1:
+        return {"current_state": _brain(f"open {url}"), "action": [{"go_to_url": {"url": url}}]}
+    if scenario == "form" and step == 2:
+        return {"current_state": _brain("fill the form"),
+                "action": [{"input_text": {"index": _find_index(state, "input"), "text": "benchmark"}}]}
+    if scenario == "form" and step == 3:
+        return {"current_state": _brain("submit the form"),
+                "action": [{"click_element_by_index": {"index": _find_index(state, "button")}}]}
+    return {"current_state": _brain("done"),
+            "action": [{"done": {"text": f"{scenario} 场景完成", "success": True}}]}
+
+
+def _message_text(message: dict) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return str(content)
+
+
+def plan_response(request: dict) -> tuple[str, dict]:
+    """返回("content", 文本)或("tool", {"name", "arguments"})"""
+    messages = request.get("messages", [])
+    all_text = "\n".join(_message_text(m) for m in messages)
+    last_user = next((_message_text(m) for m in reversed(messages) if m.get("role") == "user"), "")
+    tools = request.get("tools") or []
+    tool_name = tools[0]["function"]["name"] if tools else None
+
+    if "capital of France" in all_text:
+        answer = {"answer": "paris"}
+        return ("tool", {"name": tool_name, "arguments": answer}) if tool_name else ("content", json.dumps(answer))
+
+    scenario = SCENARIO_PATTERN.search(all_text)
+    step_match = STEP_PATTERN.search(last_user)
+    if scenario and (tool_name or step_match):
+        step = int(step_match.group(1)) if step_match else 1
+        output = scripted_action(scenario.group(2), scenario.group(1), step, last_user)
+        return ("tool", {"name": tool_name, "arguments": output}) if tool_name else ("content", json.dumps(output))
+
+    return "content", "模拟服务返回的页面摘要：这是基准测试页面。"
+
+
+def _usage(request: dict, completion: str) -> dict:
+    prompt_tokens = len(json.dumps(request.get("messages", []), ensure_ascii=False)) // 3
+    completion_tokens = max(1, len(completion) // 3)
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens}
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, latency: float = 0.0):
+        super().__init__(("127.0.0.1", port), MockLLMHandler)
+        self.latency = latency
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def start(self) -> "MockLLMServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    server: MockLLMServer
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def _json(self, payload: dict, status: int = 200) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        if self.path.rstrip("/").endswith("/models"):
+            self._json({"object": "list", "data": [{"id": "DeepSeek", "object": "model", "owned_by": "benchmark"}]})
+        else:
+            self.send_error(404)
+
+    def do_POST(self) -> None:
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with self.server._lock:
+            self.server.requests += 1
+        time.sleep(self.server.latency)
+
+        kind, payload = plan_response(request)
+        if kind == "tool":
+            arguments = json.dumps(payload["arguments"], ensure_ascii=False)
+            message = {"role": "assistant", "content": None, "tool_calls": [{
+                "id": f"call_{uuid.uuid4().hex[:12]}", "type": "function",
+                "function": {"name": payload["name"], "arguments": arguments},
+            }]}
+            finish_reason, completion = "tool_calls", arguments
+        else:
+            message = {"role": "assistant", "content": payload}
+            finish_reason, completion = "stop", payload
+
+        response_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        usage = _usage(request, completion)
+        if request.get("stream"):
+            self._stream(response_id, request.get("model", ""), message, finish_reason, usage)
+            return
+        self._json({
+            "id": response_id, "object": "chat.completion", "created": int(time.time()),
+            "model": request.get("model", ""),
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+            "usage": usage,
+        })
+
+    def _stream(self, response_id: str, model: str, message: dict, finish_reason: str, usage: dict) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        delta = dict(message)
+        if delta.get("tool_calls"):
+            delta["tool_calls"] = [{**call, "index": 0} for call in delta["tool_calls"]]
+        chunks = [
+            {"choices": [{"index": 0, "delta": delta, "finish_reason": None}]},
+            {"choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}], "usage": usage},
+        ]
+        for chunk in chunks:
+            chunk.update({"id": response_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                          "model": model})
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OpenAI兼容的模拟LLM服务")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--latency", type=float, default=0.0, help="每次响应前的延迟（秒）")
+    args = parser.parse_args()
+    server = MockLLMServer(args.port, args.latency)
+    print(f"🤖 模拟LLM服务: {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
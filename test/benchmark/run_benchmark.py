@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+run_benchmark.py - 离线端到端基准测试
+启动本地测试站点（fixture_site.py）和模拟LLM服务（mock_llm.py），不依赖内网LLM端点和外部网站，
+按场景分别以两种方式执行任务并记录冷启动与热启动耗时、各阶段耗时和峰值内存：
+  - worker: 直接调用browser_worker_file.execute_browser_task
+            冷启动为单次模式（任务自行启动Chromium），热启动为常驻模式（从已启动的上下文池取上下文）
+  - tool:   通过DifyBrowseruseTool._invoke经Worker池端到端执行
+            冷启动为新建Worker池后的第一个任务（包含Worker启动），热启动为同一Worker池上的后续任务
+结果写入JSON（附带git提交），可与之前的结果对比；超出budgets.json中的预算、
+相对--baseline回退超过--max-regression或场景执行失败时以非零状态退出
+用法: python test/benchmark/run_benchmark.py [--mode worker|tool|all] [--scenarios form,table]
+                                            [--output result.json] [--baseline old.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BENCHMARK_DIR = Path(__file__).parent
+REPO_ROOT = BENCHMARK_DIR.parent.parent
+DEFAULT_BUDGETS = BENCHMARK_DIR / "budgets.json"
+
+# 回退判定的最小绝对差值，低于该值视为测量噪声
+MIN_REGRESSION_SECONDS = 0.5
+MIN_REGRESSION_MB = 50
+
+# 场景名 -> 任务指令模板；{url}为HTTP站点，{tls_url}为自签名证书的HTTPS站点
+SCENARIOS = {
+    "article": "在url栏输入：{url}/article 总结页面信息",
+    "table": "打开{url}/table，找出编号为10的项目对应的数值",
+    "form": "打开{url}/form，在关键词输入框输入benchmark并点击提交",
+    "slow": "打开{url}/slow，确认页面标题",
+    "tls": "打开{tls_url}/article，确认页面标题",
+}
+
+sys.path.insert(0, str(BENCHMARK_DIR))
+from fixture_site import FixtureSite
+from mock_llm import MockLLMServer
+
+
+def git_commit() -> dict:
+    def run(*args: str) -> str:
+        try:
+            return subprocess.run(["git", *args], cwd=REPO_ROOT, capture_output=True, text=True,
+                                  timeout=30).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return ""
+
+    return {"commit": run("rev-parse", "HEAD"), "dirty": bool(run("status", "--porcelain", "--untracked-files=no"))}
+
+
+def peak_process_rss_mb() -> float:
+    """基准测试进程自身的峰值RSS（Linux下ru_maxrss单位为KB）"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def sample(result: dict, latency_s: float) -> dict:
+    """从任务结果中取出基准测试关心的字段"""
+    metrics = result.get("metrics") or {}
+    stages = {key: value for key, value in metrics.items()
+              if key.endswith("_s") and isinstance(value, (int, float))}
+    return {
+        "success": bool(result.get("success")),
+        "error": result.get("error") or "",
+        "latency_s": round(latency_s, 3),
+        "stages": stages,
+        "llm_calls": metrics.get("llm_calls", 0),
+        "prompt_tokens": metrics.get("prompt_tokens", 0),
+        "steps": len(metrics.get("steps", [])),
+        "fast_path": "fast_path" in result,
+        "peak_worker_rss_mb": metrics.get("peak_worker_rss_mb", 0.0),
+        "peak_chromium_rss_mb": metrics.get("peak_chromium_rss_mb", 0.0),
+    }
+
+
+def summarize(cold: dict, warm: list[dict]) -> dict:
+    runs = [cold] + warm
+    return {
+        "cold_s": cold["latency_s"],
+        "warm_s": round(statistics.median(run["latency_s"] for run in warm), 3) if warm else None,
+        "success": all(run["success"] for run in runs),
+        "peak_worker_rss_mb": max(run["peak_worker_rss_mb"] for run in runs),
+        "peak_chromium_rss_mb": max(run["peak_chromium_rss_mb"] for run in runs),
+        "cold": cold,
+        "warm": warm,
+    }
+
+
+async def bench_worker(scenarios: dict[str, str], warm_runs: int) -> dict:
+    """直接调用execute_browser_task"""
+    sys.path.insert(0, str(REPO_ROOT / "tools"))
+    import browser_worker_file as worker
+
+    async def run_once(name: str, query: str, context_pool=None) -> dict:
+        metrics = worker.TaskMetrics()
+        metrics.start_sampling(worker.chromium_rss_mb)
+        browser_context = None
+        browser_session = None
+        started = time.monotonic()
+        try:
+            if context_pool is not None:
+                acquire_start = time.monotonic()
+                browser_context = await context_pool.acquire()
+                metrics.stage("context_acquire_s", time.monotonic() - acquire_start)
+                browser_session = worker.create_browser_session(context_pool, browser_context)
+            result = await worker.execute_browser_task(
+                query, f"bench-{name}", browser_session=browser_session,
+                request_policy=worker.RequestPolicy(), fast_path=True, metrics=metrics)
+        finally:
+            metrics.finish()
+            if browser_context is not None:
+                await context_pool.release(browser_context)
+        latency = time.monotonic() - started
+        result["metrics"] = metrics.snapshot()
+        return sample(result, latency)
+
+    results = {}
+    context_pool = worker.BrowserContextPool(worker.BROWSER_ARGS, worker.CONTEXT_OPTIONS)
+    await context_pool.start()
+    try:
+        for name, query in scenarios.items():
+            print(f"⏱️ [worker] {name}")
+            cold = await run_once(name, query)
+            warm = [await run_once(name, query, context_pool) for _ in range(warm_runs)]
+            results[name] = summarize(cold, warm)
+    finally:
+        await context_pool.close()
+    return results
+
+
+def bench_tool(scenarios: dict[str, str], warm_runs: int) -> dict:
+    """通过DifyBrowseruseTool._invoke端到端执行；每个场景使用新的Worker池以测量冷启动"""
+    sys.path.insert(0, str(REPO_ROOT))
+    from tools import worker_pool
+    from tools.dify_browseruse import DifyBrowseruseTool
+
+    tool = DifyBrowseruseTool.from_credentials({})
+
+    def run_once(query: str) -> dict:
+        started = time.monotonic()
+        result = {}
+        for message in tool._invoke({"query": query, "cache": "bypass"}):
+            if message.type == message.MessageType.JSON:
+                result = message.message.json_object
+        return sample(result, time.monotonic() - started)
+
+    results = {}
+    for name, query in scenarios.items():
+        print(f"⏱️ [tool] {name}")
+        cold = run_once(query)
+        warm = [run_once(query) for _ in range(warm_runs)]
+        results[name] = summarize(cold, warm)
+        # 关闭进程内共享的Worker池，下一个场景重新测量冷启动
+        if worker_pool._pool is not None:
+            worker_pool._pool.shutdown()
+            worker_pool._pool = None
+    return results
+
+
+def check_budgets(results: dict, budgets: dict) -> list[str]:
+    failures = []
+    for mode, scenarios in results.items():
+        for name, summary in scenarios.items():
+            label = f"{mode}/{name}"
+            if not summary["success"]:
+                errors = [run["error"] for run in [summary["cold"]] + summary["warm"] if run["error"]]
+                failures.append(f"{label} 执行失败: {errors[0] if errors else '未知错误'}")
+            budget = {**budgets.get("default", {}), **budgets.get("scenarios", {}).get(name, {})}
+            for key, limit in budget.items():
+                value = summary.get(key)
+                if value is not None and value > limit:
+                    failures.append(f"{label} {key}={value} 超出预算 {limit}")
+    return failures
+
+
+def check_regressions(results: dict, baseline: dict, max_regression: float) -> list[str]:
+    failures = []
+    for mode, scenarios in results.items():
+        for name, summary in scenarios.items():
+            previous = baseline.get("results", {}).get(mode, {}).get(name)
+            if not previous:
+                continue
+            for key, floor in (("cold_s", MIN_REGRESSION_SECONDS), ("warm_s", MIN_REGRESSION_SECONDS),
+                               ("peak_worker_rss_mb", MIN_REGRESSION_MB),
+                               ("peak_chromium_rss_mb", MIN_REGRESSION_MB)):
+                old, new = previous.get(key), summary.get(key)
+                if not old or new is None:
+                    continue
+                if new > old * (1 + max_regression) and new - old > floor:
+                    failures.append(f"{mode}/{name} {key} 从{old}回退到{new}"
+                                    f"（+{(new / old - 1) * 100:.0f}%，允许{max_regression * 100:.0f}%）")
+    return failures
+
+
+def print_report(results: dict) -> None:
+    print(f"\n{'模式/场景':<16}{'冷启动(s)':>10}{'热启动(s)':>10}{'LLM(s)':>8}{'DOM(s)':>8}"
+          f"{'Worker(MB)':>12}{'Chromium(MB)':>14}  状态")
+    for mode, scenarios in results.items():
+        for name, summary in scenarios.items():
+            stages = (summary["warm"] or [summary["cold"]])[-1]["stages"]
+            status = "✅" if summary["success"] else "❌"
+            print(f"{mode + '/' + name:<16}{summary['cold_s']:>10}{summary['warm_s'] or '-':>10}"
+                  f"{stages.get('llm_s', 0):>8}{stages.get('dom_s', 0):>8}"
+                  f"{summary['peak_worker_rss_mb']:>12}{summary['peak_chromium_rss_mb']:>14}  {status}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Browser-Use插件离线基准测试")
+    parser.add_argument("--mode", choices=("worker", "tool", "all"), default="all")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="逗号分隔的场景名")
+    parser.add_argument("--warm-runs", type=int, default=3, help="每个场景热启动执行的次数，取中位数")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="模拟LLM每次响应的延迟（秒）")
+    parser.add_argument("--output", default="benchmark_result.json")
+    parser.add_argument("--budgets", default=str(DEFAULT_BUDGETS))
+    parser.add_argument("--baseline", help="之前的结果JSON，用于回退检查")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="相对基线允许的回退比例")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"未知场景: {', '.join(unknown)}")
+
+    site = FixtureSite().start()
+    llm = MockLLMServer(latency=args.llm_latency).start()
+    # Worker读取这些环境变量连接模拟服务；Worker池启动的子进程同样继承
+    os.environ["BROWSER_LLM_BASE_URL"] = llm.base_url
+    os.environ["BROWSER_LLM_MODEL"] = "DeepSeek"
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    print(f"🌐 测试站点: {site.url}  {site.tls_url}")
+    print(f"🤖 模拟LLM服务: {llm.base_url}（延迟{args.llm_latency}s）")
+
+    scenarios = {name: SCENARIOS[name].format(url=site.url, tls_url=site.tls_url) for name in names}
+    results = {}
+    started = time.time()
+    try:
+        if args.mode in ("worker", "all"):
+            results["worker"] = asyncio.run(bench_worker(scenarios, args.warm_runs))
+        if args.mode in ("tool", "all"):
+            results["tool"] = bench_tool(scenarios, args.warm_runs)
+    finally:
+        llm.stop()
+        site.stop()
+
+    report = {
+        **git_commit(),
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(started)),
+        "duration_s": round(time.time() - started, 1),
+        "llm_latency_s": args.llm_latency,
+        "warm_runs": args.warm_runs,
+        "llm_requests": llm.requests,
+        "peak_benchmark_rss_mb": round(peak_process_rss_mb(), 1),
+        "results": results,
+    }
+    Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print_report(results)
+    print(f"\n💾 结果已写入: {args.output}")
+
+    failures = []
+    budgets_path = Path(args.budgets)
+    if budgets_path.exists():
+        failures += check_budgets(results, json.loads(budgets_path.read_text(encoding="utf-8")))
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        failures += check_regressions(results, baseline, args.max_regression)
+
+    if failures:
+        print("\n❌ 基准测试未通过:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    print("\n✅ 基准测试通过")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+startup_benchmark.py - Worker启动耗时基准
+比较三种方式从请求Worker到Worker上报ready所需的时间：
+  - cold: 直接以sys.executable启动browser_worker_file.py --serve（解释器启动 + 依赖导入 + 启动Chromium）
+  - fork: 由已完成导入的模板进程fork（见tools/fork_server.py），另外单独报告模板进程本身的启动耗时
+  - warm: 已预热的Worker池，从提交任务到收到结果的往返耗时（空任务，不执行浏览器操作）
+ready中的startup_s为Worker进程自身记录的耗时（从进程创建起算），ready_s为进程池侧观察到的耗时；
+Chromium不可用时Worker上报失败的ready，冷启动与fork的对比仍然有效，warm模式会被跳过
+用法: python test/benchmark/startup_benchmark.py [--runs 5] [--output startup_result.json]
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+BENCHMARK_DIR = Path(__file__).parent
+REPO_ROOT = BENCHMARK_DIR.parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+sys.path.insert(0, str(BENCHMARK_DIR))
+
+from run_benchmark import git_commit
+from tools.fork_server import FORK_SUPPORTED, ForkServer, ForkServerError
+from tools.worker_pool import WORKER_SCRIPT, WorkerError, WorkerPool, WorkerProcess, worker_env
+
+START_TIMEOUT = 120.0
+
+
+async def start_worker(fork_server=None) -> dict:
+    """启动一个Worker直到收到ready，返回耗时；Chromium不可用等初始化失败同样记录耗时"""
+    worker = WorkerProcess()
+    started = time.monotonic()
+    error = ""
+    try:
+        await worker.start(timeout=START_TIMEOUT, fork_server=fork_server)
+    except WorkerError as e:
+        error = str(e).splitlines()[0]
+    ready_s = time.monotonic() - started
+    await worker.stop()
+    return {"ready_s": round(ready_s, 3), "ok": not error, "error": error}
+
+
+def summarize(samples: list[dict]) -> dict:
+    values = [sample["ready_s"] for sample in samples]
+    return {
+        "runs": len(values),
+        "median_s": round(statistics.median(values), 3) if values else None,
+        "min_s": round(min(values), 3) if values else None,
+        "max_s": round(max(values), 3) if values else None,
+        "ok": all(sample["ok"] for sample in samples),
+        "errors": sorted({sample["error"] for sample in samples if sample["error"]}),
+    }
+
+
+async def bench_cold(runs: int) -> dict:
+    return summarize([await start_worker() for _ in range(runs)])
+
+
+async def bench_fork(runs: int) -> dict:
+    if not FORK_SUPPORTED:
+        return {"skipped": "当前平台不支持os.fork"}
+    fork_server = ForkServer(WORKER_SCRIPT)
+    try:
+        await fork_server.start(worker_env(), START_TIMEOUT)
+    except ForkServerError as e:
+        return {"skipped": str(e)}
+    try:
+        result = summarize([await start_worker(fork_server) for _ in range(runs)])
+    finally:
+        await fork_server.stop()
+    result["template_startup_s"] = round(fork_server.startup_s, 3)
+    return result
+
+
+def bench_warm(runs: int) -> dict:
+    """在预热好的单Worker池上提交空任务，Worker立即返回错误结果，测得的是派发和往返开销"""
+    pool = WorkerPool(size=1)
+    try:
+        first = pool.submit({"task_id": "warmup", "query": ""}, timeout=START_TIMEOUT)
+        if first.get("error") != "任务查询内容为空":
+            return {"skipped": f"Worker未能就绪: {first.get('error', '').splitlines()[0]}"}
+        samples = []
+        for index in range(runs):
+            started = time.monotonic()
+            result = pool.submit({"task_id": f"warm-{index}", "query": ""}, timeout=START_TIMEOUT)
+            samples.append({"ready_s": round(time.monotonic() - started, 3), "ok": "pool" in result, "error": ""})
+        return summarize(samples)
+    finally:
+        pool.shutdown()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Browser Worker启动耗时基准")
+    parser.add_argument("--runs", type=int, default=5, help="每种方式启动的次数，取中位数")
+    parser.add_argument("--modes", default="cold,fork,warm", help="逗号分隔: cold,fork,warm")
+    parser.add_argument("--output", default="startup_result.json")
+    args = parser.parse_args()
+
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    results = {"git": git_commit(), "runs": args.runs, "python": sys.version.split()[0]}
+    if "cold" in modes:
+        print("⏱️ 冷启动Worker...")
+        results["cold"] = asyncio.run(bench_cold(args.runs))
+    if "fork" in modes:
+        print("⏱️ 模板进程fork Worker...")
+        results["fork"] = asyncio.run(bench_fork(args.runs))
+    if "warm" in modes:
+        print("⏱️ 预热Worker池派发...")
+        results["warm"] = bench_warm(args.runs)
+
+    print("\n📊 Worker启动耗时（中位数）")
+    for mode in ("cold", "fork", "warm"):
+        if mode not in results:
+            continue
+        result = results[mode]
+        if "skipped" in result:
+            print(f"  {mode:<5} 跳过: {result['skipped']}")
+            continue
+        extra = f"，模板进程启动 {result['template_startup_s']}s" if "template_startup_s" in result else ""
+        status = "" if result["ok"] else f"（Worker初始化失败: {'; '.join(result['errors'])}）"
+        print(f"  {mode:<5} {result['median_s']}s{extra}{status}")
+
+    Path(args.output).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"💾 结果已写入: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
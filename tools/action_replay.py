@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+action_replay.py - 动作序列缓存与回放
+稳定页面上的重复任务，Agent每次都会做出相同的导航/点击/提取决策，每一步都要调用LLM。
+这里把成功执行的Agent历史按"指令模板 + 起始域名"保存下来，之后匹配的任务直接在浏览器中回放这些动作：
+  - 指令模板: 把历史中input_text输入的、且原样出现在指令里的文字替换为占位符，
+    新指令按模板匹配后，用新的取值替换回放动作中的对应文字；
+    占位符之外的固定文字过少的模板（如整条指令就是输入的文字）几乎能匹配任何指令，不保存
+  - 域名: 指令中必须写明目标域名且与序列的起始域名一致才会回放，多个序列匹配时取固定文字最多的
+  - 每一步回放前用browser_use的历史元素匹配确认目标元素仍然存在，
+    第一处无法匹配或执行出错的步骤即视为偏离，剩余部分交还给LLM Agent继续完成
+  - 保存的序列不含用户数据：输入的文字在历史中替换为参数占位符，原始取值不落盘；
+    提取的内容、Agent的记忆、done的答案和截图在保存前丢弃；输入了指令中没有的文字（如密码）的序列不保存；
+    目录权限0700、文件权限0600
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+import unicodedata
+from pathlib import Path
+from typing import Any, Optional
+from urllib.parse import urlsplit
+
+# 动作缓存配置，可通过环境变量覆盖
+DEFAULT_PLAN_DIR = Path(os.environ.get("BROWSER_PLAN_CACHE_DIR", Path(tempfile.gettempdir()) / "browser_use_plans"))
+DEFAULT_MAX_PLANS = int(os.environ.get("BROWSER_PLAN_CACHE_MAX", "200"))
+# 回放连续偏离多少次后删除该动作序列
+MAX_PLAN_FAILURES = 3
+# 模板中占位符之外至少需要的固定文字数（不计空白和标点）
+MIN_TEMPLATE_LITERAL_CHARS = 4
+# 回放每步之间的等待时间（秒），给页面留出响应时间
+REPLAY_STEP_DELAY = 0.5
+
+URL_PATTERN = re.compile(r"https?://[^\s，。；、]+")
+PLACEHOLDER_PATTERN = re.compile(r"\{(\d+)\}")
+# 指令中未写协议的域名，如"bing.com搜索北京天气"
+BARE_DOMAIN_PATTERN = re.compile(r"(?<![\w.-])((?:[a-z0-9](?:[a-z0-9-]*[a-z0-9])?\.)+[a-z]{2,})(?![\w-])", re.IGNORECASE | re.ASCII)
+
+
+def _normalize(query: str) -> str:
+    query = unicodedata.normalize("NFKC", query)
+    return re.sub(r"\s+", " ", query).strip()
+
+
+def _domain_of(url: str) -> str:
+    return urlsplit(url).netloc.lower()
+
+
+def query_domain(query: str) -> Optional[str]:
+    """指令中的目标域名：第一个URL的域名，没有URL时取第一个裸域名；都没有时返回None"""
+    normalized = _normalize(query)
+    url = URL_PATTERN.search(normalized)
+    if url:
+        return _domain_of(url.group(0)) or None
+    bare = BARE_DOMAIN_PATTERN.search(normalized)
+    return bare.group(1).lower() if bare else None
+
+
+def _same_site(plan_domain: str, domain: str) -> bool:
+    """www.bing.com与bing.com视为同一站点"""
+    plan_domain = plan_domain.split(":")[0]
+    domain = domain.split(":")[0]
+    return plan_domain == domain or plan_domain.endswith("." + domain) or domain.endswith("." + plan_domain)
+
+
+def _literal_chars(template: str) -> int:
+    """模板中占位符之外的固定文字数，不计空白和标点"""
+    literal = PLACEHOLDER_PATTERN.sub("", template)
+    return sum(1 for ch in literal if not ch.isspace() and not unicodedata.category(ch).startswith("P"))
+
+
+def _action_items(history_item: dict) -> list[tuple[str, dict]]:
+    model_output = history_item.get("model_output") or {}
+    items = []
+    for action in model_output.get("action", []):
+        for name, params in action.items():
+            if params is not None:
+                items.append((name, params))
+    return items
+
+
+def start_domain(query: str, history_data: dict) -> str:
+    """起始域名：历史中第一个go_to_url/open_tab的目标，没有时取指令中的第一个URL"""
+    for item in history_data.get("history", []):
+        for name, params in _action_items(item):
+            if name in ("go_to_url", "open_tab") and params.get("url"):
+                return _domain_of(params["url"])
+    match = URL_PATTERN.search(query)
+    return _domain_of(match.group(0)) if match else ""
+
+
+def build_template(query: str, history_data: dict) -> tuple[str, list[str]]:
+    """把input_text输入且出现在指令中的文字替换为{0}、{1}...，返回(模板, 原始取值)"""
+    template = _normalize(query).replace("{", "{{").replace("}", "}}")
+    params: list[str] = []
+    for item in history_data.get("history", []):
+        for name, action in _action_items(item):
+            text = action.get("text")
+            if name != "input_text" or not text or text in params:
+                continue
+            escaped = text.replace("{", "{{").replace("}", "}}")
+            if escaped in template:
+                template = template.replace(escaped, "{" + str(len(params)) + "}")
+                params.append(text)
+    return template, params
+
+
+def _template_regex(template: str) -> re.Pattern:
+    parts = []
+    last = 0
+    for match in PLACEHOLDER_PATTERN.finditer(template):
+        parts.append(re.escape(template[last:match.start()].replace("{{", "{").replace("}}", "}")))
+        parts.append("(.+?)")
+        last = match.end()
+    parts.append(re.escape(template[last:].replace("{{", "{").replace("}}", "}")))
+    return re.compile("^" + "".join(parts) + "$")
+
+
+def _param_token(index: int) -> str:
+    """保存的历史中代替第index个参数取值的占位符"""
+    return f"<<param{index}>>"
+
+
+def _scrub_history(history_data: dict, params: list[str]) -> dict:
+    """
+    保存前去掉历史中的用户数据：参数取值替换为占位符（包括出现在URL等其他字段中的），
+    丢弃动作结果（提取的内容）、Agent的记忆和目标、done的答案和截图；回放只需要动作和交互过的元素
+    """
+    # 长的取值先替换，避免一个取值是另一个的子串时被拆开
+    tokens = {text: _param_token(params.index(text)) for text in sorted(params, key=len, reverse=True)}
+    data = _substitute(json.loads(json.dumps(history_data)), tokens)
+    for item in data.get("history", []):
+        item["result"] = []
+        if isinstance(item.get("state"), dict):
+            item["state"]["screenshot"] = None
+        model_output = item.get("model_output")
+        if not isinstance(model_output, dict):
+            continue
+        if isinstance(model_output.get("current_state"), dict):
+            model_output["current_state"] = {key: "" for key in model_output["current_state"]}
+        for action in model_output.get("action", []):
+            if isinstance(action.get("done"), dict):
+                action["done"]["text"] = ""
+    return data
+
+
+def _write_private(path: Path, data: dict) -> None:
+    """原子写入，文件只对当前用户可读写"""
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _substitute(value: Any, replacements: dict[str, str]) -> Any:
+    """在所有字符串字段中按replacements替换（保存时取值→占位符，回放时占位符→新取值）"""
+    if isinstance(value, str):
+        for old, new in replacements.items():
+            value = value.replace(old, new)
+        return value
+    if isinstance(value, list):
+        return [_substitute(v, replacements) for v in value]
+    if isinstance(value, dict):
+        return {k: _substitute(v, replacements) for k, v in value.items()}
+    return value
+
+
+class ActionPlanCache:
+    """
+    动作序列缓存，每个序列保存为目录下的一个JSON文件，同一容器内的所有Worker共享
+    只在任务成功完成时写入，热路径上只有一次目录扫描后的内存匹配
+    """
+
+    def __init__(self, directory: Path = DEFAULT_PLAN_DIR, max_plans: int = DEFAULT_MAX_PLANS):
+        self.directory = Path(directory)
+        self.max_plans = max(1, max_plans)
+        self.directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+        try:
+            # 目录可能由旧版本以默认权限创建
+            os.chmod(self.directory, 0o700)
+        except OSError:
+            pass
+
+    def _plan_path(self, template: str, domain: str) -> Path:
+        digest = hashlib.sha1(f"{template}|{domain}".encode("utf-8")).hexdigest()
+        return self.directory / f"plan_{digest}.json"
+
+    def _load_plans(self) -> list[tuple[Path, dict]]:
+        plans = []
+        for path in self.directory.glob("plan_*.json"):
+            try:
+                plan = json.loads(path.read_text(encoding="utf-8"))
+                if "params" in plan:
+                    # 旧格式的序列保存了输入的原始文字，删除
+                    path.unlink()
+                    continue
+                plans.append((path, plan))
+            except (OSError, json.JSONDecodeError):
+                continue
+        return plans
+
+    def match(self, query: str) -> Optional[tuple[Path, dict, dict[str, str]]]:
+        """
+        查找与指令匹配的动作序列，返回(文件路径, 序列, 参数占位符→新取值)
+        指令未写明域名时不回放；多个序列匹配时取固定文字最多、占位符最少、最新的一个
+        """
+        normalized = _normalize(query)
+        domain = query_domain(normalized)
+        if domain is None:
+            return None
+        best = None
+        best_key = None
+        for path, plan in self._load_plans():
+            if not plan.get("domain") or not _same_site(plan["domain"], domain):
+                continue
+            literal_chars = _literal_chars(plan["template"])
+            if literal_chars < MIN_TEMPLATE_LITERAL_CHARS:
+                continue
+            found = _template_regex(plan["template"]).match(normalized)
+            if not found:
+                continue
+            key = (literal_chars, -plan.get("param_count", 0), plan.get("created_at", 0))
+            if best_key is None or key > best_key:
+                replacements = {_param_token(index): value for index, value in enumerate(found.groups())}
+                best, best_key = (path, plan, replacements), key
+        return best
+
+    def record(self, query: str, history_data: dict) -> bool:
+        """
+        保存一次成功执行的动作序列；同一模板和域名只保留最新一份
+        指令未写明域名、没有起始域名或模板固定文字过少时不保存，这类序列无法安全地判断是否适用于新指令；
+        输入了指令中没有的文字时也不保存，这些文字无法参数化，回放时也无从得知新的取值
+        返回是否已保存
+        """
+        template, params = build_template(query, history_data)
+        typed = {params_.get("text") for item in history_data.get("history", [])
+                 for name, params_ in _action_items(item) if name == "input_text" and params_.get("text")}
+        if not typed.issubset(params):
+            return False
+        domain = start_domain(query, history_data)
+        target = query_domain(query)
+        if not domain or target is None or not _same_site(domain, target):
+            return False
+        if _literal_chars(template) < MIN_TEMPLATE_LITERAL_CHARS:
+            return False
+        plan = {
+            "template": template,
+            "param_count": len(params),
+            "domain": domain,
+            "history": _scrub_history(history_data, params),
+            "created_at": time.time(),
+            "failures": 0,
+        }
+        _write_private(self._plan_path(template, domain), plan)
+        self._evict()
+        return True
+
+    def mark_success(self, path: Path) -> None:
+        """回放全部成功，清零连续偏离次数"""
+        try:
+            plan = json.loads(path.read_text(encoding="utf-8"))
+            if plan.get("failures"):
+                plan["failures"] = 0
+                _write_private(path, plan)
+        except (OSError, json.JSONDecodeError):
+            pass
+
+    def mark_failure(self, path: Path) -> None:
+        """记录一次回放偏离，连续偏离过多时删除该序列"""
+        try:
+            plan = json.loads(path.read_text(encoding="utf-8"))
+            plan["failures"] = plan.get("failures", 0) + 1
+            if plan["failures"] >= MAX_PLAN_FAILURES:
+                path.unlink()
+            else:
+                _write_private(path, plan)
+        except (OSError, json.JSONDecodeError):
+            pass
+
+    def _evict(self) -> None:
+        paths = sorted(self.directory.glob("plan_*.json"), key=lambda p: p.stat().st_mtime)
+        for path in paths[:max(0, len(paths) - self.max_plans)]:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+
+_cache: Optional[ActionPlanCache] = None
+
+
+def get_plan_cache() -> ActionPlanCache:
+    """获取Worker进程内共享的动作序列缓存"""
+    global _cache
+    if _cache is None:
+        _cache = ActionPlanCache()
+    return _cache
+
+
+async def replay_plan(agent: Any, plan: dict, replacements: dict[str, str]) -> dict:
+    """
+    在agent的浏览器会话中逐步回放动作序列（不含最后的done），不调用LLM
+    返回{"steps_replayed", "total_steps", "diverged_at", "extracted"}，diverged_at为None表示全部回放成功
+    """
+    from browser_use.agent.views import AgentHistoryList
+
+    data = _substitute(json.loads(json.dumps(plan["history"])), replacements)
+    for item in data["history"]:
+        if isinstance(item.get("model_output"), dict):
+            item["model_output"] = agent.AgentOutput.model_validate(item["model_output"])
+        else:
+            item["model_output"] = None
+        if "interacted_element" not in item["state"]:
+            item["state"]["interacted_element"] = None
+    history = AgentHistoryList.model_validate(data)
+
+    steps = []
+    for item in history.history:
+        if not item.model_output:
+            continue
+        # done里的文字是上一次的答案，不回放；遇到done即结束
+        actions = item.model_output.action
+        cut = next((i for i, action in enumerate(actions) if action.model_dump(exclude_none=True).get("done")), None)
+        if cut is not None:
+            if cut > 0:
+                item.model_output.action = actions[:cut]
+                steps.append(item)
+            break
+        steps.append(item)
+
+    outcome = {"steps_replayed": 0, "total_steps": len(steps), "diverged_at": None, "extracted": []}
+    for index, item in enumerate(steps):
+        try:
+            results = await agent._execute_history_step(item, REPLAY_STEP_DELAY)
+        except Exception as e:
+            print(f"↪️ 回放第{index + 1}步偏离（{e}），交给LLM继续")
+            outcome["diverged_at"] = index + 1
+            break
+        errors = [r.error for r in results if r.error]
+        if errors:
+            print(f"↪️ 回放第{index + 1}步执行出错（{errors[-1]}），交给LLM继续")
+            outcome["diverged_at"] = index + 1
+            break
+        outcome["steps_replayed"] += 1
+        outcome["extracted"].extend(r.extracted_content for r in results if r.extracted_content)
+    return outcome
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+browser_nodes.py - 远程Chromium节点（CDP）的选择与健康检查
+默认每个Worker在本机启动共享Chromium；配置BROWSER_CDP_NODES后Worker改为通过CDP连接远程Chromium，
+浏览器容量可以独立于插件所在的机器横向扩展：
+  - 节点: 逗号分隔的CDP地址，如"http://10.0.0.5:9222,http://10.0.0.6:9222"（Chromium以--remote-debugging-port启动），
+    也可以是ws://开头的浏览器WebSocket地址
+  - 选择: 连接前并发探测所有节点，在健康节点中选择当前打开页面最少的（/json/list统计的是所有客户端的负载），
+    负载相同时随机选择，避免同时启动的Worker都连到同一节点
+  - 健康检查: 连接期间定期请求/json/version，连续失败达到阈值即判定节点失效，冷却期内不再选择
+  - 故障转移: 节点失效后上下文池断开连接并改连其他节点，执行中的任务换节点重试（见context_pool.py）
+仅依赖httpx，不导入浏览器相关模块
+"""
+
+import asyncio
+import os
+import random
+import time
+from typing import Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+# 远程Chromium节点，为空时在本机启动Chromium
+DEFAULT_CDP_NODES = os.environ.get("BROWSER_CDP_NODES", "")
+# 连接期间检查当前节点健康状况的间隔（秒）
+DEFAULT_HEALTH_INTERVAL = float(os.environ.get("BROWSER_NODE_HEALTH_INTERVAL", "10"))
+PROBE_TIMEOUT = 3.0
+# 连续探测失败达到该次数判定节点失效
+MAX_PROBE_FAILURES = 2
+# 失效节点在该时间（秒）内不再被选择，之后重新探测
+NODE_COOLDOWN_SECONDS = 30.0
+# 通过CDP连接节点的超时（秒）
+CONNECT_TIMEOUT = 15.0
+
+
+def parse_nodes(raw: str) -> list[str]:
+    """把"a:9222, http://b:9222"之类的配置转换为节点地址列表，未写协议时按http处理"""
+    nodes = []
+    for item in raw.replace("，", ",").split(","):
+        item = item.strip().rstrip("/")
+        if not item:
+            continue
+        url = item if "://" in item else f"http://{item}"
+        if url not in nodes:
+            nodes.append(url)
+    return nodes
+
+
+class BrowserNode:
+    """单个远程Chromium节点的状态"""
+
+    def __init__(self, url: str):
+        self.url = url
+        parts = urlsplit(url)
+        # ws://host:port/devtools/browser/<id> 的HTTP调试接口在同一主机端口上
+        scheme = "https" if parts.scheme in ("https", "wss") else "http"
+        self.http_url = f"{scheme}://{parts.netloc}"
+        self.healthy = True
+        self.failures = 0
+        self.pages = 0
+        self.dead_until = 0.0
+        self.last_error = ""
+
+    def available(self, now: float) -> bool:
+        return self.healthy or now >= self.dead_until
+
+    def snapshot(self) -> dict:
+        return {"url": self.url, "healthy": self.healthy, "pages": self.pages, "last_error": self.last_error}
+
+
+class BrowserNodeSet:
+    """
+    一组远程Chromium节点，由单个Worker的上下文池使用；所有方法都在Worker的事件循环中调用
+    节点状态只在本Worker内维护，负载则来自节点本身，因此多个Worker、多个插件实例之间同样能均衡
+    """
+
+    def __init__(self, urls: list[str], health_interval: float = DEFAULT_HEALTH_INTERVAL,
+                 connect_timeout: float = CONNECT_TIMEOUT):
+        self.nodes = [BrowserNode(url) for url in urls]
+        self.health_interval = health_interval
+        self.connect_timeout = connect_timeout
+        self.stats = {
+            "probes": 0,
+            "probe_failures": 0,
+            "nodes_marked_dead": 0,
+        }
+
+    @classmethod
+    def from_env(cls) -> Optional["BrowserNodeSet"]:
+        """按BROWSER_CDP_NODES创建，未配置时返回None（本机启动Chromium）"""
+        urls = parse_nodes(os.environ.get("BROWSER_CDP_NODES") or DEFAULT_CDP_NODES)
+        return cls(urls) if urls else None
+
+    async def _probe(self, client: httpx.AsyncClient, node: BrowserNode) -> bool:
+        """请求/json/version确认节点存活，并按/json/list统计其打开的页面数；部分代理不提供/json/list，此时负载记为0"""
+        self.stats["probes"] += 1
+        try:
+            response = await client.get(f"{node.http_url}/json/version")
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            self.stats["probe_failures"] += 1
+            node.failures += 1
+            node.last_error = str(e) or type(e).__name__
+            return False
+        try:
+            response = await client.get(f"{node.http_url}/json/list")
+            response.raise_for_status()
+            node.pages = sum(1 for target in response.json() if target.get("type") == "page")
+        except (httpx.HTTPError, ValueError, AttributeError):
+            node.pages = 0
+        node.failures = 0
+        node.healthy = True
+        node.last_error = ""
+        return True
+
+    async def choose(self, exclude: Optional[set[str]] = None) -> Optional[BrowserNode]:
+        """并发探测所有可用节点，返回打开页面最少的健康节点；没有健康节点时返回None"""
+        now = time.monotonic()
+        candidates = [node for node in self.nodes if node.available(now) and node.url not in (exclude or set())]
+        if not candidates:
+            return None
+        async with httpx.AsyncClient(timeout=PROBE_TIMEOUT) as client:
+            alive = await asyncio.gather(*(self._probe(client, node) for node in candidates))
+        for node, ok in zip(candidates, alive):
+            if not ok:
+                self.mark_dead(node, node.last_error)
+        healthy = [node for node, ok in zip(candidates, alive) if ok]
+        if not healthy:
+            return None
+        least = min(node.pages for node in healthy)
+        return random.choice([node for node in healthy if node.pages == least])
+
+    async def check(self, node: BrowserNode) -> bool:
+        """检查单个节点，连续失败MAX_PROBE_FAILURES次时标记为失效，返回节点是否仍可用"""
+        async with httpx.AsyncClient(timeout=PROBE_TIMEOUT) as client:
+            if await self._probe(client, node):
+                return True
+        if node.failures >= MAX_PROBE_FAILURES:
+            self.mark_dead(node, node.last_error)
+            return False
+        return True
+
+    def mark_dead(self, node: BrowserNode, reason: str) -> None:
+        """标记节点失效，冷却期内不再选择"""
+        if node.healthy:
+            print(f"💀 远程Chromium节点失效: {node.url}（{reason}），{int(NODE_COOLDOWN_SECONDS)}秒内不再使用")
+            self.stats["nodes_marked_dead"] += 1
+        node.healthy = False
+        node.last_error = reason
+        node.dead_until = time.monotonic() + NODE_COOLDOWN_SECONDS
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "nodes": [node.snapshot() for node in self.nodes]}
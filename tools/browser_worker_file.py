@@ -1,8 +1,16 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-browser_worker_file.py - 基于文件通信的Browser-Use执行脚本
-通过文件进行输入输出，完全避免stdout/stderr的编码问题
+browser_worker_file.py - Browser-Use执行脚本
+三种运行方式:
+  1. 单次模式: python browser_worker_file.py <input_file> <output_file>，通过文件进行输入输出
+  2. 常驻模式: python browser_worker_file.py --serve，由worker_pool.py启动，
+     预先启动共享Chromium（配置BROWSER_CDP_NODES时改为通过CDP连接远程Chromium节点，见browser_nodes.py），
+     每个任务使用上下文池中独立的浏览器上下文，
+     通过stdin/stdout管道收发长度前缀的JSON帧（见ipc_protocol.py）：
+     接收任务与取消请求，实时返回每步进度、心跳和最终结果
+  3. 模板模式: python browser_worker_file.py --fork-server <fd>，只完成导入，
+     之后按进程池的请求fork出常驻模式的Worker（见fork_server.py）
 简化版 - 去除浏览器验证和安装部分
 """
 
@@ -10,8 +18,10 @@ import asyncio
 import sys
 import json
 import os
+import time
 import traceback
 from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Optional
 
 # 设置UTF-8编码
 os.environ["PYTHONIOENCODING"] = "utf-8"
@@ -23,9 +33,46 @@ sys.path.insert(0, str(current_dir))
 # 禁用遥测
 os.environ["ANONYMIZED_TELEMETRY"] = "false"
 
+from ipc_protocol import HEARTBEAT_INTERVAL, ProtocolError, read_frame_async, write_frame
+
+if TYPE_CHECKING:
+    from browser_use.agent.views import AgentHistoryList
+
+# 常驻模式下stdout专用于和进程池通信，日志输出统一重定向到stderr
+SERVE_MODE = len(sys.argv) >= 2 and sys.argv[1] == "--serve"
+FORK_SERVER_MODE = len(sys.argv) >= 3 and sys.argv[1] == "--fork-server"
+channel = None
+if SERVE_MODE:
+    sys.stdout.flush()
+    channel = os.fdopen(os.dup(sys.stdout.fileno()), 'wb', buffering=0)
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+elif FORK_SERVER_MODE:
+    # 模板进程及其fork出的Worker的日志同样输出到stderr
+    sys.stdout.flush()
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+
+def send_message(message: dict) -> None:
+    """常驻模式：向进程池发送一帧消息"""
+    write_frame(channel, message)
+
+
 try:
     from browser_use import Agent, BrowserSession
-    from langchain_openai import ChatOpenAI
+
+    from action_replay import get_plan_cache, replay_plan
+    from browser_nodes import BrowserNodeSet
+    from context_pool import BrowserContextPool, chromium_rss_mb
+    from dom_compaction import DEFAULT_DOM_TOKEN_BUDGET, install_dom_compactor
+    from fast_path import classify as classify_fast_path, run_fast_path
+    from fork_server import serve_template
+    from http_cache import HttpCacheSession, get_disk_cache
+    from llm_client import LLMConfig, close_http_clients, create_llm, remember_tool_calling_method
+    from memory_governor import MemoryGovernor, worker_memory_cap_mb
+    from model_routing import ModelRouter
+    from task_budget import TaskBudget
+    from task_metrics import TaskMetrics, WorkerMetrics, worker_started_at
+    from request_policy import RequestPolicy
 
     print("✅ 成功导入browser_use和langchain_openai")
 except ImportError as e:
@@ -45,26 +92,305 @@ except ImportError as e:
             print(f"✅ 错误信息已写入: {output_file}")
         except Exception as write_error:
             print(f"❌ 写入错误文件失败: {write_error}")
+    if SERVE_MODE:
+        # 常驻模式：通知进程池初始化失败
+        send_message({"type": "ready", "ok": False, "error": f"导入模块失败: {str(e)}"})
+    if FORK_SERVER_MODE:
+        # 模板模式：通过控制套接字通知进程池
+        os.write(int(sys.argv[2]), json.dumps({"type": "ready", "ok": False, "error": f"导入模块失败: {str(e)}"},
+                                              ensure_ascii=False).encode("utf-8"))
     sys.exit(1)
 
 
-async def execute_browser_task(query: str, task_id: str) -> dict:
-    """执行Browser-Use任务的异步方法"""
-    browser_session = None
+# Docker环境必需的浏览器启动参数
+BROWSER_ARGS = [
+    '--no-sandbox',
+    '--disable-setuid-sandbox',
+    '--disable-dev-shm-usage',
+    '--disable-gpu',
+    '--ignore-certificate-errors',
+    '--ignore-ssl-errors',
+    '--disable-web-security',
+    '--allow-running-insecure-content',
+    '--disable-background-timer-throttling',
+    '--disable-backgrounding-occluded-windows',
+    '--disable-renderer-backgrounding',
+    '--disable-features=TranslateUI',
+    '--disable-ipc-flooding-protection',
+    '--disable-hang-monitor',
+    '--disable-client-side-phishing-detection',
+    '--disable-popup-blocking',
+    '--disable-prompt-on-repost',
+    '--disable-sync',
+    '--disable-extensions',
+    '--disable-plugins',
+    '--disable-images',
+    '--disable-javascript-harmony-shipping',
+    '--disable-background-networking',
+    '--disable-default-apps',
+    '--disable-translate',
+    '--disable-device-discovery-notifications',
+    '--disable-software-rasterizer',
+    '--disable-webgl',
+    '--disable-threaded-animation',
+    '--disable-threaded-scrolling',
+    '--disable-in-process-stack-traces',
+    '--disable-histogram-customizer',
+    '--disable-gl-extensions',
+    '--disable-composited-antialiasing',
+    '--disable-canvas-aa',
+    '--disable-3d-apis',
+    '--disable-accelerated-2d-canvas',
+    '--disable-accelerated-jpeg-decoding',
+    '--disable-accelerated-mjpeg-decode',
+    '--disable-app-list-dismiss-on-blur',
+    '--disable-accelerated-video-decode',
+    '--num-raster-threads=1',
+    '--max_old_space_size=1024',
+    '--single-process',
+    '--no-zygote',
+    '--memory-pressure-off'
+]
+
+# 系统消息配置
+EXTEND_SYSTEM_MESSAGE = """
+记住最重要的规则:
+1. 永远不要自动填入任何登录信息，除非用户提供了账户名及密码。
+2. 最后的输出结果,使用中文回答用户。
+3. 专注于快速获取页面的主要内容和信息。
+4. 避免执行不必要的复杂操作。
+"""
+
+EXTEND_PLANNER_SYSTEM_MESSAGE = """
+以下为补充的重要规则:
+1. 如果遇见"你的连接不是专用连接"、"不安全"、"证书错误"等安全警告页面:
+   - 立即寻找"高级"、"Advanced"、"详细信息"等按钮并点击
+   - 然后寻找"继续访问"、"继续前往"、"Proceed to"等链接并点击
+   - 这些操作是必须的，不要跳过
+2. 如果页面加载失败，请重试一次。
+3. 专注于获取页面的主要内容和信息。
+4. 尽量在5步以内完成任务。
+5. 如果页面加载缓慢，等待最多10秒后继续。
+"""
+
+
+# 新建浏览器上下文的参数（Playwright new_context格式）
+CONTEXT_OPTIONS = {
+    "viewport": {'width': 1280, 'height': 720},
+    "ignore_https_errors": True,
+    "accept_downloads": True,
+    "bypass_csp": True,
+}
+
+
+def create_browser_session(context_pool: "BrowserContextPool" = None, browser_context=None) -> "BrowserSession":
+    """
+    创建浏览器会话（未启动），keep_alive保证Agent结束后浏览器不被关闭
+    传入context_pool和browser_context时，会话直接使用共享Chromium上的该上下文；
+    上下文池连接的是远程节点时同时传入cdp_url，连接断开后会话不会在本机另起浏览器
+    """
+    if context_pool is not None:
+        remote = {"cdp_url": context_pool.node.url} if context_pool.node is not None else {}
+        return BrowserSession(
+            playwright=context_pool.playwright,
+            browser=context_pool.browser,
+            browser_context=browser_context,
+            headless=True,
+            viewport={'width': 1280, 'height': 720},
+            keep_alive=True,
+            args=BROWSER_ARGS,
+            **remote
+        )
+
+    return BrowserSession(
+        headless=True,
+        viewport={'width': 1280, 'height': 720},
+        context_options={
+            "ignoreHTTPSErrors": True,
+            "acceptDownloads": True,
+            "bypassCSP": True,
+        },
+        keep_alive=True,
+        args=BROWSER_ARGS
+    )
+
+
+# 进度消息中提取内容片段的最大长度
+PROGRESS_SNIPPET_CHARS = 500
+
+
+def build_step_reporter(on_progress: Callable[[dict], None], started_at: float, compaction=None):
+    """构造Agent的on_step_end钩子：每步结束后上报访问的URL、执行的动作和提取的内容，启用压缩时附带本步token数"""
+
+    async def on_step_end(agent: "Agent") -> None:
+        try:
+            history = agent.state.history.history
+            if not history:
+                return
+            item = history[-1]
+
+            actions = []
+            if item.model_output:
+                for action in item.model_output.action:
+                    actions.extend(action.model_dump(exclude_unset=True).keys())
+            extracted = [r.extracted_content for r in item.result if r.extracted_content]
+            errors = [r.error for r in item.result if r.error]
+
+            event = {
+                "step": len(history),
+                "url": item.state.url if item.state else "",
+                "actions": actions,
+                "extracted": extracted[-1][:PROGRESS_SNIPPET_CHARS] if extracted else "",
+                "error": errors[-1] if errors else "",
+                "elapsed_s": round(time.monotonic() - started_at, 2),
+            }
+            if compaction is not None and compaction.steps:
+                event["dom_tokens"] = compaction.steps[-1]
+            on_progress(event)
+        except Exception as report_error:
+            # 进度上报失败不影响任务本身
+            print(f"⚠️ 上报执行进度失败: {report_error}")
+
+    return on_step_end
+
+
+def summarize_history(query: str, history: "AgentHistoryList", replay_extracted: list[str]) -> dict:
+    """从Agent历史中取最终结果；回放阶段提取的内容排在LLM提取内容之前"""
+    # 获取最终结果
+    final_result = history.final_result()
+    print(f"📋 获取到final_result: {bool(final_result)}")
+
+    if final_result:
+        return {
+            "success": True,
+            "task": query,
+            "result": str(final_result),
+            "error": ""
+        }
+
+    # 备用方案1：从extracted_content获取
+    extracted_content = replay_extracted + history.extracted_content()
+    print(f"📋 获取到extracted_content: {len(extracted_content) if extracted_content else 0}条")
+
+    if extracted_content:
+        last_content = extracted_content[-1] if extracted_content else "未找到提取的内容"
+        return {
+            "success": True,
+            "task": query,
+            "result": str(last_content),
+            "error": ""
+        }
+
+    # 备用方案2：检查完成状态
+    is_done = history.is_done()
+    print(f"📋 任务完成状态: {is_done}")
+
+    if is_done:
+        return {
+            "success": True,
+            "task": query,
+            "result": "任务已完成，但未获取到具体结果内容",
+            "error": ""
+        }
+    else:
+        return {
+            "success": False,
+            "task": query,
+            "result": "",
+            "error": "任务未完成"
+        }
+
+
+def partial_result(query: str, history: "AgentHistoryList") -> dict:
+    """预算用尽且没有任何提取内容时，以最后所在页面和Agent记录的进度作为部分结果"""
+    urls = [url for url in history.urls() if url]
+    thoughts = history.model_thoughts()
+    parts = []
+    if urls:
+        parts.append(f"当前页面: {urls[-1]}")
+    if thoughts and thoughts[-1].memory:
+        parts.append(f"已完成的进度: {thoughts[-1].memory}")
+    if not parts:
+        return {
+            "success": False,
+            "task": query,
+            "result": "",
+            "error": "预算用尽，尚未获得任何结果"
+        }
+    return {
+        "success": True,
+        "task": query,
+        "result": "任务未在预算内完成。\n" + "\n".join(parts),
+        "error": ""
+    }
+
+
+# Agent默认最多执行的步数
+DEFAULT_MAX_STEPS = 100
+# 远程节点在任务执行中失效时换节点重试的次数，以及重试所需的最少剩余时间预算（秒）
+MAX_NODE_FAILOVERS = 1
+MIN_FAILOVER_SECONDS = 20
+# 动作序列全部回放成功后，留给LLM整理答案的步数
+REPLAY_FINISH_STEPS = 3
+REPLAY_MESSAGE_CONTEXT = (
+    "任务的前若干步已按历史动作序列自动回放执行，当前页面即为回放后的页面。"
+    "请基于当前页面状态继续完成任务，不要重复已经完成的导航和输入。"
+)
+
+
+async def execute_browser_task(query: str,
+                               task_id: str,
+                               browser_session: "BrowserSession" = None,
+                               on_progress: Optional[Callable[[dict], None]] = None,
+                               action_replay: bool = False,
+                               request_policy: Optional["RequestPolicy"] = None,
+                               http_cache: Optional["HttpCacheSession"] = None,
+                               fast_path: bool = False,
+                               dom_token_budget: int = 0,
+                               metrics: Optional["TaskMetrics"] = None,
+                               llm_config: Optional["LLMConfig"] = None,
+                               budget: Optional["TaskBudget"] = None,
+                               memory_governor: Optional["MemoryGovernor"] = None) -> dict:
+    """
+    执行Browser-Use任务的异步方法
+    传入browser_session时复用已启动的浏览器（常驻模式），任务结束后不关闭
+    传入on_progress时每个Agent步骤结束后回调一次进度信息
+    action_replay为True时优先回放匹配的历史动作序列（见action_replay.py），从第一处偏离开始交给LLM；
+    未命中时正常执行，成功后记录本次动作序列
+    传入request_policy时在本次任务的浏览器上下文上拦截资源请求，任务结束后移除
+    传入http_cache时静态资源经共享磁盘缓存读取，拦截策略先于磁盘缓存生效
+    fast_path为True时，直接读取URL的指令先走快速通道（见fast_path.py），页面需要交互时再交给Agent
+    dom_token_budget大于0时，每步发送给LLM的元素列表按该token预算压缩（见dom_compaction.py）
+    传入metrics时记录浏览器启动、每步LLM/DOM/动作耗时和token用量（见task_metrics.py）
+    llm_config为LLM端点配置（见llm_client.py），未传入时使用环境变量或默认端点；
+    其中配置了快速模型时启用模型分级路由（见model_routing.py），结果附带routing字段
+    budget为步数、时间和token预算（见task_budget.py），未传入时只限制步数；
+    预算用尽时停止Agent，从已有历史中整理部分结果并标记truncated
+    传入memory_governor时每步结束后检查内存占用，必要时释放内存或请求重启浏览器（见memory_governor.py）
+    """
+    owns_session = browser_session is None
+    llm_config = llm_config or LLMConfig()
     agent = None
+    started_at = time.monotonic()
+    budget = budget or TaskBudget(DEFAULT_MAX_STEPS, started_at=started_at)
+    plan_match = None
+    replay = None
 
     try:
         print(f"🔧 Worker进程开始执行任务ID: {task_id}")
         print(f"📋 任务内容: {query}")
 
-        # 初始化LLM
+        # 初始化LLM，常驻Worker内复用同一端点的HTTP连接
+        # 配置了快速模型时由快速模型选择动作，推理模型只负责规划、失败恢复和最终答复（见model_routing.py）
         try:
-            llm = ChatOpenAI(
-                model="DeepSeek",
-                openai_api_base="http://10.4.35.64:31111/v1",
-                timeout=30,
-                max_retries=3,
-            )
+            callbacks = [budget.llm_callback] + ([metrics.llm_callback] if metrics is not None else [])
+            llm = create_llm(llm_config, callbacks=callbacks)
+            router = None
+            action_llm = llm
+            if llm_config.fast_model and llm_config.fast_model != llm_config.model:
+                router = ModelRouter(llm_config.fast_model, llm_config.model)
+                action_llm = create_llm(llm_config, callbacks=callbacks, model=llm_config.fast_model)
+                print(f"🔀 模型分级路由: 动作 {llm_config.fast_model}，规划与答复 {llm_config.model}")
             print("✅ LLM初始化完成")
         except Exception as llm_error:
             print(f"❌ LLM初始化失败: {llm_error}")
@@ -75,120 +401,106 @@ async def execute_browser_task(query: str, task_id: str) -> dict:
                 "error": f"LLM初始化失败: {str(llm_error)}"
             }
 
-        # Docker环境必需的浏览器启动参数
-        browser_args = [
-            '--no-sandbox',
-            '--disable-setuid-sandbox',
-            '--disable-dev-shm-usage',
-            '--disable-gpu',
-            '--ignore-certificate-errors',
-            '--ignore-ssl-errors',
-            '--disable-web-security',
-            '--allow-running-insecure-content',
-            '--disable-background-timer-throttling',
-            '--disable-backgrounding-occluded-windows',
-            '--disable-renderer-backgrounding',
-            '--disable-features=TranslateUI',
-            '--disable-ipc-flooding-protection',
-            '--disable-hang-monitor',
-            '--disable-client-side-phishing-detection',
-            '--disable-popup-blocking',
-            '--disable-prompt-on-repost',
-            '--disable-sync',
-            '--disable-extensions',
-            '--disable-plugins',
-            '--disable-images',
-            '--disable-javascript-harmony-shipping',
-            '--disable-background-networking',
-            '--disable-default-apps',
-            '--disable-translate',
-            '--disable-device-discovery-notifications',
-            '--disable-software-rasterizer',
-            '--disable-webgl',
-            '--disable-threaded-animation',
-            '--disable-threaded-scrolling',
-            '--disable-in-process-stack-traces',
-            '--disable-histogram-customizer',
-            '--disable-gl-extensions',
-            '--disable-composited-antialiasing',
-            '--disable-canvas-aa',
-            '--disable-3d-apis',
-            '--disable-accelerated-2d-canvas',
-            '--disable-accelerated-jpeg-decoding',
-            '--disable-accelerated-mjpeg-decode',
-            '--disable-app-list-dismiss-on-blur',
-            '--disable-accelerated-video-decode',
-            '--num-raster-threads=1',
-            '--max_old_space_size=1024',
-            '--single-process',
-            '--no-zygote',
-            '--memory-pressure-off'
-        ]
-
-        try:
-            # 初始化浏览器会话
-            print("🔧 开始初始化浏览器会话...")
-            browser_session = BrowserSession(
-                headless=True,
-                viewport={'width': 1280, 'height': 720},
-                context_options={
-                    "ignoreHTTPSErrors": True,
-                    "acceptDownloads": True,
-                    "bypassCSP": True,
-                },
-                keep_alive=True,
-                args=browser_args
-            )
-            print("✅ 浏览器会话配置完成")
-
-            print("🚀 启动浏览器会话...")
+        if owns_session:
+            try:
+                # 初始化浏览器会话
+                print("🔧 开始初始化浏览器会话...")
+                browser_session = create_browser_session()
+                print("✅ 浏览器会话配置完成")
+
+                print("🚀 启动浏览器会话...")
+                browser_start = time.monotonic()
+                await browser_session.start()
+                if metrics is not None:
+                    metrics.stage("browser_start_s", time.monotonic() - browser_start)
+                print("✅ 浏览器会话启动成功")
+
+            except Exception as browser_start_error:
+                error_msg = f"浏览器启动失败: {str(browser_start_error)}"
+                print(f"❌ {error_msg}")
+                print(f"📋 详细错误: {traceback.format_exc()}")
+                return {
+                    "success": False,
+                    "task": query,
+                    "result": "",
+                    "error": error_msg
+                }
+        else:
+            # 会话绑定共享Chromium上的现有上下文，start()只建立连接，不会启动新浏览器
+            print("♻️ 复用共享浏览器上下文")
+            browser_start = time.monotonic()
             await browser_session.start()
-            print("✅ 浏览器会话启动成功")
-
-        except Exception as browser_start_error:
-            error_msg = f"浏览器启动失败: {str(browser_start_error)}"
-            print(f"❌ {error_msg}")
-            print(f"📋 详细错误: {traceback.format_exc()}")
-            return {
-                "success": False,
-                "task": query,
-                "result": "",
-                "error": error_msg
-            }
-
-        # 系统消息配置
-        extend_system_message = """
-        记住最重要的规则:
-        1. 永远不要自动填入任何登录信息，除非用户提供了账户名及密码。
-        2. 最后的输出结果,使用中文回答用户。
-        3. 专注于快速获取页面的主要内容和信息。
-        4. 避免执行不必要的复杂操作。
-        """
-
-        extend_planner_system_message = """
-        以下为补充的重要规则:
-        1. 如果遇见"你的连接不是专用连接"、"不安全"、"证书错误"等安全警告页面:
-           - 立即寻找"高级"、"Advanced"、"详细信息"等按钮并点击
-           - 然后寻找"继续访问"、"继续前往"、"Proceed to"等链接并点击
-           - 这些操作是必须的，不要跳过
-        2. 如果页面加载失败，请重试一次。
-        3. 专注于获取页面的主要内容和信息。
-        4. 尽量在5步以内完成任务。
-        5. 如果页面加载缓慢，等待最多10秒后继续。
-        """
+            if metrics is not None:
+                metrics.stage("session_connect_s", time.monotonic() - browser_start)
+
+        # Playwright按注册顺序的逆序调用路由：先注册磁盘缓存，拦截策略才能先做判断
+        if http_cache is not None:
+            await http_cache.attach(browser_session.browser_context)
+        if request_policy is not None:
+            await request_policy.attach(browser_session.browser_context)
+
+        fast_plan = classify_fast_path(query) if fast_path else None
+        if fast_plan is not None:
+            print(f"⚡ 快速通道（{fast_plan.mode}）: {fast_plan.url}")
+            try:
+                fast_result = await run_fast_path(await browser_session.get_current_page(), fast_plan, query, llm)
+            except Exception as fast_error:
+                print(f"⚠️ 快速通道执行失败，交给Agent: {fast_error}")
+                fast_result = None
+            if fast_result is not None:
+                elapsed_s = round(time.monotonic() - started_at, 2)
+                print(f"✅ 快速通道完成，耗时{elapsed_s}s")
+                if on_progress is not None:
+                    on_progress({
+                        "step": 1,
+                        "url": fast_result["url"],
+                        "actions": [f"fast_path_{fast_plan.mode}"],
+                        "extracted": fast_result["result"][:PROGRESS_SNIPPET_CHARS],
+                        "error": "",
+                        "elapsed_s": elapsed_s,
+                    })
+                return {
+                    "success": True,
+                    "task": query,
+                    "result": fast_result["result"],
+                    "error": "",
+                    "fast_path": {
+                        "mode": fast_plan.mode,
+                        "url": fast_result["url"],
+                        "chars": fast_result["chars"],
+                        "llm_calls": fast_result["llm_calls"],
+                        "elapsed_s": elapsed_s,
+                    }
+                }
+
+        if action_replay:
+            try:
+                plan_match = get_plan_cache().match(query)
+            except Exception as match_error:
+                print(f"⚠️ 查找动作序列缓存失败: {match_error}")
+            if plan_match:
+                print(f"🔁 命中动作序列缓存: {plan_match[1]['template']}")
 
         # 创建Browser-Use Agent
         try:
             print("🤖 创建Agent...")
             agent = Agent(
                 task=query,
-                llm=llm,
+                llm=action_llm,
                 use_vision=False,
                 browser_session=browser_session,
-                extend_system_message=extend_system_message,
-                extend_planner_system_message=extend_planner_system_message
+                extend_system_message=EXTEND_SYSTEM_MESSAGE,
+                extend_planner_system_message=EXTEND_PLANNER_SYSTEM_MESSAGE,
+                message_context=REPLAY_MESSAGE_CONTEXT if plan_match else None,
+                planner_llm=llm if router is not None else None
             )
             print("✅ Agent创建完成")
+            remember_tool_calling_method(llm_config, action_llm)
+            if router is not None:
+                router.install(agent)
+            compaction = install_dom_compactor(agent, dom_token_budget) if dom_token_budget > 0 else None
+            if metrics is not None:
+                metrics.instrument_agent(agent)
         except Exception as agent_error:
             print(f"❌ Agent创建失败: {agent_error}")
             return {
@@ -198,9 +510,57 @@ async def execute_browser_task(query: str, task_id: str) -> dict:
                 "error": f"Agent创建失败: {str(agent_error)}"
             }
 
+        max_steps = budget.max_steps
+        if plan_match:
+            plan_path, plan, replacements = plan_match
+            print("🔁 开始回放动作序列...")
+            try:
+                replay = await replay_plan(agent, plan, replacements)
+            except Exception as replay_error:
+                # 序列无法还原（如browser_use版本升级后动作格式变化），整体交给LLM
+                print(f"⚠️ 动作序列回放失败: {replay_error}")
+                replay = {"steps_replayed": 0, "total_steps": 0, "diverged_at": 1, "extracted": []}
+            print(f"🔁 回放完成 {replay['steps_replayed']}/{replay['total_steps']}步")
+            if replay["diverged_at"] is None:
+                max_steps = REPLAY_FINISH_STEPS
+                get_plan_cache().mark_success(plan_path)
+            else:
+                get_plan_cache().mark_failure(plan_path)
+                max_steps = max(1, budget.max_steps - replay["steps_replayed"])
+
         try:
             print("🎯 开始执行任务...")
-            history = await agent.run()
+            step_start_hooks = [budget.on_step_start]
+            if metrics is not None:
+                step_start_hooks.append(metrics.on_step_start)
+            if router is not None:
+                step_start_hooks.append(router.on_step_start)
+            step_end_hooks = [budget.on_step_end]
+            if metrics is not None:
+                step_end_hooks.append(metrics.on_step_end)
+            if memory_governor is not None:
+                step_end_hooks.append(memory_governor.on_step_end)
+            if on_progress is not None:
+                step_end_hooks.append(build_step_reporter(on_progress, started_at, compaction))
+
+            async def on_step_start(step_agent: "Agent") -> None:
+                for hook in step_start_hooks:
+                    await hook(step_agent)
+
+            async def on_step_end(step_agent: "Agent") -> None:
+                for hook in step_end_hooks:
+                    await hook(step_agent)
+
+            run = agent.run(max_steps=max_steps, on_step_start=on_step_start, on_step_end=on_step_end)
+            remaining_s = budget.remaining_seconds()
+            try:
+                # 单步卡住超出时间预算时中止执行，已完成步骤的历史仍保留在agent.state中
+                history = await (asyncio.wait_for(run, remaining_s) if remaining_s is not None else run)
+            except asyncio.TimeoutError:
+                budget.stop(None, "max_wall_seconds")
+                history = agent.state.history
+            if budget.stopped_by is None and not history.is_done() and history.number_of_steps() >= max_steps:
+                budget.stopped_by = "max_steps"
             print("✅ 任务执行完成")
         except Exception as run_error:
             print(f"❌ 任务执行失败: {run_error}")
@@ -211,50 +571,49 @@ async def execute_browser_task(query: str, task_id: str) -> dict:
                 "error": f"任务执行失败: {str(run_error)}"
             }
 
-        # 获取最终结果
-        final_result = history.final_result()
-        print(f"📋 获取到final_result: {bool(final_result)}")
-
-        if final_result:
-            return {
-                "success": True,
-                "task": query,
-                "result": str(final_result),
-                "error": ""
-            }
-
-        # 备用方案1：从extracted_content获取
-        extracted_content = history.extracted_content()
-        print(f"📋 获取到extracted_content: {len(extracted_content) if extracted_content else 0}条")
-
-        if extracted_content:
-            last_content = extracted_content[-1] if extracted_content else "未找到提取的内容"
-            return {
-                "success": True,
-                "task": query,
-                "result": str(last_content),
-                "error": ""
+        if action_replay and plan_match is None and budget.stopped_by is None and history.is_done() and history.is_successful() is not False:
+            try:
+                if get_plan_cache().record(query, history.model_dump()):
+                    print("💾 已记录本次动作序列")
+            except Exception as record_error:
+                print(f"⚠️ 记录动作序列失败: {record_error}")
+
+        result = summarize_history(query, history, replay["extracted"] if replay else [])
+        if budget.stopped_by is not None:
+            if not result["success"]:
+                result = partial_result(query, history)
+            result["truncated"] = True
+            print(f"✂️ 预算用尽（{budget.stopped_by}），返回部分结果")
+        result["budget"] = budget.snapshot()
+        if router is not None:
+            # 预算用尽时不再调用推理模型整理答复
+            if result["success"] and budget.stopped_by is None:
+                extracted = (replay["extracted"] if replay else []) + history.extracted_content()
+                summary = router.final_summary(llm, query, result["result"], extracted)
+                remaining_s = budget.remaining_seconds()
+                try:
+                    # 最终答复同样受时间预算约束，超时时保留快速模型的结论作为部分结果返回
+                    answer = await (asyncio.wait_for(summary, remaining_s) if remaining_s is not None else summary)
+                except asyncio.TimeoutError:
+                    budget.stop(None, "max_wall_seconds")
+                    answer = None
+                    result["truncated"] = True
+                    result["budget"] = budget.snapshot()
+                    print("✂️ 生成最终答复超出时间预算，返回快速模型的结论")
+                if answer:
+                    result["result"] = answer
+            result["routing"] = router.snapshot(metrics.model_totals() if metrics is not None else None)
+        if compaction is not None:
+            result["dom_compaction"] = compaction.snapshot()
+            print(f"📉 元素列表压缩节省: {result['dom_compaction']['tokens_saved']} tokens")
+        if replay is not None:
+            result["replay"] = {
+                "steps_replayed": replay["steps_replayed"],
+                "total_steps": replay["total_steps"],
+                "diverged_at": replay["diverged_at"],
+                "llm_steps": history.number_of_steps(),
             }
-
-        # 备用方案2：检查完成状态
-        is_done = history.is_done()
-        print(f"📋 任务完成状态: {is_done}")
-
-        if is_done:
-            return {
-                "success": True,
-                "task": query,
-                "result": "任务已完成，但未获取到具体结果内容",
-                "error": ""
-            }
-        else:
-            return {
-                "success": False,
-                "task": query,
-                "result": "",
-                "error": "任务未完成"
-            }
-
+        return result
     except Exception as e:
         error_msg = f"Agent执行错误: {str(e)}"
         print(f"❌ {error_msg}")
@@ -267,26 +626,272 @@ async def execute_browser_task(query: str, task_id: str) -> dict:
         }
 
     finally:
-        # 确保浏览器会话被正确关闭
-        print("🧹 开始清理资源...")
+        if request_policy is not None:
+            await request_policy.detach()
+        if http_cache is not None:
+            await http_cache.detach()
+        if owns_session:
+            # 确保浏览器会话被正确关闭
+            print("🧹 开始清理资源...")
+            try:
+                if agent and hasattr(agent, 'browser_session') and agent.browser_session:
+                    await agent.browser_session.close()
+                    print("✅ Agent的浏览器会话已关闭")
+                elif browser_session:
+                    await browser_session.close()
+                    print("✅ 浏览器会话已关闭")
+            except Exception as cleanup_error:
+                print(f"⚠️ 清理资源时出错: {str(cleanup_error)}")
+
+
+async def run_serve_task(context_pool: "BrowserContextPool", message: dict, fatal: asyncio.Event,
+                         worker_metrics: "WorkerMetrics", memory_cap_mb: float = 0) -> None:
+    """
+    常驻模式下执行单个任务并发送结果，任务被取消时返回取消结果；结果附带metrics并累计到Worker指标
+    无论任务以何种方式结束（包括取浏览器上下文时被取消、执行中抛出异常）都恰好发送一次result帧，
+    否则Worker仍在发送心跳，进程池会一直等到任务超时
+    """
+    task_id = message.get('task_id', 'unknown')
+    try:
+        result = await _execute_serve_task(context_pool, message, fatal, worker_metrics, memory_cap_mb)
+    except asyncio.CancelledError:
+        print(f"🛑 任务已取消: {task_id}")
+        result = {
+            "success": False,
+            "task": message.get('query', ''),
+            "result": "",
+            "error": "任务已取消"
+        }
+    except Exception as task_error:
+        print(f"❌ 任务执行异常: {task_error}")
+        print(f"📋 详细错误: {traceback.format_exc()}")
+        result = {
+            "success": False,
+            "task": message.get('query', ''),
+            "result": "",
+            "error": f"任务执行异常: {str(task_error)}"
+        }
+    send_message({"type": "result", "task_id": task_id, "result": result})
+
+
+async def _execute_serve_task(context_pool: "BrowserContextPool", message: dict, fatal: asyncio.Event,
+                              worker_metrics: "WorkerMetrics", memory_cap_mb: float) -> dict:
+    """
+    执行单个任务并返回结果，未处理的异常和取消由run_serve_task转换为失败结果
+    memory_cap_mb为Worker与其Chromium的内存上限，超过时先释放内存，持续超限时重启浏览器
+    上下文池连接远程节点时，节点在执行中失效的任务换节点重试（最多MAX_NODE_FAILOVERS次），结果附带node_failovers
+    """
+    query = message.get('query', '')
+    task_id = message.get('task_id', 'unknown')
+    if not query:
+        return {
+            "success": False,
+            "task": "",
+            "result": "",
+            "error": "任务查询内容为空"
+        }
+
+    metrics = TaskMetrics(worker_startup_s=worker_metrics.startup_s, worker_task_index=worker_metrics.tasks + 1)
+    metrics.start_sampling(chromium_rss_mb)
+    try:
+        memory_governor = MemoryGovernor(memory_cap_mb, chromium_rss_mb, context_pool, metrics.record_memory)
+        memory_governor.before_task()
+        # 时间预算从Worker收到任务开始计算，包含取浏览器上下文的时间
+        budget = TaskBudget(
+            max_steps=int(message.get('max_steps') or DEFAULT_MAX_STEPS),
+            max_wall_seconds=float(message.get('max_wall_seconds') or 0),
+            max_llm_tokens=int(message.get('max_llm_tokens') or 0),
+        )
+        request_policy = RequestPolicy.from_options(message)
+        # 显式传入的0表示关闭压缩，只有未传时才使用BROWSER_DOM_TOKEN_BUDGET
+        dom_token_budget = message.get('dom_token_budget')
+        dom_token_budget = int(dom_token_budget) if dom_token_budget is not None else DEFAULT_DOM_TOKEN_BUDGET
+        disk_cache = get_disk_cache()
+        http_cache = HttpCacheSession(disk_cache) if disk_cache is not None else None
+        failed_nodes: list[str] = []
+        while True:
+            try:
+                acquire_start = time.monotonic()
+                browser_context = await context_pool.acquire()
+                metrics.stage("context_acquire_s", time.monotonic() - acquire_start)
+            except Exception as acquire_error:
+                # 共享浏览器无法恢复时退出，由进程池重建Worker
+                print(f"❌ 获取浏览器上下文失败，Worker退出: {acquire_error}")
+                fatal.set()
+                return {
+                    "success": False,
+                    "task": query,
+                    "result": "",
+                    "error": f"获取浏览器上下文失败: {str(acquire_error)}"
+                }
+
+            node_url = context_pool.node.url if context_pool.node is not None else None
+            cancelled = False
+            try:
+                browser_session = create_browser_session(context_pool, browser_context)
+                result = await execute_browser_task(
+                    query, task_id,
+                    browser_session=browser_session,
+                    on_progress=lambda event: send_message({"type": "progress", "task_id": task_id, **event}),
+                    action_replay=bool(message.get('action_replay', False)),
+                    request_policy=request_policy,
+                    http_cache=http_cache,
+                    fast_path=bool(message.get('fast_path', False)),
+                    dom_token_budget=dom_token_budget,
+                    metrics=metrics,
+                    llm_config=LLMConfig.from_message(message.get('llm')),
+                    budget=budget,
+                    memory_governor=memory_governor
+                )
+            except asyncio.CancelledError:
+                print(f"🛑 任务已取消: {task_id}")
+                cancelled = True
+                result = {
+                    "success": False,
+                    "task": query,
+                    "result": "",
+                    "error": "任务已取消"
+                }
+            finally:
+                node_lost = context_pool.node_lost(browser_context)
+                try:
+                    await context_pool.release(browser_context)
+                except Exception as release_error:
+                    # 归还失败不影响已得到的结果，上下文池在下次取上下文时自行恢复
+                    print(f"⚠️ 归还浏览器上下文失败: {release_error}")
+
+            # 远程节点在执行中失效时换节点重试，重试共用原有的时间预算
+            remaining = budget.remaining_seconds()
+            if (not node_lost or cancelled or result.get("success") or len(failed_nodes) >= MAX_NODE_FAILOVERS
+                    or (remaining is not None and remaining < MIN_FAILOVER_SECONDS)):
+                break
+            failed_nodes.append(node_url)
+            print(f"🔀 远程Chromium节点在任务执行中失效（{node_url}），换节点重试: {task_id}")
+    finally:
+        metrics.finish()
+
+    if failed_nodes:
+        result["node_failovers"] = failed_nodes
+    result["metrics"] = metrics.snapshot()
+    worker_metrics.record(result["metrics"], bool(result.get("success")))
+    worker_metrics.write()
+    result["browser"] = context_pool.snapshot()
+    result["requests"] = request_policy.snapshot()
+    if http_cache is not None:
+        result["http_cache"] = http_cache.snapshot()
+    return result
+
+
+async def send_heartbeats(running: dict) -> None:
+    """定期发送心跳，让进程池区分任务耗时长和Worker卡死"""
+    while True:
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        send_message({"type": "heartbeat", "running": len(running)})
+
+
+async def serve() -> None:
+    """常驻模式主循环：启动一次共享Chromium，之后每个任务从上下文池取独立上下文执行"""
+    loop = asyncio.get_running_loop()
+    # 配置BROWSER_CDP_NODES时连接远程Chromium节点，否则在本机启动
+    context_pool = BrowserContextPool(BROWSER_ARGS, CONTEXT_OPTIONS, nodes=BrowserNodeSet.from_env())
+
+    try:
+        print("🚀 预启动共享浏览器...")
+        await context_pool.start()
+    except Exception as browser_start_error:
+        print(f"📋 详细错误: {traceback.format_exc()}")
+        send_message({"type": "ready", "ok": False, "error": f"浏览器启动失败: {str(browser_start_error)}"})
+        return
+
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin.buffer)
+
+    worker_metrics = WorkerMetrics()
+    worker_metrics.startup_s = round(time.time() - worker_started_at(), 3)
+    print(f"⏱️ Worker启动耗时: {worker_metrics.startup_s}s")
+    # 进程池按主机内存和池大小通过BROWSER_WORKER_MEMORY_MB传入上限，单独运行时按主机上限计算
+    memory_cap_mb = worker_memory_cap_mb(1)
+    send_message({"type": "ready", "ok": True, "pid": os.getpid(), "startup_s": worker_metrics.startup_s})
+
+    running: dict[str, asyncio.Task] = {}
+    fatal = asyncio.Event()
+    heartbeat = asyncio.create_task(send_heartbeats(running))
+    fatal_waiter = asyncio.create_task(fatal.wait())
+
+    try:
+        while True:
+            next_frame = asyncio.create_task(read_frame_async(reader))
+            await asyncio.wait({next_frame, fatal_waiter}, return_when=asyncio.FIRST_COMPLETED)
+            if fatal.is_set():
+                next_frame.cancel()
+                break
+
+            try:
+                message = next_frame.result()
+            except ProtocolError as e:
+                print(f"❌ 任务通道数据异常，Worker退出: {e}")
+                break
+            if message is None:
+                print("📭 任务通道已关闭，Worker退出")
+                break
+
+            message_type = message.get("type")
+            if message_type == "shutdown":
+                print("🛑 收到退出指令")
+                break
+            elif message_type == "cancel":
+                task = running.get(message.get("task_id"))
+                if task is not None:
+                    task.cancel()
+            elif message_type == "task":
+                task_id = message.get('task_id', 'unknown')
+                task = asyncio.create_task(run_serve_task(context_pool, message, fatal, worker_metrics, memory_cap_mb))
+                running[task_id] = task
+                task.add_done_callback(lambda _, task_id=task_id: running.pop(task_id, None))
+
+    finally:
+        heartbeat.cancel()
+        fatal_waiter.cancel()
+        for task in list(running.values()):
+            task.cancel()
+        if running:
+            await asyncio.gather(*running.values(), return_exceptions=True)
+
+        worker_metrics.remove()
+        await close_http_clients()
+        print("🧹 关闭共享浏览器...")
         try:
-            if agent and hasattr(agent, 'browser_session') and agent.browser_session:
-                await agent.browser_session.close()
-                print("✅ Agent的浏览器会话已关闭")
-            elif browser_session:
-                await browser_session.close()
-                print("✅ 浏览器会话已关闭")
+            await context_pool.close()
         except Exception as cleanup_error:
-            print(f"⚠️ 清理资源时出错: {str(cleanup_error)}")
+            print(f"⚠️ 关闭浏览器时出错: {str(cleanup_error)}")
+
+
+def run_forked_worker(channel_fd: int) -> None:
+    """模板fork出的子进程：以通信套接字作为stdin和帧输出通道，按常驻模式运行"""
+    global channel
+    channel = os.fdopen(os.dup(channel_fd), 'wb', buffering=0)
+    os.dup2(channel_fd, sys.stdin.fileno())
+    os.close(channel_fd)
+    asyncio.run(serve())
 
 
 def main():
     """主函数"""
     print("🚀 开始执行main函数...")
 
+    if SERVE_MODE:
+        asyncio.run(serve())
+        return
+
+    if FORK_SERVER_MODE:
+        serve_template(int(sys.argv[2]), run_forked_worker, round(time.time() - worker_started_at(), 3))
+        return
+
     if len(sys.argv) != 3:
         print("❌ 参数错误")
         print("使用方法: python browser_worker_file.py <input_file> <output_file>")
+        print("     或: python browser_worker_file.py --serve")
+        print("     或: python browser_worker_file.py --fork-server <fd>")
         sys.exit(1)
 
     input_file = Path(sys.argv[1])
@@ -315,7 +920,11 @@ def main():
 
         # 执行任务
         print("🎯 开始执行异步任务...")
-        result = asyncio.run(execute_browser_task(query, task_id))
+        metrics = TaskMetrics(worker_startup_s=time.time() - worker_started_at(), worker_task_index=1)
+        result = asyncio.run(execute_browser_task(query, task_id, request_policy=RequestPolicy(), metrics=metrics,
+                                                  llm_config=LLMConfig.from_message(task_data.get('llm'))))
+        metrics.finish()
+        result["metrics"] = metrics.snapshot()
         print(f"✅ 任务执行完成，结果: {result}")
 
         # 写入结果文件
@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+context_pool.py - 共享Chromium的浏览器上下文池
+每个Worker只启动一个Chromium进程，任务之间通过独立的BrowserContext隔离Cookie和存储。
+创建上下文只需毫秒级，而启动浏览器需要数秒；浏览器在执行N个任务后或内存超限时整体重启
+配置远程节点时（见browser_nodes.py）不在本机启动Chromium，而是通过CDP连接负载最低的远程节点，
+"重启"即断开后重新选择节点；连接期间定期检查节点健康，节点失效时断开连接，下一个任务改连其他节点
+"""
+
+import asyncio
+import os
+from typing import TYPE_CHECKING, Optional
+from urllib.parse import urlsplit
+
+from playwright.async_api import async_playwright
+
+if TYPE_CHECKING:
+    from browser_nodes import BrowserNode, BrowserNodeSet
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# 上下文池配置，可通过环境变量覆盖
+DEFAULT_CONTEXT_POOL_SIZE = int(os.environ.get("BROWSER_CONTEXT_POOL_SIZE", "2"))
+DEFAULT_CONTEXT_MAX_USES = int(os.environ.get("BROWSER_CONTEXT_MAX_USES", "1"))
+DEFAULT_BROWSER_MAX_TASKS = int(os.environ.get("BROWSER_RESTART_TASKS", "50"))
+DEFAULT_BROWSER_MAX_RSS_MB = float(os.environ.get("BROWSER_RESTART_RSS_MB", "512"))
+# 热点主机，逗号分隔的URL或域名；上下文预建和取出时提前完成DNS解析与TLS握手
+DEFAULT_PRECONNECT_HOSTS = os.environ.get("BROWSER_PRECONNECT_HOSTS", "")
+PRECONNECT_TIMEOUT = 2.0
+
+CHROMIUM_PROCESS_NAMES = ("chrome", "chromium", "headless_shell")
+
+
+def chromium_rss_mb() -> float:
+    """统计当前进程下所有Chromium子进程的常驻内存（MB），缺少psutil时返回0"""
+    if psutil is None:
+        return 0.0
+    total = 0
+    try:
+        for child in psutil.Process().children(recursive=True):
+            try:
+                if any(name in child.name().lower() for name in CHROMIUM_PROCESS_NAMES):
+                    total += child.memory_info().rss
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+    except psutil.Error:
+        return 0.0
+    return total / (1024 * 1024)
+
+
+def parse_preconnect_origins(raw: str) -> list[str]:
+    """把"a.com, https://b.com:8443"之类的配置转换为源列表，未写协议时按https处理"""
+    origins = []
+    for item in raw.replace("，", ",").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        origin = _origin_of(item if "://" in item else f"https://{item}")
+        if origin and origin not in origins:
+            origins.append(origin)
+    return origins
+
+
+def _origin_of(url: str) -> Optional[str]:
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.netloc:
+        return None
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+class BrowserContextPool:
+    """
+    单个Chromium实例上的上下文池
+    - size: 预先创建的空闲上下文数量
+    - max_context_uses: 上下文最多使用几次；为1时每个任务结束后直接关闭重建，
+      大于1时在任务之间清理Cookie、权限、存储和多余标签页后复用
+    - max_browser_tasks / max_browser_rss_mb: 达到任一阈值后在空闲时重启整个浏览器
+    - preconnect_hosts: 热点主机，在上下文中预先建立连接
+    - nodes: 远程Chromium节点，传入时通过CDP连接节点而不在本机启动浏览器
+    """
+
+    def __init__(self,
+                 launch_args: list[str],
+                 context_options: dict,
+                 headless: bool = True,
+                 size: int = DEFAULT_CONTEXT_POOL_SIZE,
+                 max_context_uses: int = DEFAULT_CONTEXT_MAX_USES,
+                 max_browser_tasks: int = DEFAULT_BROWSER_MAX_TASKS,
+                 max_browser_rss_mb: float = DEFAULT_BROWSER_MAX_RSS_MB,
+                 preconnect_hosts: str = DEFAULT_PRECONNECT_HOSTS,
+                 nodes: Optional["BrowserNodeSet"] = None):
+        self.launch_args = launch_args
+        self.context_options = context_options
+        self.headless = headless
+        self.size = max(1, size)
+        self.max_context_uses = max(1, max_context_uses)
+        self.max_browser_tasks = max(1, max_browser_tasks)
+        self.max_browser_rss_mb = max_browser_rss_mb
+        self.preconnect_origins = parse_preconnect_origins(preconnect_hosts)
+        self.nodes = nodes
+        self.node: Optional["BrowserNode"] = None
+        self._health_checker: Optional[asyncio.Task] = None
+
+        self.playwright = None
+        self.browser = None
+        self._idle: list = []
+        self._uses: dict = {}
+        self._origins: dict = {}
+        self._in_use = 0
+        self._tasks_since_launch = 0
+        self._restart_pending = False
+        self._lock = asyncio.Lock()
+        # 后台进行中的上下文回收（清理、重建、重启浏览器）
+        self._recycling: set[asyncio.Task] = set()
+        self.stats = {
+            "browser_launches": 0,
+            "browser_restarts_requested": 0,
+            "contexts_created": 0,
+            "contexts_reused": 0,
+            "preconnects": 0,
+            "node_connects": 0,
+            "node_failovers": 0,
+        }
+
+    async def start(self) -> None:
+        self.playwright = await async_playwright().start()
+        await self._launch_browser()
+        if self.nodes is not None and self.nodes.health_interval > 0:
+            self._health_checker = asyncio.create_task(self._check_node_health())
+
+    async def _launch_browser(self) -> None:
+        if self.nodes is not None:
+            await self._connect_node()
+        else:
+            print("🚀 启动共享Chromium...")
+            self.browser = await self.playwright.chromium.launch(headless=self.headless, args=self.launch_args)
+        self._tasks_since_launch = 0
+        self.stats["browser_launches"] += 1
+        for _ in range(self.size):
+            context = await self._new_context()
+            await self._preconnect(context)
+            self._idle.append(context)
+        print(f"✅ 共享Chromium已启动，预建上下文: {len(self._idle)}个")
+
+    async def _connect_node(self) -> None:
+        """通过CDP连接负载最低的健康节点，连接失败的节点标记为失效后换下一个，全部不可用时抛出异常"""
+        tried: set[str] = set()
+        while True:
+            node = await self.nodes.choose(exclude=tried)
+            if node is None:
+                raise RuntimeError(f"没有可用的远程Chromium节点（共{len(self.nodes.nodes)}个）")
+            tried.add(node.url)
+            print(f"🌐 连接远程Chromium节点: {node.url}（当前{node.pages}个页面）")
+            try:
+                self.browser = await self.playwright.chromium.connect_over_cdp(node.url,
+                                                                         timeout=self.nodes.connect_timeout * 1000)
+            except Exception as e:
+                self.nodes.mark_dead(node, f"连接失败: {e}")
+                continue
+            self.node = node
+            self.stats["node_connects"] += 1
+            return
+
+    async def _check_node_health(self) -> None:
+        """定期检查当前连接的节点；节点失效时断开连接，执行中的任务随即失败，下次取上下文时改连其他节点"""
+        while True:
+            await asyncio.sleep(self.nodes.health_interval)
+            node, browser = self.node, self.browser
+            if node is None or browser is None or not browser.is_connected():
+                continue
+            if await self.nodes.check(node):
+                continue
+            print(f"🔀 远程Chromium节点失效，断开连接，后续任务改连其他节点: {node.url}")
+            self.stats["node_failovers"] += 1
+            try:
+                await browser.close()
+            except Exception:
+                pass
+
+    def node_lost(self, context) -> bool:
+        """远程模式下该上下文所在的浏览器连接已断开（节点失效或网络中断），任务可以换节点重试"""
+        if self.nodes is None:
+            return False
+        browser = context.browser
+        return browser is None or not browser.is_connected()
+
+    async def _new_context(self):
+        context = await self.browser.new_context(**self.context_options)
+        self._uses[context] = 0
+        self._origins[context] = set()
+        # 记录访问过的源，复用前按源清理localStorage/IndexedDB等存储
+        context.on("page", lambda page: self._track_page(context, page))
+        self.stats["contexts_created"] += 1
+        return context
+
+    async def _preconnect(self, context) -> None:
+        """在上下文的空白页中声明preconnect，让Chromium提前完成热点主机的DNS解析、TCP和TLS握手"""
+        if not self.preconnect_origins:
+            return
+        links = "".join(
+            f'<link rel="dns-prefetch" href="{origin}"><link rel="preconnect" href="{origin}">'
+            f'<link rel="preconnect" href="{origin}" crossorigin>'
+            for origin in self.preconnect_origins
+        )
+        try:
+            page = context.pages[0] if context.pages else await context.new_page()
+            await asyncio.wait_for(page.set_content(f"<html><head>{links}</head></html>"), PRECONNECT_TIMEOUT)
+            self.stats["preconnects"] += 1
+        except Exception as e:
+            print(f"⚠️ 预连接热点主机失败: {e}")
+
+    def _track_page(self, context, page) -> None:
+        def on_navigated(frame):
+            origin = _origin_of(frame.url)
+            if origin and context in self._origins:
+                self._origins[context].add(origin)
+        page.on("framenavigated", on_navigated)
+
+    async def acquire(self):
+        """取出一个空闲上下文；上下文回收或浏览器重启尚未完成时等待"""
+        await self._wait_recycled()
+        async with self._lock:
+            if self.browser is None or not self.browser.is_connected():
+                print("⚠️ 共享Chromium已断开，重新启动" if self.nodes is None else "⚠️ 远程Chromium连接已断开，重新选择节点")
+                await self._discard_all()
+                await self._launch_browser()
+            elif self._restart_pending and self._in_use == 0:
+                await self._restart_browser()
+            context = self._idle.pop() if self._idle else await self._new_context()
+            # 空闲期间Chromium会关闭未使用的预连接，取出时重新预热，与LLM首次调用并行完成握手
+            await self._preconnect(context)
+            self._in_use += 1
+            self._uses[context] += 1
+            if self._uses[context] > 1:
+                self.stats["contexts_reused"] += 1
+            return context
+
+    async def release(self, context) -> None:
+        """
+        归还上下文，立即返回：清理复用或关闭重建、必要时重启浏览器都在后台进行，
+        调用方不必等回收完成就能发送任务结果，下一次acquire会等待回收完成
+        """
+        self._in_use -= 1
+        self._tasks_since_launch += 1
+        task = asyncio.create_task(self._recycle(context))
+        self._recycling.add(task)
+        task.add_done_callback(self._recycling.discard)
+
+    async def _wait_recycled(self) -> None:
+        if self._recycling:
+            await asyncio.gather(*self._recycling, return_exceptions=True)
+
+    async def _recycle(self, context) -> None:
+        """按使用次数清理复用或关闭重建，必要时重启浏览器"""
+        try:
+            async with self._lock:
+                await self._recycle_locked(context)
+        except Exception as recycle_error:
+            # 浏览器状态异常时下次acquire会发现连接已断开并重新启动
+            print(f"⚠️ 回收浏览器上下文失败: {recycle_error}")
+
+    async def _recycle_locked(self, context) -> None:
+        reusable = self._uses.get(context, 0) < self.max_context_uses
+        if reusable:
+            try:
+                await self._reset_context(context)
+                self._idle.append(context)
+            except Exception as reset_error:
+                print(f"⚠️ 清理上下文失败，改为重建: {reset_error}")
+                reusable = False
+        if not reusable:
+            await self._close_context(context)
+            if self.browser is not None and self.browser.is_connected() and len(self._idle) < self.size:
+                self._idle.append(await self._new_context())
+
+        if not self._restart_pending and self._should_restart():
+            self._restart_pending = True
+        if self._restart_pending and self._in_use == 0:
+            await self._restart_browser()
+
+    async def _reset_context(self, context) -> None:
+        pages = list(context.pages)
+        for page in pages[1:]:
+            await page.close()
+        page = pages[0] if pages else await context.new_page()
+
+        origins = self._origins.get(context, set())
+        if origins:
+            cdp = await context.new_cdp_session(page)
+            try:
+                for origin in origins:
+                    await cdp.send("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"})
+            finally:
+                await cdp.detach()
+            origins.clear()
+
+        await page.goto("about:blank")
+        await context.clear_cookies()
+        await context.clear_permissions()
+
+    def request_restart(self, reason: str) -> None:
+        """请求重启浏览器（如内存持续超限），在没有任务使用上下文时执行"""
+        if not self._restart_pending:
+            print(f"♻️ {reason}，浏览器将在空闲时重启")
+            self.stats["browser_restarts_requested"] += 1
+        self._restart_pending = True
+
+    def _should_restart(self) -> bool:
+        if self._tasks_since_launch >= self.max_browser_tasks:
+            print(f"♻️ 浏览器已执行{self._tasks_since_launch}个任务，准备重启")
+            return True
+        rss_mb = chromium_rss_mb()
+        if self.max_browser_rss_mb > 0 and rss_mb > self.max_browser_rss_mb:
+            print(f"♻️ 浏览器内存{rss_mb:.0f}MB超过阈值{self.max_browser_rss_mb:.0f}MB，准备重启")
+            return True
+        return False
+
+    async def _restart_browser(self) -> None:
+        self._restart_pending = False
+        await self._discard_all()
+        await self._launch_browser()
+
+    async def _close_context(self, context) -> None:
+        self._uses.pop(context, None)
+        self._origins.pop(context, None)
+        try:
+            await context.close()
+        except Exception:
+            pass
+
+    async def _discard_all(self) -> None:
+        for context in self._idle:
+            await self._close_context(context)
+        self._idle = []
+        if self.browser is not None:
+            # 远程节点上close()只关闭本连接创建的上下文并断开，不会关闭远程Chromium
+            try:
+                await self.browser.close()
+            except Exception:
+                pass
+        self.browser = None
+        self.node = None
+
+    async def close(self) -> None:
+        if self._health_checker is not None:
+            self._health_checker.cancel()
+            self._health_checker = None
+        await self._wait_recycled()
+        async with self._lock:
+            await self._discard_all()
+            if self.playwright is not None:
+                await self.playwright.stop()
+                self.playwright = None
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "idle_contexts": len(self._idle),
+            "in_use_contexts": self._in_use,
+            "tasks_since_launch": self._tasks_since_launch,
+            "browser_rss_mb": round(chromium_rss_mb(), 1),
+            **({"node": self.node.url if self.node else None, "nodes": self.nodes.snapshot()} if self.nodes else {}),
+        }
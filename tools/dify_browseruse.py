@@ -13,6 +13,9 @@ from langchain_openai import ChatOpenAI
 # 禁用遥测
 os.environ["ANONYMIZED_TELEMETRY"] = "false"
 
+# 单个任务的最长执行时间（秒）
+TASK_TIMEOUT = 180
+
 
 class DifyBrowseruseTool(Tool):
     def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage]:
@@ -189,29 +192,87 @@ class DifyBrowseruseTool(Tool):
                 pass
 """
 
-import subprocess
 import json
 import os
-import sys
-import tempfile
 import time
+import uuid
 from collections.abc import Generator
-from typing import Any
-from pathlib import Path
+from typing import Any, Optional
 
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
 
+from tools.llm_client import LLMConfig
+from tools.request_policy import RequestPolicy
+from tools.result_cache import CACHE_MODES, DEFAULT_CACHE_TTL, cache_key, get_result_cache
+from tools.task_budget import DEFAULT_MAX_LLM_TOKENS, WALL_GRACE_SECONDS, clamp_wall_seconds
+from tools.semantic_cache import DEFAULT_SEMANTIC_THRESHOLD, embed_query, get_semantic_cache
+from tools.task_scheduler import DEFAULT_TENANT, PRIORITY_BATCH, PRIORITY_INTERACTIVE
+from tools.worker_pool import WORKER_SCRIPT, get_worker_pool
+
 # 禁用遥测
 os.environ["ANONYMIZED_TELEMETRY"] = "false"
 
+# 批量模式默认同时执行的任务数
+DEFAULT_BATCH_CONCURRENCY = 2
+
+# 缓存键的组成部分：Worker使用的模型（来自提供方凭据）、浏览器配置和资源拦截策略，任一变化都会使旧缓存失效
+CACHE_BROWSER_PROFILE = "headless-1280x720"
+
+
+def browser_profile(task_options: dict) -> str:
+    """缓存键中的浏览器配置：固定的浏览器配置加上本次任务规范化后的拦截策略"""
+    return f"{CACHE_BROWSER_PROFILE}|{RequestPolicy.from_options(task_options).cache_profile()}"
+
+
+def build_task_options(parameters: dict[str, Any], llm_config: LLMConfig) -> tuple[dict, float]:
+    """
+    把工具参数（或异步任务接口的请求体）转换为发给Worker的任务选项，返回(任务选项, 进程池超时)
+    时间预算由Worker内的Agent执行，进程池超时多留出余量，到时Worker已返回部分结果
+    """
+    max_wall_seconds = clamp_wall_seconds(parameters.get('max_wall_seconds'))
+    # 资源拦截策略原样转交Worker，由request_policy.py解析；LLM端点配置来自提供方凭据
+    task_options = {
+        "llm": llm_config.to_message(),
+        "action_replay": bool(parameters.get('action_replay', False)),
+        "fast_path": bool(parameters.get('fast_path', True)),
+        "dom_token_budget": (int(parameters['dom_token_budget'])
+                             if parameters.get('dom_token_budget') is not None else None),
+        "max_steps": int(parameters.get('max_steps') or 0) or None,
+        "max_wall_seconds": max_wall_seconds,
+        "max_llm_tokens": int(parameters.get('max_llm_tokens') or DEFAULT_MAX_LLM_TOKENS),
+        "block_preset": parameters.get('block_preset') or None,
+        "block_allow": parameters.get('block_allow') or "",
+        "block_deny": parameters.get('block_deny') or "",
+    }
+    return task_options, max_wall_seconds + WALL_GRACE_SECONDS
+
 
 class DifyBrowseruseTool(Tool):
     def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage]:
         # 获取用户输入的查询指令
-        query = tool_parameters.get('query', '').strip()
-
-        if not query:
+        query = (tool_parameters.get('query') or '').strip()
+        queries = self._parse_queries(tool_parameters.get('queries'))
+        stream_progress = bool(tool_parameters.get('stream_progress', False))
+        llm_config = LLMConfig.from_credentials(self.runtime.credentials)
+        task_options, task_timeout = build_task_options(tool_parameters, llm_config)
+        max_wall_seconds = task_options["max_wall_seconds"]
+        cache_mode = tool_parameters.get('cache') or 'bypass'
+        if cache_mode not in CACHE_MODES:
+            cache_mode = 'bypass'
+        cache_ttl = tool_parameters.get('cache_ttl')
+        cache_ttl = float(cache_ttl if cache_ttl is not None else DEFAULT_CACHE_TTL)
+        embedding_model = tool_parameters.get('embedding_model') or None
+        semantic_threshold = tool_parameters.get('semantic_threshold')
+        semantic_threshold = float(semantic_threshold if semantic_threshold is not None else DEFAULT_SEMANTIC_THRESHOLD)
+        max_concurrency = int(tool_parameters.get('max_concurrency') or DEFAULT_BATCH_CONCURRENCY)
+        item_timeout = float(tool_parameters.get('item_timeout') or task_timeout)
+        # Worker全忙时按应用公平排队，批量指令让位于对话中的单次调用；priority参数只能降为batch，不能提升
+        lowered = queries or tool_parameters.get('priority') == PRIORITY_BATCH
+        priority = PRIORITY_BATCH if lowered else PRIORITY_INTERACTIVE
+        tenant = self._tenant()
+
+        if not query and not queries:
             yield self.create_json_message({
                 "success": False,
                 "task": "",
@@ -220,100 +281,57 @@ class DifyBrowseruseTool(Tool):
             })
             return
 
-        # 创建临时文件用于通信
-        temp_dir = tempfile.gettempdir()
-        task_id = str(int(time.time() * 1000))  # 使用时间戳作为唯一ID
-        input_file = Path(temp_dir) / f"browser_task_input_{task_id}.json"
-        output_file = Path(temp_dir) / f"browser_task_output_{task_id}.json"
-
         try:
-            # 获取browser_worker.py的路径
-            current_dir = Path(__file__).parent
-            worker_script = current_dir / "browser_worker_file.py"
-
-            if not worker_script.exists():
+            if not WORKER_SCRIPT.exists():
                 yield self.create_json_message({
                     "success": False,
                     "task": query,
                     "result": "",
-                    "error": f"找不到browser_worker_file.py文件，路径: {worker_script}"
+                    "error": f"找不到browser_worker_file.py文件，路径: {WORKER_SCRIPT}"
                 })
                 return
 
-            print(f"🚀 开始执行Browser任务: {query}")
-            print(f"📂 Worker脚本路径: {worker_script}")
-            print(f"📁 临时文件: {input_file}")
-
-            # 写入任务到临时文件
-            task_data = {
-                "query": query,
-                "task_id": task_id
+            cache_options = {
+                "cache_mode": cache_mode,
+                "cache_ttl": cache_ttl,
+                "embedding_model": embedding_model,
+                "semantic_threshold": semantic_threshold,
+                "storage": self._plugin_storage(),
+                # 启用模型分级路由时结果同时取决于两个模型
+                "model": "+".join(filter(None, (llm_config.model, llm_config.fast_model))),
+                "profile": browser_profile(task_options),
             }
 
-            with open(input_file, 'w', encoding='utf-8') as f:
-                json.dump(task_data, f, ensure_ascii=False, indent=2)
-
-            # 准备环境变量
-            env = os.environ.copy()
-            env["ANONYMIZED_TELEMETRY"] = "false"
-            env["OPENAI_API_KEY"] = "fake_key"
-            env["PYTHONIOENCODING"] = "utf-8"
-            env["PYTHONUTF8"] = "1"
-
-            # 启动子进程，传递文件路径
-            process = subprocess.Popen([
-                sys.executable, str(worker_script), str(input_file), str(output_file)
-            ],
-                env=env,
-                cwd=str(current_dir)
-            )
-
-            print("⏳ 等待子进程执行完成...")
-
-            # 等待进程完成或超时
-            try:
-                return_code = process.wait(timeout=180)  # 3分钟超时
-
-                print(f"🔍 子进程返回码: {return_code}")
-
-                # 读取输出文件
-                if output_file.exists():
-                    try:
-                        with open(output_file, 'r', encoding='utf-8') as f:
-                            result = json.load(f)
-
-                        print("✅ 成功读取执行结果")
-                        yield self.create_json_message(result)
+            if queries:
+                # 单条指令的时间预算不超过其截止时间
+                item_wall_seconds = min(max_wall_seconds, max(10.0, item_timeout - WALL_GRACE_SECONDS))
+                yield from self._invoke_batch(queries, cache_options,
+                                              {**task_options, "max_wall_seconds": item_wall_seconds},
+                                              stream_progress, max_concurrency, item_timeout, tenant, priority)
+                return
 
-                    except (json.JSONDecodeError, UnicodeDecodeError) as e:
-                        yield self.create_json_message({
-                            "success": False,
-                            "task": query,
-                            "result": "",
-                            "error": f"读取结果文件失败: {str(e)}"
-                        })
-                else:
-                    yield self.create_json_message({
-                        "success": False,
-                        "task": query,
-                        "result": "",
-                        "error": f"未找到输出文件，子进程返回码: {return_code}"
-                    })
+            cached, query_vector = self._lookup_cache(query, cache_options)
+            if cached is not None:
+                yield self.create_json_message(cached)
+                return
 
-            except subprocess.TimeoutExpired:
-                print("⏰ 子进程执行超时，正在终止...")
-                process.kill()
-                try:
-                    process.wait(timeout=5)
-                except subprocess.TimeoutExpired:
-                    process.terminate()
+            print(f"🚀 开始执行Browser任务: {query}")
 
-                yield self.create_json_message({
-                    "success": False,
-                    "task": query,
-                    "result": "",
-                    "error": "执行超时（3分钟），子进程已被终止"
-                })
+            # 交给常驻Worker池执行，Worker已预先导入依赖并启动浏览器
+            task_id = uuid.uuid4().hex  # 并发调用也不会冲突的任务ID
+            pool = get_worker_pool()
+            result = {}
+            for message in pool.stream({"query": query, "task_id": task_id, **task_options}, timeout=task_timeout,
+                                       tenant=tenant, priority=priority):
+                if message.get("type") == "result":
+                    result = message["result"]
+                elif stream_progress:
+                    # 每个Agent步骤结束后立即输出，下游节点无需等待最终结果
+                    yield self.create_text_message(self._format_progress(message))
+
+            print(f"✅ 任务执行结束，排队等待: {result['pool']['queue_wait_ms']}ms")
+            self._store_result(query, result, query_vector, cache_options)
+            yield self.create_json_message(result)
 
         except Exception as e:
             print(f"💥 主进程异常: {str(e)}")
@@ -324,13 +342,174 @@ class DifyBrowseruseTool(Tool):
                 "error": f"主进程执行失败: {str(e)}"
             })
 
-        finally:
-            # 清理临时文件
+    def _invoke_batch(self, queries: list[str], cache_options: dict, task_options: dict,
+                      stream_progress: bool, max_concurrency: int, item_timeout: float,
+                      tenant: str, priority: str) -> Generator[ToolInvokeMessage]:
+        """
+        批量模式：缓存命中的条目立即返回，其余条目在Worker池上并发执行，
+        每个条目完成后立即输出一条带index的结果，最后输出汇总
+        """
+        started_at = time.monotonic()
+        pending: dict[str, tuple[int, str, Any]] = {}
+        tasks = []
+        succeeded = 0
+
+        for index, item_query in enumerate(queries):
+            cached, query_vector = self._lookup_cache(item_query, cache_options)
+            if cached is not None:
+                succeeded += int(bool(cached.get("success")))
+                yield self.create_json_message({"index": index, **cached})
+                continue
+            task_id = uuid.uuid4().hex
+            pending[task_id] = (index, item_query, query_vector)
+            tasks.append({"query": item_query, "task_id": task_id, **task_options})
+
+        print(f"🚀 开始执行批量Browser任务: {len(tasks)}个（共{len(queries)}个，并发上限{max_concurrency}）")
+        if tasks:
+            pool = get_worker_pool()
+            for message in pool.stream_batch(tasks, timeout=item_timeout, max_concurrency=max_concurrency,
+                                             tenant=tenant, priority=priority):
+                index, item_query, query_vector = pending[message.get("task_id")]
+                if message.get("type") == "result":
+                    result = message["result"]
+                    self._store_result(item_query, result, query_vector, cache_options)
+                    succeeded += int(bool(result.get("success")))
+                    yield self.create_json_message({"index": index, **result})
+                elif stream_progress:
+                    yield self.create_text_message(f"#{index} " + self._format_progress(message))
+
+        elapsed_s = round(time.monotonic() - started_at, 1)
+        print(f"✅ 批量任务执行结束: 成功{succeeded}/{len(queries)}，耗时{elapsed_s}s")
+        yield self.create_json_message({
+            "success": succeeded == len(queries),
+            "task": f"批量任务（{len(queries)}个）",
+            "result": f"成功{succeeded}个，失败{len(queries) - succeeded}个",
+            "error": "",
+            "batch": {
+                "total": len(queries),
+                "succeeded": succeeded,
+                "failed": len(queries) - succeeded,
+                "elapsed_s": elapsed_s,
+            }
+        })
+
+    @staticmethod
+    def _parse_queries(raw: Any) -> list[str]:
+        """批量指令支持JSON字符串数组或每行一条"""
+        if not raw:
+            return []
+        if isinstance(raw, list):
+            items = raw
+        else:
+            raw = str(raw).strip()
             try:
-                if input_file.exists():
-                    input_file.unlink()
-                if output_file.exists():
-                    output_file.unlink()
-                print("🧹 临时文件已清理")
-            except Exception as cleanup_error:
-                print(f"⚠️ 清理临时文件失败: {cleanup_error}")
\ No newline at end of file
+                items = json.loads(raw) if raw.startswith("[") else raw.splitlines()
+            except json.JSONDecodeError:
+                items = raw.splitlines()
+        return [str(item).strip() for item in items if str(item).strip()]
+
+    def _lookup_cache(self, query: str, options: dict) -> tuple[Optional[dict], Any]:
+        """
+        按缓存模式查找结果，返回(可直接输出的结果, query向量)
+        cache=only未命中时返回失败结果；query向量在写入语义缓存时复用
+        """
+        cache_mode = options["cache_mode"]
+        embedding_model = options["embedding_model"]
+        if cache_mode == 'bypass':
+            return None, None
+
+        cache = get_result_cache()
+        query_vector = None
+        cached = None
+        entry = cache.get(cache_key(query, options["model"], options["profile"]), options["storage"])
+        if entry is not None:
+            print(f"🎯 命中结果缓存: {query}")
+            cached = dict(entry["result"])
+            cached["cache"] = {"status": "hit", "age_s": round(time.time() - entry["stored_at"], 1)}
+        elif embedding_model:
+            query_vector = embed_query(self.session, embedding_model, query)
+            match = None
+            if query_vector is not None:
+                namespace = self._semantic_namespace(options, embedding_model)
+                match = get_semantic_cache().lookup(namespace, query_vector, threshold=options["semantic_threshold"])
+            if match is not None:
+                entry, similarity = match
+                print(f"🎯 命中语义缓存: {entry['query']}（相似度{similarity:.3f}）")
+                cached = dict(entry["result"])
+                cached["cache"] = {
+                    "status": "semantic_hit",
+                    "similarity": round(similarity, 4),
+                    "matched_query": entry["query"],
+                    "age_s": round(time.time() - entry["stored_at"], 1),
+                }
+
+        if cached is not None:
+            cached["cache"].update(self._cache_stats(cache, embedding_model))
+            return cached, query_vector
+        if cache_mode == 'only':
+            return {
+                "success": False,
+                "task": query,
+                "result": "",
+                "error": "缓存未命中（cache=only，未执行任务）",
+                "cache": {"status": "miss", **self._cache_stats(cache, embedding_model)}
+            }, query_vector
+        return None, query_vector
+
+    def _store_result(self, query: str, result: dict, query_vector: Any, options: dict) -> None:
+        """写入精确缓存和语义缓存，并在结果中附加缓存状态；bypass模式既不读也不写缓存"""
+        cache = get_result_cache()
+        embedding_model = options["embedding_model"]
+        if options["cache_mode"] == 'bypass':
+            result["cache"] = {"status": "bypass", **self._cache_stats(cache, embedding_model)}
+            return
+        cache.put(cache_key(query, options["model"], options["profile"]), result,
+                  ttl=options["cache_ttl"], storage=options["storage"])
+        if embedding_model and result.get("success") and not result.get("truncated"):
+            if query_vector is None:
+                query_vector = embed_query(self.session, embedding_model, query)
+            if query_vector is not None:
+                namespace = self._semantic_namespace(options, embedding_model)
+                get_semantic_cache().add(namespace, query_vector, query, result, ttl=options["cache_ttl"])
+        result["cache"] = {"status": "miss", **self._cache_stats(cache, embedding_model)}
+
+    @staticmethod
+    def _semantic_namespace(options: dict, embedding_model: dict) -> str:
+        # 语义缓存按模型、浏览器配置（含拦截策略）和向量模型划分命名空间
+        return (f"{options['model']}|{options['profile']}|"
+                f"{embedding_model.get('provider')}/{embedding_model.get('model')}")
+
+    @staticmethod
+    def _cache_stats(cache, embedding_model) -> dict:
+        stats = cache.snapshot()
+        if embedding_model:
+            stats["semantic"] = get_semantic_cache().snapshot()
+        return stats
+
+    def _tenant(self) -> str:
+        """调度使用的租户标识：调用方的Dify应用，取不到时退回用户"""
+        try:
+            return self.session.app_id or self.runtime.user_id or DEFAULT_TENANT
+        except Exception:
+            return DEFAULT_TENANT
+
+    def _plugin_storage(self):
+        """Dify插件持久化存储，不可用时（如本地调试）返回None，缓存只用内存层"""
+        try:
+            return self.session.storage
+        except Exception:
+            return None
+
+    @staticmethod
+    def _format_progress(event: dict) -> str:
+        """把Worker上报的步骤信息格式化为一行文本"""
+        line = f"[步骤{event.get('step')} | {event.get('elapsed_s')}s] {event.get('url', '')}"
+        if event.get('actions'):
+            line += f" → {', '.join(event['actions'])}"
+        if event.get('dom_tokens'):
+            line += f" [元素列表 {event['dom_tokens']['tokens_before']}→{event['dom_tokens']['tokens_after']} tokens]"
+        if event.get('error'):
+            line += f" ⚠️ {event['error']}"
+        if event.get('extracted'):
+            line += f"\n{event['extracted']}"
+        return line + "\n"
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+dom_compaction.py - 按token预算压缩每一步发送给LLM的页面元素列表
+use_vision=False时，每一步都把序列化的可交互元素列表发给LLM，大型企业页面可达数万token，决定了单步延迟。
+这里在页面状态提取与构造提示词之间增加压缩环节（只影响提示词，不改变元素编号和selector_map）：
+  1. 截断过长的文本
+  2. 折叠连续重复的列表/表格行，只保留前几行并注明省略的元素编号
+  3. 仍超出预算时，按与任务的相关度（关键词重合、可交互、在视口内、新出现）排序，丢弃得分最低的行
+每一步压缩前后的token数（与browser_use相同的按字符估算）随进度和最终结果返回
+"""
+
+import dataclasses
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+# 每步元素列表的token预算，0表示不压缩
+DEFAULT_DOM_TOKEN_BUDGET = int(os.environ.get("BROWSER_DOM_TOKEN_BUDGET", "0"))
+# 与browser_use MessageManager的估算方式一致
+CHARS_PER_TOKEN = 3
+MAX_TEXT_CHARS = 150
+MAX_REPEATED_BLOCKS = 5
+
+WORD_PATTERN = re.compile(r"[a-z0-9]{2,}")
+CJK_PATTERN = re.compile(r"[一-鿿]+")
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN
+
+
+@dataclass
+class _Line:
+    depth: int
+    text: str
+    tag: str
+    highlight_index: Optional[int] = None
+    in_viewport: bool = True
+    is_new: bool = False
+    score: float = 0.0
+
+
+@dataclass
+class CompactedElementTree:
+    """替代DOMElementNode交给AgentMessagePrompt，只提供序列化结果"""
+    text: str
+
+    def clickable_elements_to_string(self, include_attributes: Optional[list[str]] = None) -> str:
+        return self.text
+
+
+@dataclass
+class CompactionStats:
+    budget: int
+    steps: list[dict] = field(default_factory=list)
+
+    def snapshot(self) -> dict:
+        before = sum(step["tokens_before"] for step in self.steps)
+        after = sum(step["tokens_after"] for step in self.steps)
+        return {"budget": self.budget, "tokens_before": before, "tokens_after": after,
+                "tokens_saved": before - after, "steps": self.steps}
+
+
+def _truncate(text: str) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= MAX_TEXT_CHARS else text[:MAX_TEXT_CHARS] + "…"
+
+
+def _format_attributes(node: Any, text: str, include_attributes: Optional[list[str]]) -> str:
+    if not include_attributes:
+        return ""
+    attributes = {key: _truncate(str(value)) for key, value in node.attributes.items() if key in include_attributes}
+    if node.tag_name == attributes.get("role"):
+        del attributes["role"]
+    for key in ("aria-label", "placeholder"):
+        if attributes.get(key, "").strip() and attributes[key].strip() == text.strip():
+            del attributes[key]
+    return " ".join(f"{key}='{value}'" for key, value in attributes.items())
+
+
+def flatten_tree(tree: Any, include_attributes: Optional[list[str]]) -> list[_Line]:
+    """与DOMElementNode.clickable_elements_to_string相同的遍历，但逐行保留元数据，并截断长文本"""
+    from browser_use.dom.views import DOMElementNode, DOMTextNode
+
+    lines: list[_Line] = []
+
+    def visit(node: Any, depth: int) -> None:
+        next_depth = depth
+        if isinstance(node, DOMElementNode):
+            if node.highlight_index is not None:
+                next_depth += 1
+                text = _truncate(node.get_all_text_till_next_clickable_element())
+                attributes = _format_attributes(node, text, include_attributes)
+                marker = f"*[{node.highlight_index}]*" if node.is_new else f"[{node.highlight_index}]"
+                line = f"{marker}<{node.tag_name}"
+                if attributes:
+                    line += f" {attributes}"
+                if text:
+                    line += ("" if attributes else " ") + f">{text}"
+                elif not attributes:
+                    line += " "
+                line += " />"
+                lines.append(_Line(depth, line, node.tag_name, node.highlight_index,
+                                   bool(node.is_in_viewport), bool(node.is_new)))
+            for child in node.children:
+                visit(child, next_depth)
+        elif isinstance(node, DOMTextNode):
+            parent = node.parent
+            if (not node.has_parent_with_highlight_index() and parent and parent.is_visible
+                    and parent.is_top_element):
+                lines.append(_Line(depth, _truncate(node.text), "#text", None, bool(parent.is_in_viewport)))
+
+    visit(tree, 0)
+    return lines
+
+
+def _block_end(lines: list[_Line], start: int) -> int:
+    """以start行开头、包含其后所有更深层行的块的结束位置"""
+    end = start + 1
+    while end < len(lines) and lines[end].depth > lines[start].depth:
+        end += 1
+    return end
+
+
+def _block_signature(lines: list[_Line], start: int, end: int) -> tuple:
+    base = lines[start].depth
+    return tuple((line.depth - base, line.tag) for line in lines[start:end])
+
+
+def collapse_repeats(lines: list[_Line]) -> list[_Line]:
+    """连续出现的结构相同的块（列表项、表格行）只保留前MAX_REPEATED_BLOCKS个，其余替换为一行说明"""
+    result: list[_Line] = []
+    i = 0
+    while i < len(lines):
+        end = _block_end(lines, i)
+        signature = _block_signature(lines, i, end)
+        blocks = [(i, end)]
+        while end < len(lines) and lines[end].depth == lines[i].depth:
+            next_end = _block_end(lines, end)
+            if _block_signature(lines, end, next_end) != signature:
+                break
+            blocks.append((end, next_end))
+            end = next_end
+
+        for start, stop in blocks[:MAX_REPEATED_BLOCKS]:
+            result.extend(lines[start:stop])
+        omitted = blocks[MAX_REPEATED_BLOCKS:]
+        if omitted:
+            indexes = [line.highlight_index for start, stop in omitted for line in lines[start:stop]
+                       if line.highlight_index is not None]
+            note = f"... {len(omitted)} similar items omitted"
+            if indexes:
+                note += f" (elements [{min(indexes)}]-[{max(indexes)}])"
+            result.append(_Line(lines[i].depth, note + " ...", "#omitted", None, True, False, score=float("inf")))
+        i = end
+    return result
+
+
+def _keywords(task: str) -> set[str]:
+    task = task.lower()
+    words = set(WORD_PATTERN.findall(task))
+    for run in CJK_PATTERN.findall(task):
+        words.update(run[k:k + 2] for k in range(len(run) - 1))
+    return words
+
+
+def rank_lines(lines: list[_Line], task: str) -> None:
+    keywords = _keywords(task)
+    for line in lines:
+        if line.tag == "#omitted":
+            continue
+        text = line.text.lower()
+        line.score = sum(1.0 for word in keywords if word in text)
+        if line.highlight_index is not None:
+            line.score += 2.0
+        if line.in_viewport:
+            line.score += 3.0
+        if line.is_new:
+            line.score += 1.0
+
+
+def compact_lines(lines: list[_Line], task: str, budget: int) -> list[_Line]:
+    lines = collapse_repeats(lines)
+    total = sum(estimate_tokens(line.depth * "\t" + line.text) + 1 for line in lines)
+    if total <= budget:
+        return lines
+    rank_lines(lines, task)
+    # 低分行优先丢弃，同分时先丢弃靠后的行，最终保持页面原有顺序
+    order = sorted(range(len(lines)), key=lambda k: (lines[k].score, -k))
+    dropped = set()
+    for k in order:
+        if total <= budget:
+            break
+        if lines[k].tag == "#omitted":
+            continue
+        total -= estimate_tokens(lines[k].depth * "\t" + lines[k].text) + 1
+        dropped.add(k)
+    kept = [line for k, line in enumerate(lines) if k not in dropped]
+    if dropped:
+        kept.append(_Line(0, f"... {len(dropped)} less relevant elements omitted to fit the token budget; "
+                             f"scroll or extract content to see more ...", "#omitted"))
+    return kept
+
+
+def compact_state(state: Any, task: str, budget: int, include_attributes: Optional[list[str]]) -> tuple[Any, dict]:
+    """返回(压缩后的BrowserStateSummary副本, 本步统计)；原对象及其selector_map不变"""
+    original = state.element_tree.clickable_elements_to_string(include_attributes=include_attributes)
+    tokens_before = estimate_tokens(original)
+    if tokens_before <= budget:
+        return state, {"tokens_before": tokens_before, "tokens_after": tokens_before}
+    lines = compact_lines(flatten_tree(state.element_tree, include_attributes), task, budget)
+    text = "\n".join(line.depth * "\t" + line.text for line in lines)
+    compacted = dataclasses.replace(state, element_tree=CompactedElementTree(text))
+    return compacted, {"tokens_before": tokens_before, "tokens_after": estimate_tokens(text)}
+
+
+def install_dom_compactor(agent: Any, budget: int,
+                          on_step: Optional[Callable[[dict], None]] = None) -> CompactionStats:
+    """替换agent的状态消息构造入口，每步先压缩元素列表再交给browser_use生成提示词"""
+    stats = CompactionStats(budget=budget)
+    message_manager = agent._message_manager
+    original_add_state_message = message_manager.add_state_message
+    task = agent.task
+
+    def add_state_message(browser_state_summary, result=None, step_info=None, use_vision=True) -> None:
+        try:
+            browser_state_summary, step_stats = compact_state(
+                browser_state_summary, task, budget, message_manager.settings.include_attributes)
+            step_stats["step"] = len(stats.steps) + 1
+            stats.steps.append(step_stats)
+            if on_step is not None:
+                on_step(step_stats)
+        except Exception as e:
+            # 压缩失败时使用原始元素列表，不影响任务执行
+            print(f"⚠️ 压缩页面元素失败: {e}")
+        original_add_state_message(browser_state_summary, result, step_info, use_vision)
+
+    message_manager.add_state_message = add_state_message
+    return stats
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+fast_path.py - "打开URL并总结/提取页面"类任务的快速通道
+这类指令（如"在url栏输入：https://... 总结页面信息"）不需要任何点击，
+但Agent仍会按多步规划循环反复调用LLM。这里在Agent之前做一次指令分类：
+  - 只有一个URL、只要求读取页面且没有交互动词的指令走快速通道
+  - 直接导航并等待页面稳定，把正文转换为Markdown；提取类指令不调用LLM，总结类指令只调用一次LLM
+  - 页面加载失败（无响应或4xx/5xx）、需要登录或内容过少（可能依赖交互才能加载）时返回None，交回完整Agent执行
+"""
+
+import asyncio
+import re
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Optional
+
+URL_PATTERN = re.compile(r"https?://[^\s，。；、\"'<>）)]+")
+
+# "在url栏输入"只是导航的说法，不算交互
+NAVIGATION_PHRASES = ("在url栏输入", "在地址栏输入", "url栏输入", "地址栏输入", "打开网址", "访问网址")
+INTERACTION_WORDS = (
+    "点击", "单击", "双击", "登录", "登陆", "输入", "填写", "填入", "搜索", "查询", "提交", "选择", "勾选",
+    "下载", "上传", "翻页", "下一页", "滚动", "发送", "注册", "播放", "购买", "预订",
+    "click", "login", "log in", "sign in", "type", "search", "fill", "submit", "select", "download",
+    "upload", "scroll", "next page",
+)
+SUMMARY_WORDS = ("总结", "摘要", "概括", "归纳", "概述", "主要内容", "页面信息", "讲了什么", "summarize", "summary")
+EXTRACT_WORDS = ("提取", "获取", "抓取", "读取", "原文", "全文", "正文", "内容", "extract", "scrape", "get the text")
+
+# 页面正文少于该字符数时认为内容需要交互才能加载，交回Agent
+MIN_CONTENT_CHARS = 200
+# 送入总结调用的正文上限（字符）
+MAX_SUMMARY_INPUT_CHARS = 12000
+NAVIGATION_TIMEOUT_MS = 20000
+SETTLE_TIMEOUT_MS = 3000
+
+SUMMARY_SYSTEM_PROMPT = "你是网页内容助手。根据用户指令和提供的网页正文（Markdown）作答，使用中文，只依据正文内容，不要编造。"
+
+
+@dataclass
+class FastPathPlan:
+    url: str
+    mode: str  # "extract"：直接返回正文；"summarize"：调用一次LLM总结
+
+
+def classify(query: str) -> Optional[FastPathPlan]:
+    """判断指令是否为直接读取URL的任务，不是时返回None"""
+    urls = URL_PATTERN.findall(query)
+    if len(urls) != 1:
+        return None
+    rest = query.replace(urls[0], " ").lower()
+    for phrase in NAVIGATION_PHRASES:
+        rest = rest.replace(phrase, " ")
+    if any(word in rest for word in INTERACTION_WORDS):
+        return None
+    if any(word in rest for word in SUMMARY_WORDS):
+        return FastPathPlan(url=urls[0], mode="summarize")
+    if any(word in rest for word in EXTRACT_WORDS):
+        return FastPathPlan(url=urls[0], mode="extract")
+    return None
+
+
+async def _page_markdown(page: Any) -> str:
+    import markdownify
+
+    html = await page.content()
+    convert = partial(markdownify.markdownify, strip=["a", "img"])
+    markdown = await asyncio.get_running_loop().run_in_executor(None, convert, html)
+    return re.sub(r"\n{3,}", "\n\n", markdown).strip()
+
+
+async def run_fast_path(page: Any, plan: FastPathPlan, query: str, llm: Any = None) -> Optional[dict]:
+    """
+    在给定页面上执行快速通道，返回{"result", "url", "chars", "llm_calls"}；
+    页面加载失败或需要交互（登录表单、内容过少）时返回None，由调用方交给Agent
+    """
+    response = await page.goto(plan.url, wait_until="domcontentloaded", timeout=NAVIGATION_TIMEOUT_MS)
+    if response is None or not response.ok:
+        # 错误页的正文同样可能超过MIN_CONTENT_CHARS，不能当作页面内容返回
+        status = response.status if response is not None else "无响应"
+        print(f"↪️ 页面加载失败（{status}），交给Agent处理")
+        return None
+    try:
+        # 等待异步加载的内容稳定，超时不影响继续提取
+        await page.wait_for_load_state("networkidle", timeout=SETTLE_TIMEOUT_MS)
+    except Exception:
+        pass
+
+    if await page.locator("input[type=password]").count() > 0:
+        print("↪️ 页面包含登录表单，交给Agent处理")
+        return None
+
+    content = await _page_markdown(page)
+    if len(content) < MIN_CONTENT_CHARS:
+        print(f"↪️ 页面正文过少（{len(content)}字符），交给Agent处理")
+        return None
+
+    if plan.mode == "extract" or llm is None:
+        return {"result": content, "url": page.url, "chars": len(content), "llm_calls": 0}
+
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    response = await llm.ainvoke([
+        SystemMessage(content=SUMMARY_SYSTEM_PROMPT),
+        HumanMessage(content=f"指令: {query}\n\n网页 {page.url} 的正文:\n{content[:MAX_SUMMARY_INPUT_CHARS]}"),
+    ])
+    return {"result": str(response.content), "url": page.url, "chars": len(content), "llm_calls": 1}
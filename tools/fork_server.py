@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+fork_server.py - Worker模板进程（fork-server）
+冷启动Worker的大部分时间花在导入browser_use、langchain_openai、Playwright和pydantic模型上。
+fork-server模式下进程池只启动一个已完成导入的模板进程，之后每个Worker由模板fork得到，只需毫秒级：
+  - 模板进程: browser_worker_file.py --fork-server <控制套接字fd>，导入完成后进入同步循环，
+    从控制套接字（SOCK_SEQPACKET，每个包一条JSON消息）接收fork请求，请求附带子进程使用的通信套接字fd
+  - 子进程: 新建会话（进程组），把通信套接字作为stdin/stdout后按常驻模式运行，与cold spawn的Worker完全相同
+模板进程从不创建事件循环、线程、浏览器或网络连接，fork时子进程不会继承任何运行中的状态；
+子进程退出后由模板进程回收，其PID随即可能被复用，因此模板进程在fork后为子进程打开pidfd并随应答一起传给进程池，
+进程池通过pidfd得知Worker退出、发送SIGKILL，不再按PID探测
+仅支持提供os.fork和pidfd的平台（Linux 5.3+），其他平台由进程池直接启动Worker
+"""
+
+import asyncio
+import json
+import os
+import random
+import select
+import signal
+import socket
+import sys
+import time
+import traceback
+from collections.abc import Callable
+from pathlib import Path
+from typing import Optional
+
+# 控制消息的最大长度，fork请求只包含少量环境变量
+MAX_PACKET_SIZE = 64 * 1024
+# 等待模板进程响应fork请求的时间（秒）
+FORK_TIMEOUT = 10.0
+FORK_SUPPORTED = (hasattr(os, "fork") and hasattr(socket, "send_fds")
+                  and hasattr(os, "pidfd_open") and hasattr(signal, "pidfd_send_signal"))
+
+
+class ForkServerError(Exception):
+    """模板进程启动或fork失败"""
+
+
+def _send(sock: socket.socket, message: dict, fds: tuple[int, ...] = ()) -> None:
+    data = json.dumps(message, ensure_ascii=False).encode("utf-8")
+    if fds:
+        socket.send_fds(sock, [data], list(fds))
+    else:
+        sock.send(data)
+
+
+def _decode(data: bytes) -> Optional[dict]:
+    return json.loads(data.decode("utf-8")) if data else None
+
+
+# ---------------------------------------------------------------- 模板进程侧
+
+def _reap_children(signum, frame) -> None:
+    while True:
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if pid == 0:
+            return
+
+
+def _run_child(control: socket.socket, channel_fd: int, env: dict, run_worker: Callable[[int], None]) -> None:
+    """fork后的子进程：脱离模板的会话和信号处理，以channel_fd作为通信通道运行Worker，不返回"""
+    code = 0
+    try:
+        control.close()
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        os.setsid()
+        os.environ.update(env)
+        # 各子进程的随机序列不应相同
+        random.seed()
+        run_worker(channel_fd)
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else 1
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(code)
+
+
+def serve_template(control_fd: int, run_worker: Callable[[int], None], startup_s: float) -> None:
+    """
+    模板进程主循环（同步阻塞）：上报就绪后逐条处理fork请求，控制套接字关闭或收到shutdown时退出
+    run_worker(fd)在子进程中以通信套接字fd运行常驻Worker
+    """
+    control = socket.socket(fileno=control_fd)
+    signal.signal(signal.SIGCHLD, _reap_children)
+    _send(control, {"type": "ready", "ok": True, "pid": os.getpid(), "startup_s": startup_s})
+    print(f"🧬 Worker模板进程已就绪，PID: {os.getpid()}")
+
+    while True:
+        try:
+            data, fds, _, _ = socket.recv_fds(control, MAX_PACKET_SIZE, 1)
+        except OSError:
+            break
+        message = _decode(data)
+        if message is None or message.get("type") == "shutdown":
+            for fd in fds:
+                os.close(fd)
+            break
+        if message.get("type") != "fork" or len(fds) != 1:
+            for fd in fds:
+                os.close(fd)
+            _send(control, {"type": "forked", "ok": False, "error": "无效的fork请求"})
+            continue
+
+        # 打开pidfd之前暂不处理SIGCHLD：子进程即使立即退出也只是僵尸进程，PID不会在此期间被回收复用
+        old_mask = signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGCHLD})
+        try:
+            pid = os.fork()
+            if pid == 0:
+                signal.pthread_sigmask(signal.SIG_SETMASK, old_mask)
+                _run_child(control, fds[0], message.get("env") or {}, run_worker)
+            try:
+                pidfd = os.pidfd_open(pid)
+            except OSError:
+                os.kill(pid, signal.SIGKILL)
+                raise
+        except OSError as e:
+            os.close(fds[0])
+            _send(control, {"type": "forked", "ok": False, "error": f"fork失败: {e}"})
+            continue
+        finally:
+            signal.pthread_sigmask(signal.SIG_SETMASK, old_mask)
+        os.close(fds[0])
+        try:
+            _send(control, {"type": "forked", "ok": True, "pid": pid}, (pidfd,))
+        finally:
+            os.close(pidfd)
+    print("🧬 Worker模板进程退出")
+
+
+# ---------------------------------------------------------------- 进程池侧
+
+class ForkedProcess:
+    """
+    由模板fork出的Worker，提供WorkerProcess所需的asyncio.subprocess.Process接口子集；
+    Worker不是进程池的子进程，退出码不可得，退出后returncode为-1
+    存活状态和终止都通过模板进程传来的pidfd完成，Worker退出后PID被复用也不会误判或误杀；需在事件循环中创建
+    """
+
+    def __init__(self, pid: int, pidfd: int, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.pid = pid
+        self.stdout = reader
+        self.stdin = writer
+        self._returncode: Optional[int] = None
+        self._pidfd: Optional[int] = pidfd
+        self._loop = asyncio.get_running_loop()
+        self._exited = asyncio.Event()
+        # 进程退出后pidfd变为可读
+        self._loop.add_reader(pidfd, self._on_exit)
+
+    def _on_exit(self) -> None:
+        self._loop.remove_reader(self._pidfd)
+        os.close(self._pidfd)
+        self._pidfd = None
+        self._returncode = -1
+        self.stdin.close()
+        self._exited.set()
+
+    @property
+    def returncode(self) -> Optional[int]:
+        return self._returncode
+
+    def has_exited(self) -> bool:
+        """立即检查pidfd是否已可读（不等待事件循环回调），用于确认此前按PID取得的信息仍属于该Worker"""
+        if self._pidfd is None:
+            return True
+        poller = select.poll()
+        poller.register(self._pidfd, select.POLLIN)
+        return bool(poller.poll(0))
+
+    async def wait(self) -> int:
+        await self._exited.wait()
+        return self._returncode
+
+    def kill(self) -> None:
+        if self._pidfd is None:
+            return
+        try:
+            signal.pidfd_send_signal(self._pidfd, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+
+class ForkServer:
+    """进程池侧的模板进程句柄；所有方法都在进程池的监督循环中调用"""
+
+    def __init__(self, worker_script: Path):
+        self.worker_script = worker_script
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.startup_s = 0.0
+        self._control: Optional[socket.socket] = None
+        self._lock = asyncio.Lock()
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    async def start(self, env: dict, timeout: float) -> None:
+        """启动模板进程并等待其完成导入"""
+        control, child = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        try:
+            # 模板进程的日志写到stderr，与Worker一致；作为新会话的组长启动，关闭时连同其子进程一起终止
+            self.process = await asyncio.create_subprocess_exec(
+                sys.executable, str(self.worker_script), "--fork-server", str(child.fileno()),
+                stdin=asyncio.subprocess.DEVNULL,
+                pass_fds=(child.fileno(),),
+                env=env,
+                cwd=str(self.worker_script.parent),
+                start_new_session=True,
+            )
+        finally:
+            child.close()
+        control.setblocking(False)
+        self._control = control
+        started = time.monotonic()
+        try:
+            message, _ = await asyncio.wait_for(self._recv(), timeout)
+        except asyncio.TimeoutError:
+            await self.stop()
+            raise ForkServerError(f"模板进程启动超时（{int(timeout)}秒）")
+        if message is None or not message.get("ok", False):
+            await self.stop()
+            raise ForkServerError(f"模板进程初始化失败: {(message or {}).get('error', '进程已退出')}")
+        self.startup_s = time.monotonic() - started
+
+    async def _recv(self) -> tuple[Optional[dict], list[int]]:
+        """接收一条控制消息及其附带的fd（fork应答附带子进程的pidfd）"""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                data, fds, _, _ = socket.recv_fds(self._control, MAX_PACKET_SIZE, 1)
+                return _decode(data), fds
+            except (BlockingIOError, InterruptedError):
+                pass
+            readable = loop.create_future()
+            loop.add_reader(self._control.fileno(), lambda: readable.done() or readable.set_result(None))
+            try:
+                await readable
+            finally:
+                loop.remove_reader(self._control.fileno())
+
+    async def spawn(self, env: Optional[dict] = None) -> ForkedProcess:
+        """fork一个新Worker，env为子进程额外设置的环境变量；返回时Worker尚未就绪（需等待其ready消息）"""
+        if not self.is_alive():
+            raise ForkServerError("模板进程未运行")
+        parent, child = socket.socketpair()
+        try:
+            async with self._lock:
+                try:
+                    _send(self._control, {"type": "fork", "env": env or {}}, (child.fileno(),))
+                    reply, fds = await asyncio.wait_for(self._recv(), FORK_TIMEOUT)
+                except (OSError, asyncio.TimeoutError) as e:
+                    raise ForkServerError(f"请求模板进程fork失败: {e}")
+        except BaseException:
+            parent.close()
+            raise
+        finally:
+            child.close()
+        if reply is None or not reply.get("ok", False) or len(fds) != 1:
+            for fd in fds:
+                os.close(fd)
+            parent.close()
+            raise ForkServerError((reply or {}).get("error", "模板进程已退出"))
+        reader, writer = await asyncio.open_unix_connection(sock=parent)
+        return ForkedProcess(reply["pid"], fds[0], reader, writer)
+
+    async def stop(self, timeout: float = 5) -> None:
+        if self._control is not None:
+            try:
+                _send(self._control, {"type": "shutdown"})
+            except OSError:
+                pass
+            self._control.close()
+            self._control = None
+        if self.is_alive():
+            try:
+                await asyncio.wait_for(self.process.wait(), timeout)
+            except asyncio.TimeoutError:
+                self.process.kill()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+http_cache.py - 跨浏览器上下文共享的静态资源磁盘缓存
+上下文池中的BrowserContext都是无痕上下文，Chromium只为其保留内存缓存，上下文关闭后即丢弃，
+内网系统的脚本、样式、字体每个任务都要重新下载。这里在context.route层面为静态资源实现一个磁盘缓存：
+  - 缓存目录由BROWSER_HTTP_CACHE_DIR开启（默认关闭），同一容器内的所有Worker和上下文共享
+  - 按响应的Cache-Control/Expires计算有效期，没有声明时使用较短的启发式有效期；no-store/private不缓存
+  - 缓存跨上下文、跨租户共享：带Cookie/Authorization的请求，只有响应明确声明public或max-age时才缓存，
+    且不使用启发式有效期；响应的Vary头部列出的请求头取值计入缓存键，Vary: *不缓存
+  - 总大小超过上限时按最近访问时间淘汰
+  - 统计每个任务的命中率和节省的字节数
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Optional
+
+# 磁盘缓存配置，可通过环境变量覆盖；目录为空表示不启用
+DEFAULT_HTTP_CACHE_DIR = os.environ.get("BROWSER_HTTP_CACHE_DIR", "")
+DEFAULT_HTTP_CACHE_MAX_MB = float(os.environ.get("BROWSER_HTTP_CACHE_MAX_MB", "256"))
+# 响应未声明有效期时使用的启发式有效期（秒）
+DEFAULT_HEURISTIC_TTL = float(os.environ.get("BROWSER_HTTP_CACHE_HEURISTIC_TTL", "600"))
+
+CACHEABLE_RESOURCE_TYPES = frozenset({"script", "stylesheet", "font", "image"})
+# 缓存的是解码后的响应体，这些头部不能原样回放
+HOP_HEADERS = frozenset({"content-encoding", "content-length", "transfer-encoding", "connection", "set-cookie"})
+MAX_AGE_PATTERN = re.compile(r"(?:s-maxage|max-age)\s*=\s*(\d+)")
+# 请求携带这些头部时视为带凭据的请求
+CREDENTIAL_HEADERS = ("cookie", "authorization")
+
+
+def has_credentials(request_headers: dict) -> bool:
+    return any(request_headers.get(name) for name in CREDENTIAL_HEADERS)
+
+
+def vary_headers(headers: dict) -> Optional[list[str]]:
+    """响应Vary头部列出的请求头（小写、排序），Vary: *时返回None"""
+    names = sorted({name.strip().lower() for name in headers.get("vary", "").split(",") if name.strip()})
+    return None if "*" in names else names
+
+
+def freshness_ttl(headers: dict, heuristic_ttl: float = DEFAULT_HEURISTIC_TTL, credentialed: bool = False) -> float:
+    """
+    根据响应头计算缓存有效期（秒），不可缓存时返回0
+    credentialed为True（请求带Cookie/Authorization）时，只有明确声明public或max-age的响应可缓存
+    """
+    cache_control = headers.get("cache-control", "").lower()
+    if "no-store" in cache_control or "private" in cache_control or "no-cache" in cache_control:
+        return 0.0
+    match = MAX_AGE_PATTERN.search(cache_control)
+    if match:
+        return float(match.group(1))
+    if credentialed and "public" not in cache_control:
+        return 0.0
+    if headers.get("expires"):
+        try:
+            return max(0.0, parsedate_to_datetime(headers["expires"]).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return 0.0
+    return 0.0 if credentialed else heuristic_ttl
+
+
+def _variant_key(url: str, vary: list[str], request_headers: dict) -> str:
+    return url + "\n" + json.dumps([[name, request_headers.get(name, "")] for name in vary])
+
+
+class SharedDiskCache:
+    """
+    以URL哈希为文件名的磁盘缓存，每个条目由.body（响应体）和.json（状态码、头部、过期时间）两个文件组成
+    响应带Vary时，URL对应的.json只记录Vary的请求头列表，响应按这些请求头的取值另存为一个条目
+    写入先写临时文件再原子替换，多个Worker进程并发读写同一目录是安全的
+    """
+
+    def __init__(self, directory: str, max_mb: float = DEFAULT_HTTP_CACHE_MAX_MB):
+        self.directory = Path(directory)
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._written_since_evict = 0
+
+    def _paths(self, url: str) -> tuple[Path, Path]:
+        digest = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return self.directory / f"{digest}.json", self.directory / f"{digest}.body"
+
+    def _read_meta(self, key: str) -> Optional[dict]:
+        meta_path, _ = self._paths(key)
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        if meta.get("url") != key or meta.get("expires_at", 0) <= time.time():
+            return None
+        return meta
+
+    def get(self, url: str, request_headers: Optional[dict] = None) -> Optional[tuple[dict, bytes]]:
+        key = url
+        try:
+            meta = self._read_meta(key)
+            if meta is not None and meta.get("vary"):
+                key = _variant_key(url, meta["vary"], request_headers or {})
+                meta = self._read_meta(key)
+            if meta is None:
+                return None
+            meta_path, body_path = self._paths(key)
+            body = body_path.read_bytes()
+            # 更新访问时间，淘汰时按最近访问排序
+            os.utime(meta_path)
+            return meta, body
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def put(self, url: str, status: int, headers: dict, body: bytes, ttl: float,
+            request_headers: Optional[dict] = None) -> None:
+        vary = vary_headers(headers)
+        if ttl <= 0 or vary is None or len(body) > self.max_bytes // 10:
+            return
+        key = url
+        if vary:
+            key = _variant_key(url, vary, request_headers or {})
+            self._write_meta(url, {"url": url, "vary": vary, "expires_at": time.time() + ttl, "size": 0})
+        meta_path, body_path = self._paths(key)
+        meta = {
+            "url": key,
+            "status": status,
+            "headers": {k: v for k, v in headers.items() if k.lower() not in HOP_HEADERS},
+            "expires_at": time.time() + ttl,
+            "size": len(body),
+        }
+        suffix = f".{os.getpid()}.tmp"
+        try:
+            tmp_body = body_path.with_suffix(suffix)
+            tmp_body.write_bytes(body)
+            os.replace(tmp_body, body_path)
+            tmp_meta = meta_path.with_suffix(suffix)
+            tmp_meta.write_text(json.dumps(meta), encoding="utf-8")
+            os.replace(tmp_meta, meta_path)
+        except OSError as e:
+            print(f"⚠️ 写入磁盘缓存失败: {e}")
+            return
+        self._written_since_evict += len(body)
+        # 每写入约1/10容量检查一次总大小，避免每次写入都扫描目录
+        if self._written_since_evict >= self.max_bytes // 10:
+            self._written_since_evict = 0
+            self.evict()
+
+    def _write_meta(self, key: str, meta: dict) -> None:
+        """只写.json的条目（Vary的请求头列表）"""
+        meta_path, _ = self._paths(key)
+        tmp_meta = meta_path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            tmp_meta.write_text(json.dumps(meta), encoding="utf-8")
+            os.replace(tmp_meta, meta_path)
+        except OSError as e:
+            print(f"⚠️ 写入磁盘缓存失败: {e}")
+
+    def evict(self) -> None:
+        """总大小超过上限时，按最近访问时间删除最旧的条目，直到降到上限的90%"""
+        entries = []
+        total = 0
+        for meta_path in self.directory.glob("*.json"):
+            body_path = meta_path.with_suffix(".body")
+            try:
+                # 只记录Vary的条目没有.body
+                size = body_path.stat().st_size if body_path.exists() else 0
+                entries.append((meta_path.stat().st_mtime, meta_path, body_path, size))
+                total += size
+            except OSError:
+                continue
+        if total <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        for _, meta_path, body_path, size in sorted(entries, key=lambda e: e[0]):
+            if total <= target:
+                break
+            for path in (meta_path, body_path):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+            total -= size
+
+
+class HttpCacheSession:
+    """单个任务对共享磁盘缓存的使用：attach到浏览器上下文，统计命中率和节省的字节数"""
+
+    def __init__(self, cache: SharedDiskCache):
+        self.cache = cache
+        self._context = None
+        self.stats = {"requests": 0, "hits": 0, "stored": 0, "bytes_saved": 0}
+
+    async def _handle_route(self, route, request) -> None:
+        if request.method != "GET" or request.resource_type not in CACHEABLE_RESOURCE_TYPES:
+            await route.fallback()
+            return
+        self.stats["requests"] += 1
+        # all_headers()包含浏览器自动附加的Cookie，用于判断凭据和计算Vary缓存键
+        request_headers = await request.all_headers()
+
+        cached = await asyncio.to_thread(self.cache.get, request.url, request_headers)
+        if cached is not None:
+            meta, body = cached
+            self.stats["hits"] += 1
+            self.stats["bytes_saved"] += len(body)
+            await route.fulfill(status=meta["status"], headers=meta["headers"], body=body)
+            return
+
+        try:
+            response = await route.fetch()
+            body = await response.body()
+        except Exception:
+            # 交给浏览器自行请求，错误由页面正常处理
+            await route.fallback()
+            return
+        headers = response.headers
+        if response.status == 200:
+            ttl = freshness_ttl(headers, credentialed=has_credentials(request_headers))
+            if ttl > 0 and vary_headers(headers) is not None:
+                await asyncio.to_thread(self.cache.put, request.url, response.status, headers, body, ttl,
+                                        request_headers)
+                self.stats["stored"] += 1
+        await route.fulfill(status=response.status,
+                            headers={k: v for k, v in headers.items() if k.lower() not in HOP_HEADERS},
+                            body=body)
+
+    async def attach(self, context) -> None:
+        if context is None:
+            return
+        self._context = context
+        await context.route("**/*", self._handle_route)
+
+    async def detach(self) -> None:
+        if self._context is None:
+            return
+        context, self._context = self._context, None
+        try:
+            await context.unroute("**/*", self._handle_route)
+        except Exception as e:
+            print(f"⚠️ 移除磁盘缓存拦截失败: {e}")
+
+    def snapshot(self) -> dict:
+        requests = self.stats["requests"]
+        return {
+            **self.stats,
+            "hit_ratio": round(self.stats["hits"] / requests, 3) if requests else 0.0,
+        }
+
+
+_cache: Optional[SharedDiskCache] = None
+
+
+def get_disk_cache() -> Optional[SharedDiskCache]:
+    """获取Worker进程内的磁盘缓存，未配置BROWSER_HTTP_CACHE_DIR时返回None"""
+    global _cache
+    if _cache is None and DEFAULT_HTTP_CACHE_DIR:
+        _cache = SharedDiskCache(DEFAULT_HTTP_CACHE_DIR)
+    return _cache
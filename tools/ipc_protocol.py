@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ipc_protocol.py - 主进程与Browser Worker之间的帧协议
+每帧 = 4字节大端长度 + UTF-8编码的JSON对象，通过管道传输，不经过文件系统
+
+消息类型:
+  主进程 → Worker: task（新任务）、cancel（取消任务）、shutdown（退出）
+  Worker → 主进程: ready（初始化结果）、progress（步骤进度）、result（最终结果）、heartbeat（心跳）
+"""
+
+import asyncio
+import json
+import struct
+from typing import BinaryIO, Optional
+
+HEADER = struct.Struct(">I")
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+# Worker空闲或忙碌时都按此间隔发送心跳；主进程超过HEARTBEAT_TIMEOUT未收到任何消息则判定Worker失联
+HEARTBEAT_INTERVAL = 5.0
+HEARTBEAT_TIMEOUT = 30.0
+
+
+class ProtocolError(Exception):
+    """帧格式错误"""
+
+
+def encode_frame(message: dict) -> bytes:
+    payload = json.dumps(message, ensure_ascii=False).encode("utf-8")
+    if len(payload) > MAX_FRAME_SIZE:
+        raise ProtocolError(f"消息过大: {len(payload)}字节")
+    return HEADER.pack(len(payload)) + payload
+
+
+def write_frame(stream: BinaryIO, message: dict) -> None:
+    stream.write(encode_frame(message))
+    stream.flush()
+
+
+def _read_exact(stream: BinaryIO, size: int) -> Optional[bytes]:
+    chunks = []
+    remaining = size
+    while remaining > 0:
+        chunk = stream.read(remaining)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+def _decode_payload(payload: bytes) -> dict:
+    try:
+        message = json.loads(payload.decode("utf-8"))
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ProtocolError(f"帧内容无法解析: {e}")
+    if not isinstance(message, dict):
+        raise ProtocolError("帧内容必须是JSON对象")
+    return message
+
+
+def _check_size(size: int) -> None:
+    if size > MAX_FRAME_SIZE:
+        raise ProtocolError(f"帧长度异常: {size}字节")
+
+
+def read_frame(stream: BinaryIO) -> Optional[dict]:
+    """阻塞读取一帧，对端关闭时返回None"""
+    header = _read_exact(stream, HEADER.size)
+    if header is None:
+        return None
+    (size,) = HEADER.unpack(header)
+    _check_size(size)
+    payload = _read_exact(stream, size)
+    if payload is None:
+        raise ProtocolError("帧数据不完整，对端已关闭")
+    return _decode_payload(payload)
+
+
+async def read_frame_async(reader: asyncio.StreamReader) -> Optional[dict]:
+    """从asyncio流读取一帧，对端关闭时返回None"""
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None
+        raise ProtocolError("帧头不完整，对端已关闭")
+    (size,) = HEADER.unpack(header)
+    _check_size(size)
+    try:
+        payload = await reader.readexactly(size)
+    except asyncio.IncompleteReadError:
+        raise ProtocolError("帧数据不完整，对端已关闭")
+    return _decode_payload(payload)
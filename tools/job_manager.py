@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+job_manager.py - 异步浏览器任务（提交、查询、进度流、取消）
+供插件端点（endpoints/）使用：提交后立即返回job_id，任务在共享Worker池上后台执行，不再占用一个请求直到结束，
+也不受单次请求MAX_REQUEST_TIMEOUT的限制
+  - 状态: pending（排队或尚未完成第一步）→ running → succeeded / failed / cancelled
+  - 进度: Worker上报的每步信息（URL、动作、提取的内容）按序保存，查询时可按序号增量获取，即部分结果
+  - 结果: 内存中保留DEFAULT_JOB_TTL秒；已结束的任务在下一次查询、进度流或取消请求时才写入插件存储（延迟持久化），
+    插件重启后仍可查询；任务结束后、下一次请求前插件重启，结果会丢失
+插件存储只能在请求上下文中访问，因此后台线程不直接写存储
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Any, Optional
+
+from tools.task_scheduler import DEFAULT_TENANT, PRIORITY_BATCH
+from tools.worker_pool import WorkerError, get_worker_pool
+
+DEFAULT_JOB_TTL = float(os.environ.get("BROWSER_JOB_TTL", "3600"))
+# 内存中最多保留的任务数，超出时淘汰最早结束的任务
+DEFAULT_MAX_JOBS = int(os.environ.get("BROWSER_MAX_JOBS", "200"))
+# 每个任务保留的进度条数
+MAX_JOB_EVENTS = 200
+
+# 插件存储总容量1MB，与结果缓存共用，任务结果单独限制条目数和单条大小
+STORAGE_MAX_ENTRIES = 16
+STORAGE_MAX_ENTRY_BYTES = 24 * 1024
+STORAGE_KEY_PREFIX = "job:"
+STORAGE_INDEX_KEY = "job_index"
+
+FINISHED_STATES = ("succeeded", "failed", "cancelled")
+
+
+class Job:
+    """单个异步任务的状态；由JobManager加锁修改，通过Condition通知等待进度的请求"""
+
+    def __init__(self, job_id: str, query: str, ttl: float):
+        self.job_id = job_id
+        self.query = query
+        self.ttl = ttl
+        self.status = "pending"
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.events: list[dict] = []
+        self.events_dropped = 0
+        self.result: Optional[dict] = None
+        self.cancel_requested = False
+        self.persisted = False
+        self.changed = threading.Condition()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    def snapshot(self, since: int = 0) -> dict:
+        """任务状态；progress只包含序号不小于since的进度（序号从0开始，含已淘汰的条目）"""
+        start = max(0, since - self.events_dropped)
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "query": self.query,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "expires_at": self.finished_at + self.ttl if self.finished_at else None,
+            "next_event": self.events_dropped + len(self.events),
+            "progress": self.events[start:],
+            "result": self.result,
+        }
+
+    @classmethod
+    def restore(cls, data: dict) -> "Job":
+        job = cls(data["job_id"], data.get("query", ""), data.get("ttl", DEFAULT_JOB_TTL))
+        job.status = data["status"]
+        job.created_at = data.get("created_at", job.created_at)
+        job.started_at = data.get("started_at")
+        job.finished_at = data.get("finished_at")
+        job.result = data.get("result")
+        job.persisted = True
+        return job
+
+
+class JobManager:
+    """进程内的异步任务表，线程安全"""
+
+    def __init__(self, ttl: float = DEFAULT_JOB_TTL, max_jobs: int = DEFAULT_MAX_JOBS):
+        self.ttl = ttl
+        self.max_jobs = max(1, max_jobs)
+        self._jobs: dict[str, Job] = {}
+        self._lock = threading.Lock()
+        # 插件存储的索引是读-改-写，并发请求同时写入时需要串行化
+        self._storage_lock = threading.Lock()
+
+    def submit(self, task: dict, timeout: float, tenant: str = DEFAULT_TENANT,
+               priority: str = PRIORITY_BATCH) -> Job:
+        """
+        提交任务并在后台线程中执行，task为发给Worker的任务消息（不含task_id）
+        异步任务默认按batch优先级调度，tenant/priority见task_scheduler.py
+        """
+        job = Job(uuid.uuid4().hex, task.get("query", ""), self.ttl)
+        with self._lock:
+            self._evict(time.time())
+            self._jobs[job.job_id] = job
+        thread = threading.Thread(target=self._run, args=(job, {**task, "task_id": job.job_id}, timeout,
+                                                          tenant, priority),
+                                  name=f"browser-job-{job.job_id[:8]}", daemon=True)
+        thread.start()
+        print(f"📥 异步任务已提交: {job.job_id}")
+        return job
+
+    def _run(self, job: Job, task: dict, timeout: float, tenant: str, priority: str) -> None:
+        result = None
+        pool = get_worker_pool()
+        try:
+            if job.cancel_requested:
+                raise WorkerError("任务已取消")
+            for message in pool.stream(task, timeout=timeout, tenant=tenant, priority=priority,
+                                       cancelled=lambda: job.cancel_requested):
+                if message.get("type") == "result":
+                    result = message["result"]
+                    continue
+                self._add_event(job, message)
+        except WorkerError as e:
+            result = {"success": False, "task": job.query, "result": "", "error": str(e)}
+        except Exception as e:
+            result = {"success": False, "task": job.query, "result": "", "error": f"异步任务执行失败: {str(e)}"}
+        with job.changed:
+            if job.cancel_requested:
+                job.status = "cancelled"
+                if result is None or not result.get("success"):
+                    result = {"success": False, "task": job.query, "result": "", "error": "任务已取消"}
+            else:
+                job.status = "succeeded" if result and result.get("success") else "failed"
+            job.result = result
+            job.finished_at = time.time()
+            job.changed.notify_all()
+        print(f"✅ 异步任务结束: {job.job_id}（{job.status}）")
+
+    @staticmethod
+    def _add_event(job: Job, message: dict) -> None:
+        event = {key: value for key, value in message.items() if key not in ("type", "task_id")}
+        with job.changed:
+            if job.status == "pending":
+                job.status = "running"
+                job.started_at = time.time()
+            job.events.append(event)
+            if len(job.events) > MAX_JOB_EVENTS:
+                job.events.pop(0)
+                job.events_dropped += 1
+            job.changed.notify_all()
+
+    def get(self, job_id: str, storage: Any = None) -> Optional[Job]:
+        """查找任务，内存中没有时从插件存储恢复已结束的任务；已结束的任务顺便写入插件存储"""
+        now = time.time()
+        with self._lock:
+            self._evict(now)
+            job = self._jobs.get(job_id)
+        if job is None and storage is not None:
+            job = self._load(job_id, storage, now)
+        if job is not None and storage is not None:
+            self.persist(job, storage)
+        return job
+
+    def wait(self, job: Job, since: int, timeout: float) -> bool:
+        """等待出现序号不小于since的进度或任务结束，返回是否有新内容"""
+        with job.changed:
+            return job.changed.wait_for(lambda: job.finished or job.events_dropped + len(job.events) > since, timeout)
+
+    def cancel(self, job_id: str, storage: Any = None) -> Optional[Job]:
+        """请求取消任务，返回任务（不存在时返回None）；已结束的任务（包括从插件存储恢复的）不受影响"""
+        job = self.get(job_id, storage)
+        if job is None or job.finished:
+            return job
+        with job.changed:
+            job.cancel_requested = True
+        if get_worker_pool().cancel(job_id):
+            print(f"🛑 异步任务已请求取消: {job_id}")
+        return job
+
+    def persist(self, job: Job, storage: Any) -> None:
+        """把已结束的任务写入插件存储，每个任务只写一次"""
+        if storage is None or not job.finished or job.persisted:
+            return
+        job.persisted = True
+        entry = {**job.snapshot(), "progress": [], "ttl": job.ttl}
+        data = json.dumps(entry, ensure_ascii=False).encode("utf-8")
+        if len(data) > STORAGE_MAX_ENTRY_BYTES:
+            # 结果过大时只保留内容字段
+            entry["result"] = {key: entry["result"].get(key) for key in ("success", "task", "result", "error")}
+            data = json.dumps(entry, ensure_ascii=False).encode("utf-8")
+            if len(data) > STORAGE_MAX_ENTRY_BYTES:
+                return
+        try:
+            with self._storage_lock:
+                index = [item for item in self._load_index(storage) if item != job.job_id]
+                index.append(job.job_id)
+                while len(index) > STORAGE_MAX_ENTRIES:
+                    storage.delete(STORAGE_KEY_PREFIX + index.pop(0))
+                storage.set(STORAGE_KEY_PREFIX + job.job_id, data)
+                storage.set(STORAGE_INDEX_KEY, json.dumps(index).encode("utf-8"))
+        except Exception as e:
+            print(f"⚠️ 写入异步任务结果失败: {e}")
+
+    def _load(self, job_id: str, storage: Any, now: float) -> Optional[Job]:
+        try:
+            if not storage.exist(STORAGE_KEY_PREFIX + job_id):
+                return None
+            data = json.loads(storage.get(STORAGE_KEY_PREFIX + job_id).decode("utf-8"))
+        except Exception as e:
+            print(f"⚠️ 读取异步任务结果失败: {e}")
+            return None
+        if (data.get("finished_at") or 0) + data.get("ttl", self.ttl) <= now:
+            return None
+        return Job.restore(data)
+
+    @staticmethod
+    def _load_index(storage: Any) -> list[str]:
+        if not storage.exist(STORAGE_INDEX_KEY):
+            return []
+        return json.loads(storage.get(STORAGE_INDEX_KEY).decode("utf-8"))
+
+    def _evict(self, now: float) -> None:
+        """淘汰过期的任务；超出数量上限时按结束时间淘汰最早结束的任务，未结束的任务不淘汰"""
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished and job.finished_at + job.ttl <= now]:
+            del self._jobs[job_id]
+        finished = sorted((job for job in self._jobs.values() if job.finished), key=lambda job: job.finished_at)
+        while len(self._jobs) >= self.max_jobs and finished:
+            del self._jobs[finished.pop(0).job_id]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts: dict[str, int] = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        return {"jobs": sum(counts.values()), **counts}
+
+
+_manager: Optional[JobManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """获取进程内共享的异步任务表"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager()
+        return _manager
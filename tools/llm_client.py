@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+llm_client.py - LLM端点配置与共享HTTP连接
+  - LLMConfig: 端点、模型（及可选的快速模型）、密钥、超时和重试次数，来自插件提供方凭据，未配置的项使用环境变量或默认值；
+    随任务消息传给Worker
+  - 常驻Worker内按端点共享一个带连接池和keep-alive的httpx.AsyncClient，每个任务新建的ChatOpenAI
+    复用已建立的连接，每步LLM调用不再重新建立TCP连接
+  - browser_use每个Agent都会探测模型的工具调用方式（额外的LLM请求），探测结果按端点和模型缓存，
+    同一Worker内后续任务直接使用
+  - probe_endpoint: 凭据校验时向端点发送一次最小请求，检查可用性并测量延迟
+"""
+
+import asyncio
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+from dataclasses import asdict, dataclass
+from typing import Any, Optional
+
+import httpx
+
+DEFAULT_LLM_MODEL = os.environ.get("BROWSER_LLM_MODEL", "DeepSeek")
+DEFAULT_LLM_BASE_URL = os.environ.get("BROWSER_LLM_BASE_URL", "http://10.4.35.64:31111/v1")
+DEFAULT_LLM_API_KEY = os.environ.get("BROWSER_LLM_API_KEY", "")
+# 快速模型，配置后启用模型分级路由（见model_routing.py），为空时所有调用都使用model
+DEFAULT_LLM_FAST_MODEL = os.environ.get("BROWSER_LLM_FAST_MODEL", "")
+DEFAULT_LLM_TIMEOUT = 30.0
+DEFAULT_LLM_MAX_RETRIES = 3
+
+# 共享连接池的大小与空闲连接保持时间
+MAX_CONNECTIONS = 20
+MAX_KEEPALIVE_CONNECTIONS = 10
+KEEPALIVE_EXPIRY = 120.0
+
+# 凭据校验时探测请求的最长等待时间（秒）
+PROBE_TIMEOUT = 15.0
+
+
+@dataclass(frozen=True)
+class LLMConfig:
+    base_url: str = DEFAULT_LLM_BASE_URL
+    model: str = DEFAULT_LLM_MODEL
+    api_key: str = DEFAULT_LLM_API_KEY
+    timeout: float = DEFAULT_LLM_TIMEOUT
+    max_retries: int = DEFAULT_LLM_MAX_RETRIES
+    fast_model: str = DEFAULT_LLM_FAST_MODEL
+
+    @classmethod
+    def from_credentials(cls, credentials: Optional[dict]) -> "LLMConfig":
+        """从提供方凭据构造，空值使用默认值"""
+        credentials = credentials or {}
+        return cls(
+            base_url=(credentials.get("llm_base_url") or DEFAULT_LLM_BASE_URL).strip().rstrip("/"),
+            model=(credentials.get("llm_model") or DEFAULT_LLM_MODEL).strip(),
+            api_key=credentials.get("llm_api_key") or DEFAULT_LLM_API_KEY,
+            timeout=float(credentials.get("llm_timeout") or DEFAULT_LLM_TIMEOUT),
+            max_retries=int(credentials.get("llm_max_retries") or DEFAULT_LLM_MAX_RETRIES),
+            fast_model=(credentials.get("llm_fast_model") or DEFAULT_LLM_FAST_MODEL).strip(),
+        )
+
+    @classmethod
+    def from_message(cls, data: Optional[dict]) -> "LLMConfig":
+        """从任务消息中的llm字段还原，缺失时使用默认值"""
+        if not data:
+            return cls()
+        fields = cls.__dataclass_fields__
+        return cls(**{key: value for key, value in data.items() if key in fields and value not in (None, "")})
+
+    def to_message(self) -> dict:
+        return asdict(self)
+
+
+_clients: dict[tuple, httpx.AsyncClient] = {}
+_tool_calling_methods: dict[tuple[str, str], str] = {}
+
+
+def get_http_client(config: LLMConfig) -> httpx.AsyncClient:
+    """当前事件循环内按端点共享的异步HTTP客户端；常驻Worker只有一个事件循环，客户端在任务之间复用"""
+    key = (id(asyncio.get_running_loop()), config.base_url)
+    client = _clients.get(key)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(config.timeout, connect=min(config.timeout, 10.0)),
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS,
+                                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                                keepalive_expiry=KEEPALIVE_EXPIRY),
+        )
+        _clients[key] = client
+    return client
+
+
+async def close_http_clients() -> None:
+    loop_id = id(asyncio.get_running_loop())
+    for key in [key for key in _clients if key[0] == loop_id]:
+        await _clients.pop(key).aclose()
+
+
+def create_llm(config: LLMConfig, callbacks: Optional[list] = None, model: Optional[str] = None) -> Any:
+    """
+    创建使用共享连接池的ChatOpenAI，model默认为config.model；
+    同一端点和模型已探测过工具调用方式时直接标记，Agent不再重复探测
+    """
+    from langchain_openai import ChatOpenAI
+
+    model = model or config.model
+    llm = ChatOpenAI(
+        model=model,
+        openai_api_base=config.base_url,
+        # 自建端点通常不校验密钥，但OpenAI客户端要求非空
+        openai_api_key=config.api_key or os.environ.get("OPENAI_API_KEY") or "EMPTY",
+        timeout=config.timeout,
+        max_retries=config.max_retries,
+        http_async_client=get_http_client(config),
+        callbacks=callbacks,
+    )
+    method = _tool_calling_methods.get((config.base_url, model))
+    if method is not None:
+        llm._verified_api_keys = True
+        llm._verified_tool_calling_method = method
+    return llm
+
+
+def remember_tool_calling_method(config: LLMConfig, llm: Any) -> None:
+    """Agent初始化完成后记录其探测到的工具调用方式"""
+    method = getattr(llm, "_verified_tool_calling_method", None)
+    if method is not None:
+        _tool_calling_methods[(config.base_url, llm.model_name)] = method
+
+
+def probe_endpoint(config: LLMConfig) -> float:
+    """
+    向端点发送一次max_tokens=1的对话请求，返回往返耗时（秒）；
+    端点不可达、返回错误或超过PROBE_TIMEOUT时抛出异常
+    插件主进程由gevent调度，这里使用标准库urllib而不是httpx
+    """
+    headers = {"Content-Type": "application/json"}
+    if config.api_key:
+        headers["Authorization"] = f"Bearer {config.api_key}"
+    payload = {"model": config.model, "messages": [{"role": "user", "content": "ping"}], "max_tokens": 1}
+    request = urllib.request.Request(f"{config.base_url}/chat/completions", data=json.dumps(payload).encode("utf-8"),
+                                     headers=headers, method="POST")
+    timeout = min(config.timeout, PROBE_TIMEOUT)
+    started = time.monotonic()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            body = response.read()
+    except urllib.error.HTTPError as e:
+        raise ValueError(f"LLM端点返回HTTP {e.code}: {e.read()[:200].decode('utf-8', 'replace')}")
+    except (urllib.error.URLError, OSError) as e:
+        reason = getattr(e, "reason", e)
+        if isinstance(reason, TimeoutError):
+            raise ValueError(f"LLM端点响应超时（{timeout}秒）: {config.base_url}")
+        raise ValueError(f"无法连接LLM端点 {config.base_url}: {reason}")
+    latency = time.monotonic() - started
+    try:
+        json.loads(body)["choices"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"LLM端点返回的不是OpenAI兼容的对话结果: {e}")
+    return latency
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+memory_governor.py - Worker与主机的内存治理
+manifest.yaml声明的resource.memory只是申报值，一个Chromium加Python Worker常常超出；这里按实际占用治理：
+  - 主机级（进程池）: 主机内存达到高水位时新任务排队等待，等待超时仍未回落则拒绝，避免再启动浏览器导致OOM。
+    主机上限依次取BROWSER_HOST_MEMORY_MB、cgroup内存上限、物理内存
+  - Worker级（每步结束后）: Worker与其Chromium的RSS合计超过软阈值时关闭多余标签页、通过CDP触发垃圾回收
+    并清空浏览器缓存；连续多步仍超过上限时请求上下文池在空闲时重启浏览器
+每次治理决策记录到任务的metrics.memory中
+仅依赖psutil（可选），不导入浏览器相关模块，插件主进程也可导入
+"""
+
+import gc
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# 主机内存上限（MB），0表示自动检测
+DEFAULT_HOST_MEMORY_MB = float(os.environ.get("BROWSER_HOST_MEMORY_MB", "0"))
+# 单个Worker（含其Chromium）的内存上限（MB），0表示主机上限按进程池大小均分
+DEFAULT_WORKER_MEMORY_MB = float(os.environ.get("BROWSER_WORKER_MEMORY_MB", "0"))
+# 主机内存占用达到上限的该比例时暂停派发新任务
+DEFAULT_HIGH_WATERMARK = float(os.environ.get("BROWSER_MEMORY_HIGH_WATERMARK", "0.9"))
+# 新任务等待主机内存回落的最长时间（秒），超时后拒绝
+ADMIT_WAIT_SECONDS = 30.0
+ADMIT_POLL_INTERVAL = 1.0
+# Worker内存达到上限的该比例时开始释放内存
+RELIEF_RATIO = 0.8
+# 释放后仍超过上限的连续步数达到该值时重启浏览器
+OVER_CAP_STEPS = 3
+
+CGROUP_V2_DIR = Path("/sys/fs/cgroup")
+CGROUP_V1_DIR = Path("/sys/fs/cgroup/memory")
+# cgroup未设置上限时读到的值大于该值（字节）
+CGROUP_UNLIMITED = 1 << 60
+
+
+def _read_int(path: Path) -> Optional[int]:
+    try:
+        value = path.read_text().strip()
+    except OSError:
+        return None
+    return int(value) if value.isdigit() else None
+
+
+def _cgroup_inactive_file(stat_path: Path, key: str) -> int:
+    try:
+        for line in stat_path.read_text().splitlines():
+            name, _, value = line.partition(" ")
+            if name == key:
+                return int(value)
+    except (OSError, ValueError):
+        pass
+    return 0
+
+
+def cgroup_memory_mb() -> Optional[tuple[float, float]]:
+    """容器的(已用, 上限)内存（MB），已用内存扣除可回收的页缓存；未限制内存时返回None"""
+    for directory, current, limit, stat_key in (
+            (CGROUP_V2_DIR, "memory.current", "memory.max", "inactive_file"),
+            (CGROUP_V1_DIR, "memory.usage_in_bytes", "memory.limit_in_bytes", "total_inactive_file")):
+        limit_bytes = _read_int(directory / limit)
+        used_bytes = _read_int(directory / current)
+        if limit_bytes is None or used_bytes is None or limit_bytes >= CGROUP_UNLIMITED:
+            continue
+        used_bytes -= _cgroup_inactive_file(directory / "memory.stat", stat_key)
+        return max(used_bytes, 0) / (1024 * 1024), limit_bytes / (1024 * 1024)
+    return None
+
+
+def process_tree_rss_mb(pid: Optional[int] = None) -> float:
+    """进程及其所有子孙进程的RSS合计（MB），缺少psutil时返回0"""
+    if psutil is None:
+        return 0.0
+    try:
+        root = psutil.Process(pid)
+        processes = [root] + root.children(recursive=True)
+    except psutil.Error:
+        return 0.0
+    total = 0
+    for process in processes:
+        try:
+            total += process.memory_info().rss
+        except psutil.Error:
+            continue
+    return total / (1024 * 1024)
+
+
+def host_memory() -> dict:
+    """主机内存占用：{"used_mb", "limit_mb", "source"}，无法检测时limit_mb为0"""
+    if DEFAULT_HOST_MEMORY_MB > 0:
+        # 显式上限（如按manifest的256MB申报值）只统计插件自身的进程树
+        return {"used_mb": round(process_tree_rss_mb(), 1), "limit_mb": DEFAULT_HOST_MEMORY_MB, "source": "env"}
+    cgroup = cgroup_memory_mb()
+    if cgroup is not None:
+        return {"used_mb": round(cgroup[0], 1), "limit_mb": round(cgroup[1], 1), "source": "cgroup"}
+    if psutil is not None:
+        memory = psutil.virtual_memory()
+        return {"used_mb": round((memory.total - memory.available) / (1024 * 1024), 1),
+                "limit_mb": round(memory.total / (1024 * 1024), 1), "source": "system"}
+    return {"used_mb": 0.0, "limit_mb": 0.0, "source": "unknown"}
+
+
+def host_under_pressure(watermark: float = DEFAULT_HIGH_WATERMARK) -> tuple[bool, dict]:
+    memory = host_memory()
+    return bool(memory["limit_mb"]) and memory["used_mb"] >= memory["limit_mb"] * watermark, memory
+
+
+def worker_memory_cap_mb(pool_size: int) -> float:
+    """单个Worker的内存上限：显式配置优先，否则主机上限按进程池大小均分，无法检测时为0（不限制）"""
+    # fork-server模式下环境变量在模板导入本模块之后才设置，这里在调用时读取
+    configured = float(os.environ.get("BROWSER_WORKER_MEMORY_MB") or DEFAULT_WORKER_MEMORY_MB)
+    if configured > 0:
+        return configured
+    limit_mb = host_memory()["limit_mb"]
+    return round(limit_mb / max(1, pool_size), 1) if limit_mb else 0.0
+
+
+class MemoryGovernor:
+    """
+    Worker内的内存治理，cap_mb为Worker进程与其Chromium的RSS上限，为0时只记录不干预
+    - chromium_rss: 返回Chromium总RSS（MB）的函数，见context_pool.chromium_rss_mb
+    - context_pool: 需要重启浏览器时调用其request_restart
+    - record: 记录治理决策的函数，见TaskMetrics.record_memory
+    """
+
+    def __init__(self, cap_mb: float, chromium_rss: Callable[[], float], context_pool: Any = None,
+                 record: Optional[Callable[[dict], None]] = None):
+        self.cap_mb = max(0.0, cap_mb)
+        self.chromium_rss = chromium_rss
+        self.context_pool = context_pool
+        self.record = record or (lambda decision: None)
+        self.over_cap_steps = 0
+
+    def sample(self) -> tuple[float, float]:
+        """返回(Worker进程RSS, Chromium RSS)，单位MB"""
+        worker_mb = psutil.Process().memory_info().rss / (1024 * 1024) if psutil is not None else 0.0
+        return worker_mb, self.chromium_rss()
+
+    def _decision(self, step: Optional[int], action: str, worker_mb: float, chromium_mb: float, **extra) -> dict:
+        decision = {
+            "step": step,
+            "action": action,
+            "worker_rss_mb": round(worker_mb, 1),
+            "chromium_rss_mb": round(chromium_mb, 1),
+            "cap_mb": self.cap_mb,
+            **extra,
+        }
+        self.record(decision)
+        return decision
+
+    def before_task(self) -> None:
+        """任务开始前检查：已超过上限时请求重启浏览器，上下文池在没有其他任务使用时立即重启"""
+        if not self.cap_mb:
+            return
+        worker_mb, chromium_mb = self.sample()
+        if worker_mb + chromium_mb < self.cap_mb:
+            return
+        gc.collect()
+        if self.context_pool is not None:
+            self.context_pool.request_restart(f"任务开始前内存{worker_mb + chromium_mb:.0f}MB超过上限{self.cap_mb:.0f}MB")
+        self._decision(0, "recycle_browser", worker_mb, chromium_mb)
+
+    async def on_step_end(self, agent: Any) -> None:
+        """Agent每步结束后采样，超过软阈值时释放内存，持续超过上限时请求重启浏览器"""
+        if not self.cap_mb:
+            return
+        worker_mb, chromium_mb = self.sample()
+        if worker_mb + chromium_mb < self.cap_mb * RELIEF_RATIO:
+            self.over_cap_steps = 0
+            return
+
+        started = time.monotonic()
+        closed_tabs = await self._relieve(agent)
+        after_worker_mb, after_chromium_mb = self.sample()
+        after_mb = after_worker_mb + after_chromium_mb
+        step = agent.state.n_steps
+        print(f"🧠 内存{worker_mb + chromium_mb:.0f}MB接近上限{self.cap_mb:.0f}MB，"
+              f"关闭{closed_tabs}个标签页并回收后为{after_mb:.0f}MB")
+        self._decision(step, "relieve", worker_mb, chromium_mb, closed_tabs=closed_tabs,
+                       after_mb=round(after_mb, 1), relieve_s=round(time.monotonic() - started, 3))
+
+        if after_mb < self.cap_mb:
+            self.over_cap_steps = 0
+            return
+        self.over_cap_steps += 1
+        if self.over_cap_steps == OVER_CAP_STEPS and self.context_pool is not None:
+            self.context_pool.request_restart(f"连续{OVER_CAP_STEPS}步内存超过上限{self.cap_mb:.0f}MB")
+            self._decision(step, "recycle_browser", after_worker_mb, after_chromium_mb)
+
+    async def _relieve(self, agent: Any) -> int:
+        """关闭当前页以外的标签页，对当前页触发V8垃圾回收、清空HTTP缓存并发出内存压力通知，返回关闭的标签页数"""
+        closed = 0
+        try:
+            page = await agent.browser_session.get_current_page()
+            for other in list(page.context.pages):
+                if other is not page:
+                    await other.close()
+                    closed += 1
+            cdp = await page.context.new_cdp_session(page)
+            try:
+                for method, params in (("HeapProfiler.collectGarbage", {}),
+                                       ("Network.clearBrowserCache", {}),
+                                       ("Memory.simulatePressureNotification", {"level": "critical"})):
+                    try:
+                        await cdp.send(method, params)
+                    except Exception:
+                        continue
+            finally:
+                await cdp.detach()
+        except Exception as e:
+            print(f"⚠️ 释放浏览器内存失败: {e}")
+        gc.collect()
+        return closed
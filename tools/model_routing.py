@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+model_routing.py - 快速模型与推理模型的分级路由
+推理模型（如DeepSeek-R1）每次调用都会输出很长的<think>内容，用它决定"点击搜索框"这类常规动作过慢。
+启用路由后（提供方凭据中配置了快速模型）：
+  - 快速模型作为Agent的主模型，负责每一步的动作选择
+  - 推理模型作为browser_use的planner，只在第一步（制定计划）、上一步动作失败后（恢复）
+    以及按BROWSER_REPLAN_INTERVAL定期重新规划时运行，计划插入到快速模型的提示词中
+  - 任务结束后由推理模型根据执行过程中提取的内容生成最终的中文答复
+每一步的路由决策和按模型汇总的耗时、token数随结果以routing字段返回
+"""
+
+import os
+import re
+import sys
+from typing import Any, Optional
+
+# 定期重新规划的步数间隔，0表示只在第一步和失败恢复时规划
+DEFAULT_REPLAN_INTERVAL = int(os.environ.get("BROWSER_REPLAN_INTERVAL", "0"))
+# 送入最终答复调用的提取内容上限（字符）
+MAX_SUMMARY_INPUT_CHARS = 12000
+
+THINK_PATTERN = re.compile(r"<think>.*?</think>", re.DOTALL)
+
+FINAL_SUMMARY_PROMPT = (
+    "你是浏览器自动化助手。下面是用户的任务、浏览器Agent执行后给出的结论以及执行过程中从页面提取的内容。"
+    "请只依据这些内容，使用中文给出最终答复，不要编造。"
+)
+
+
+def strip_think(text: str) -> str:
+    return THINK_PATTERN.sub("", text).strip()
+
+
+class ModelRouter:
+    """在Agent每一步开始前决定本步是否调用推理模型（planner），并在任务结束后用推理模型生成最终答复"""
+
+    def __init__(self, fast_model: str, strong_model: str, replan_interval: int = DEFAULT_REPLAN_INTERVAL):
+        self.fast_model = fast_model
+        self.strong_model = strong_model
+        self.replan_interval = max(0, replan_interval)
+        self.decisions: list[dict] = []
+        self.summary_used = False
+
+    def install(self, agent: Any) -> None:
+        """Agent需以planner_llm=推理模型创建；推理模型的<think>内容不写入快速模型的提示词"""
+        message_manager = agent._message_manager
+        original_add_plan = message_manager.add_plan
+
+        def add_plan(plan: Optional[str], position: Optional[int] = None) -> None:
+            original_add_plan(strip_think(plan) if plan else plan, position)
+
+        message_manager.add_plan = add_plan
+
+    def _reason(self, agent: Any) -> Optional[str]:
+        step = agent.state.n_steps
+        if step == 1:
+            return "plan"
+        last_result = agent.state.last_result or []
+        if agent.state.consecutive_failures > 0 or any(result.error for result in last_result):
+            return "recovery"
+        if self.replan_interval and (step - 1) % self.replan_interval == 0:
+            return "replan"
+        return None
+
+    async def on_step_start(self, agent: Any) -> None:
+        """browser_use在n_steps % planner_interval == 0时运行planner，这里按本步的决策切换间隔"""
+        reason = self._reason(agent)
+        agent.settings.planner_interval = 1 if reason else sys.maxsize
+        decision = {"step": agent.state.n_steps, "action_model": self.fast_model}
+        if reason:
+            decision.update({"planner_model": self.strong_model, "reason": reason})
+        self.decisions.append(decision)
+
+    async def final_summary(self, llm: Any, query: str, conclusion: str, extracted: list[str]) -> Optional[str]:
+        """用推理模型生成最终答复，失败时返回None（保留快速模型的结论）"""
+        from langchain_core.messages import HumanMessage, SystemMessage
+
+        contents = "\n\n".join(text for text in extracted if text)[:MAX_SUMMARY_INPUT_CHARS]
+        try:
+            response = await llm.ainvoke([
+                SystemMessage(content=FINAL_SUMMARY_PROMPT),
+                HumanMessage(content=f"任务: {query}\n\nAgent结论: {conclusion}\n\n提取的内容:\n{contents or '（无）'}"),
+            ])
+        except Exception as e:
+            print(f"⚠️ 推理模型生成最终答复失败，使用快速模型的结论: {e}")
+            return None
+        answer = strip_think(str(response.content))
+        if not answer:
+            return None
+        self.summary_used = True
+        return answer
+
+    def snapshot(self, model_totals: Optional[dict] = None) -> dict:
+        planner_steps = [d["step"] for d in self.decisions if "planner_model" in d]
+        return {
+            "fast_model": self.fast_model,
+            "strong_model": self.strong_model,
+            "steps": len(self.decisions),
+            "planner_steps": planner_steps,
+            "final_summary_model": self.strong_model if self.summary_used else self.fast_model,
+            "decisions": self.decisions,
+            "models": model_totals or {},
+        }
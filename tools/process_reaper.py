@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+process_reaper.py - 进程树清理与孤儿Chromium回收
+  - kill_process_tree: 终止Worker时连同其所有子孙进程一起终止。Playwright以独立进程组启动Chromium，
+    只杀Worker的进程组不够，需要按进程树逐个终止
+  - reap_orphans: 定期查找本进程池启动、已脱离Worker的Chromium（父进程已退出、被init收养）以及
+    超过阈值的browser_task_*临时文件并清理，返回清理数量。进程池为其Worker设置POOL_ID_ENV环境变量，
+    Chromium经Playwright驱动继承该变量，只回收带有本进程池标识的进程，
+    同一主机上其他插件、其他用户或测试用的Chromium都不受影响
+缺少psutil时只能按进程组终止，孤儿进程回收跳过
+"""
+
+import os
+import signal
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# 临时文件超过该时间（秒）未修改视为残留
+DEFAULT_STALE_SECONDS = float(os.environ.get("BROWSER_REAPER_STALE_SECONDS", "600"))
+# 孤儿进程至少存在该时间（秒）才回收，避免与正在退出的Worker的清理竞争
+ORPHAN_MIN_AGE_SECONDS = 30
+STALE_FILE_PATTERN = "browser_task_*"
+
+CHROMIUM_PROCESS_NAMES = ("chrome", "chromium", "headless_shell")
+# 进程池标识的环境变量名，Worker及其启动的Playwright驱动、Chromium都继承该变量
+POOL_ID_ENV = "BROWSER_POOL_ID"
+
+
+def new_pool_id() -> str:
+    """生成进程池标识，包含PID便于排查"""
+    return f"{os.getpid()}-{uuid.uuid4().hex[:12]}"
+
+
+def kill_process_group(pgid: int) -> None:
+    """终止整个进程组；组长已退出但组内仍有进程时同样有效，进程组存在期间其ID不会被复用"""
+    if not hasattr(os, "killpg"):
+        return
+    try:
+        os.killpg(pgid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def kill_process_tree(pid: int) -> int:
+    """强制终止pid及其所有子孙进程（含以pid为组长的进程组），返回终止的进程数"""
+    targets = []
+    if psutil is not None:
+        try:
+            root = psutil.Process(pid)
+            targets = root.children(recursive=True) + [root]
+        except psutil.Error:
+            targets = []
+    kill_process_group(pid)
+    if not targets:
+        try:
+            os.kill(pid, signal.SIGKILL)
+            return 1
+        except (ProcessLookupError, PermissionError):
+            return 0
+    for process in targets:
+        try:
+            process.kill()
+        except psutil.Error:
+            pass
+    return len(targets)
+
+
+def descendants(pid: int) -> list:
+    """pid的所有子孙进程；psutil.Process终止时会校验进程创建时间，之后即使PID被复用也不会误杀；缺少psutil时返回空列表"""
+    if psutil is None:
+        return []
+    try:
+        return psutil.Process(pid).children(recursive=True)
+    except psutil.Error:
+        return []
+
+
+def kill_processes(processes: list) -> int:
+    """强制终止descendants()返回的进程，返回终止的进程数"""
+    killed = 0
+    for process in processes:
+        try:
+            process.kill()
+            killed += 1
+        except psutil.Error:
+            pass
+    return killed
+
+
+def _is_orphan_chromium(process, now: float, pool_id: str) -> bool:
+    """本进程池启动的Chromium主进程，且其父进程（Playwright驱动）已退出、被PID 1收养；无权读取环境变量的进程不是本进程池启动的"""
+    try:
+        if not any(name in process.name().lower() for name in CHROMIUM_PROCESS_NAMES):
+            return False
+        if process.ppid() != 1 or now - process.create_time() < ORPHAN_MIN_AGE_SECONDS:
+            return False
+        return process.environ().get(POOL_ID_ENV) == pool_id
+    except psutil.Error:
+        return False
+
+
+def reap_orphan_chromium(pool_id: str) -> int:
+    """终止带有pool_id标识的孤儿Chromium进程树（渲染等子进程随主进程一起终止），返回终止的进程数"""
+    if psutil is None or not pool_id:
+        return 0
+    now = time.time()
+    killed = 0
+    for process in psutil.process_iter():
+        if _is_orphan_chromium(process, now, pool_id):
+            print(f"🧟 回收孤儿Chromium进程，PID: {process.pid}")
+            killed += kill_process_tree(process.pid)
+    return killed
+
+
+def reap_stale_files(directory: Path = Path(tempfile.gettempdir()),
+                     stale_seconds: float = DEFAULT_STALE_SECONDS) -> int:
+    """删除超过stale_seconds未修改的browser_task_*临时文件，返回删除数量"""
+    cutoff = time.time() - stale_seconds
+    removed = 0
+    for path in directory.glob(STALE_FILE_PATTERN):
+        try:
+            if path.is_file() and path.stat().st_mtime < cutoff:
+                path.unlink()
+                removed += 1
+        except OSError:
+            continue
+    return removed
+
+
+def reap_orphans(pool_id: str, stale_seconds: float = DEFAULT_STALE_SECONDS) -> dict:
+    """执行一次回收，pool_id为进程池标识；返回{"processes": 终止的进程数, "files": 删除的文件数}"""
+    return {"processes": reap_orphan_chromium(pool_id), "files": reap_stale_files(stale_seconds=stale_seconds)}
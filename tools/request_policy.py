@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+request_policy.py - 页面资源拦截策略
+Chromium启动参数只能关闭图片，字体、音视频、统计埋点和第三方脚本仍会在每次加载页面时下载和解析。
+这里通过Playwright的context.route在浏览器上下文层面拦截请求：
+  - 预设: full（不拦截）、no-media（拦截图片/音视频/字体/埋点）、text-only（在no-media基础上再拦截样式表和第三方脚本）
+  - 域名白名单/黑名单: 白名单中的域名始终放行，黑名单中的域名始终拦截，优先于预设
+  - 统计: 请求总数、拦截数（按资源类型）、放行响应的字节数，以及估算的拦截字节数，随任务结果返回
+    被拦截的请求没有发出，无从得知其实际大小，bytes_blocked_estimate按资源类型的典型大小估算
+"""
+
+import os
+from typing import Iterable, Optional
+from urllib.parse import urlsplit
+
+BLOCK_PRESETS = ("full", "no-media", "text-only")
+DEFAULT_BLOCK_PRESET = os.environ.get("BROWSER_BLOCK_PRESET", "full")
+
+# 各预设拦截的资源类型（Playwright request.resource_type）
+PRESET_RESOURCE_TYPES = {
+    "full": frozenset(),
+    "no-media": frozenset({"image", "media", "font", "ping"}),
+    "text-only": frozenset({"image", "media", "font", "ping", "stylesheet", "texttrack", "manifest"}),
+}
+
+# 被拦截请求按资源类型估算的字节数，取常见网页中该类资源的典型传输大小，未列出的类型按other计
+ESTIMATED_BYTES_BY_TYPE = {
+    "image": 20 * 1024,
+    "media": 300 * 1024,
+    "font": 30 * 1024,
+    "script": 25 * 1024,
+    "stylesheet": 10 * 1024,
+    "ping": 0,
+    "other": 4 * 1024,
+}
+
+# 常见统计与广告域名，no-media和text-only预设下拦截
+TRACKER_DOMAINS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "googlesyndication.com",
+    "hm.baidu.com",
+    "cnzz.com",
+    "umeng.com",
+    "growingio.com",
+    "sensorsdata.cn",
+    "facebook.net",
+    "hotjar.com",
+    "clarity.ms",
+    "mixpanel.com",
+    "segment.io",
+)
+
+# 形如xxx.com.cn的二级公共后缀，计算站点域名时需要多保留一级
+SECOND_LEVEL_SUFFIXES = ("com.cn", "net.cn", "org.cn", "gov.cn", "edu.cn", "co.uk", "com.hk", "co.jp")
+
+
+def parse_domains(raw: Optional[str]) -> tuple[str, ...]:
+    """逗号、空格或换行分隔的域名列表"""
+    if not raw:
+        return ()
+    items = raw.replace(",", " ").replace("，", " ").split()
+    return tuple(item.strip().lower().lstrip(".") for item in items if item.strip())
+
+
+def _host_of(url: str) -> str:
+    return (urlsplit(url).hostname or "").lower()
+
+
+def _matches(host: str, domains: Iterable[str]) -> bool:
+    return any(host == domain or host.endswith("." + domain) for domain in domains)
+
+
+def site_of(host: str) -> str:
+    """近似的可注册域名（eTLD+1），用于判断第三方请求"""
+    labels = host.split(".")
+    keep = 3 if ".".join(labels[-2:]) in SECOND_LEVEL_SUFFIXES else 2
+    return ".".join(labels[-keep:])
+
+
+class RequestPolicy:
+    """单个任务的拦截策略，attach到浏览器上下文后生效，任务结束时detach以便上下文复用"""
+
+    def __init__(self, preset: str = DEFAULT_BLOCK_PRESET,
+                 allow_domains: Iterable[str] = (), deny_domains: Iterable[str] = ()):
+        self.preset = preset if preset in BLOCK_PRESETS else "full"
+        self.blocked_types = PRESET_RESOURCE_TYPES[self.preset]
+        self.allow_domains = tuple(allow_domains)
+        self.deny_domains = tuple(deny_domains)
+        self.block_trackers = self.preset != "full"
+        self.block_third_party_scripts = self.preset == "text-only"
+        self._context = None
+        self.stats = {"requests": 0, "blocked": 0, "blocked_by_type": {}, "bytes_loaded": 0,
+                      "bytes_blocked_estimate": 0}
+
+    @classmethod
+    def from_options(cls, options: dict) -> "RequestPolicy":
+        """从任务选项（block_preset、block_allow、block_deny）构造"""
+        return cls(preset=options.get("block_preset") or DEFAULT_BLOCK_PRESET,
+                   allow_domains=parse_domains(options.get("block_allow")),
+                   deny_domains=parse_domains(options.get("block_deny")))
+
+    def cache_profile(self) -> str:
+        """规范化的策略描述，计入结果缓存键：拦截的资源不同，页面内容和提取结果也可能不同"""
+        return "|".join((self.preset, "allow=" + ",".join(sorted(set(self.allow_domains))),
+                         "deny=" + ",".join(sorted(set(self.deny_domains)))))
+
+    @property
+    def active(self) -> bool:
+        return self.preset != "full" or bool(self.deny_domains)
+
+    def should_block(self, url: str, resource_type: str, top_url: str = "") -> bool:
+        host = _host_of(url)
+        if not host:
+            return False
+        if _matches(host, self.allow_domains):
+            return False
+        if _matches(host, self.deny_domains):
+            return True
+        if resource_type == "document":
+            # 页面本身从不按类型拦截，否则Agent无法导航
+            return False
+        if resource_type in self.blocked_types:
+            return True
+        if self.block_trackers and _matches(host, TRACKER_DOMAINS):
+            return True
+        if self.block_third_party_scripts and resource_type == "script" and top_url:
+            top_host = _host_of(top_url)
+            return bool(top_host) and site_of(host) != site_of(top_host)
+        return False
+
+    async def _handle_route(self, route, request) -> None:
+        self.stats["requests"] += 1
+        try:
+            top_url = request.frame.page.url if request.frame else ""
+        except Exception:
+            top_url = ""
+        if self.should_block(request.url, request.resource_type, top_url):
+            self.stats["blocked"] += 1
+            by_type = self.stats["blocked_by_type"]
+            by_type[request.resource_type] = by_type.get(request.resource_type, 0) + 1
+            self.stats["bytes_blocked_estimate"] += ESTIMATED_BYTES_BY_TYPE.get(
+                request.resource_type, ESTIMATED_BYTES_BY_TYPE["other"])
+            await route.abort("blockedbyclient")
+        else:
+            # 交给先注册的路由（如磁盘缓存）继续处理，没有时正常请求
+            await route.fallback()
+
+    def _on_response(self, response) -> None:
+        try:
+            self.stats["bytes_loaded"] += int(response.headers.get("content-length", 0))
+        except (TypeError, ValueError):
+            pass
+
+    async def attach(self, context) -> None:
+        """在浏览器上下文上安装拦截；full预设且没有黑名单时不安装，避免每个请求都经过Python"""
+        if not self.active or context is None:
+            return
+        self._context = context
+        await context.route("**/*", self._handle_route)
+        context.on("response", self._on_response)
+
+    async def detach(self) -> None:
+        if self._context is None:
+            return
+        context, self._context = self._context, None
+        try:
+            context.remove_listener("response", self._on_response)
+            await context.unroute("**/*", self._handle_route)
+        except Exception as e:
+            print(f"⚠️ 移除请求拦截失败: {e}")
+
+    def snapshot(self) -> dict:
+        return {"preset": self.preset, **self.stats}
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+result_cache.py - 浏览器任务结果缓存
+以规范化后的query + 模型 + 浏览器配置为键缓存成功的任务结果：
+  - 内存层: 按条目TTL过期、按容量LRU淘汰，进程内所有调用共享
+  - 持久层: 写入Dify插件存储（manifest.yaml中storage权限），插件重启后仍可命中
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Optional
+
+# 缓存配置，可通过环境变量覆盖
+DEFAULT_CACHE_MAX_ENTRIES = int(os.environ.get("BROWSER_CACHE_MAX_ENTRIES", "256"))
+DEFAULT_CACHE_TTL = float(os.environ.get("BROWSER_CACHE_TTL", "3600"))
+
+# 插件存储总容量只有1MB，持久层单独限制条目数和单条大小
+STORAGE_MAX_ENTRIES = 32
+STORAGE_MAX_ENTRY_BYTES = 16 * 1024
+STORAGE_KEY_PREFIX = "result_cache:"
+STORAGE_INDEX_KEY = "result_cache_index"
+
+CACHE_MODES = ("bypass", "prefer", "only")
+# 结果中与内容无关的运行时字段，不写入缓存
+RUNTIME_FIELDS = ("pool", "cache", "browser", "requests", "http_cache", "metrics", "routing", "budget")
+
+
+def normalize_query(query: str) -> str:
+    """全角转半角、合并空白，使仅有格式差异的指令命中同一条缓存"""
+    query = unicodedata.normalize("NFKC", query)
+    return re.sub(r"\s+", " ", query).strip()
+
+
+def cache_key(query: str, model: str, profile: str) -> str:
+    raw = json.dumps([normalize_query(query), model, profile], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """内存LRU + 插件存储的两级结果缓存，线程安全"""
+
+    def __init__(self, max_entries: int = DEFAULT_CACHE_MAX_ENTRIES):
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        # 插件存储索引的读-改-写必须串行，否则并发调用互相覆盖索引，被覆盖的条目永远不会被删除
+        self._storage_lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key: str, storage: Any = None) -> Optional[dict]:
+        """查找未过期的缓存条目，返回{"result", "stored_at", "expires_at"}；同时计入命中/未命中"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["expires_at"] <= now:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        if entry is None and storage is not None:
+            entry = self._load(key, storage, now)
+            if entry is not None:
+                self._remember(key, entry)
+
+        with self._lock:
+            self.stats["hits" if entry is not None else "misses"] += 1
+        return entry
+
+    def put(self, key: str, result: dict, ttl: float = DEFAULT_CACHE_TTL, storage: Any = None) -> None:
+        """缓存成功结果；失败结果不缓存"""
+        # 预算用尽返回的部分结果不缓存
+        if not result.get("success") or result.get("truncated") or ttl <= 0:
+            return
+        now = time.time()
+        payload = {k: v for k, v in result.items() if k not in RUNTIME_FIELDS}
+        entry = {"result": payload, "stored_at": now, "expires_at": now + ttl}
+        self._remember(key, entry)
+        if storage is not None:
+            self._persist(key, entry, storage)
+
+    def _remember(self, key: str, entry: dict) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def _load(self, key: str, storage: Any, now: float) -> Optional[dict]:
+        try:
+            if not storage.exist(STORAGE_KEY_PREFIX + key):
+                return None
+            entry = json.loads(storage.get(STORAGE_KEY_PREFIX + key).decode("utf-8"))
+        except Exception as e:
+            print(f"⚠️ 读取持久化缓存失败: {e}")
+            return None
+        if entry.get("expires_at", 0) <= now:
+            return None
+        return entry
+
+    def _persist(self, key: str, entry: dict, storage: Any) -> None:
+        data = json.dumps(entry, ensure_ascii=False).encode("utf-8")
+        if len(data) > STORAGE_MAX_ENTRY_BYTES:
+            return
+        try:
+            with self._storage_lock:
+                index = self._load_index(storage)
+                if key in index:
+                    index.remove(key)
+                index.append(key)
+                # 持久层同样按LRU淘汰，保证不超出插件存储配额
+                while len(index) > STORAGE_MAX_ENTRIES:
+                    evicted = index.pop(0)
+                    storage.delete(STORAGE_KEY_PREFIX + evicted)
+                storage.set(STORAGE_KEY_PREFIX + key, data)
+                storage.set(STORAGE_INDEX_KEY, json.dumps(index).encode("utf-8"))
+        except Exception as e:
+            print(f"⚠️ 写入持久化缓存失败: {e}")
+
+    @staticmethod
+    def _load_index(storage: Any) -> list[str]:
+        if not storage.exist(STORAGE_INDEX_KEY):
+            return []
+        return json.loads(storage.get(STORAGE_INDEX_KEY).decode("utf-8"))
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**self.stats, "entries": len(self._entries)}
+
+
+_cache: Optional[ResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    """获取进程内共享的结果缓存"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache()
+        return _cache
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+semantic_cache.py - 基于向量相似度的任务结果缓存
+精确缓存（result_cache.py）无法命中同义改写的指令，例如"bing.com搜索北京天气"和"用bing查北京今天天气"。
+这里把成功任务的query向量（由Dify反向调用text_embedding模型得到）保存在一个定长NumPy矩阵中，
+新任务按余弦相似度做最近邻查找，相似度和新鲜度都满足阈值时直接返回历史结果
+"""
+
+import os
+import threading
+import time
+from typing import Any, Optional
+
+import numpy as np
+
+from tools.result_cache import RUNTIME_FIELDS
+
+# 语义缓存配置，可通过环境变量覆盖
+DEFAULT_SEMANTIC_CAPACITY = int(os.environ.get("BROWSER_SEMANTIC_CACHE_CAPACITY", "512"))
+DEFAULT_SEMANTIC_THRESHOLD = float(os.environ.get("BROWSER_SEMANTIC_THRESHOLD", "0.92"))
+
+
+def embed_query(session: Any, embedding_model: dict, query: str) -> Optional[np.ndarray]:
+    """通过Dify反向调用text_embedding模型计算query向量，失败时返回None"""
+    from dify_plugin.entities.model.text_embedding import TextEmbeddingModelConfig
+
+    try:
+        response = session.model.text_embedding.invoke(
+            model_config=TextEmbeddingModelConfig(
+                provider=embedding_model["provider"],
+                model=embedding_model["model"],
+            ),
+            texts=[query],
+        )
+        return np.asarray(response.embeddings[0], dtype=np.float32)
+    except Exception as e:
+        print(f"⚠️ 计算query向量失败，跳过语义缓存: {e}")
+        return None
+
+
+class _VectorIndex:
+    """单个命名空间（模型+浏览器配置+向量模型）下的定长向量矩阵，行向量已归一化"""
+
+    def __init__(self, dim: int, capacity: int):
+        self.matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self.entries: list[Optional[dict]] = [None] * capacity
+        self.last_used = np.zeros(capacity, dtype=np.float64)
+        self.size = 0
+
+    def slot_for_insert(self, now: float) -> int:
+        """优先复用已过期的行，其次空行，最后淘汰最久未使用的行"""
+        for i in range(self.size):
+            if self.entries[i]["expires_at"] <= now:
+                return i
+        if self.size < len(self.entries):
+            self.size += 1
+            return self.size - 1
+        return int(np.argmin(self.last_used[:self.size]))
+
+
+class SemanticCache:
+    """余弦相似度最近邻缓存，内存占用由capacity和向量维度固定上限，线程安全"""
+
+    def __init__(self, capacity: int = DEFAULT_SEMANTIC_CAPACITY):
+        self.capacity = max(1, capacity)
+        self._indexes: dict[str, _VectorIndex] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def _normalize(vector: np.ndarray) -> Optional[np.ndarray]:
+        norm = float(np.linalg.norm(vector))
+        if norm == 0.0:
+            return None
+        return vector / norm
+
+    def lookup(self, namespace: str, vector: np.ndarray,
+               threshold: float = DEFAULT_SEMANTIC_THRESHOLD) -> Optional[tuple[dict, float]]:
+        """返回(缓存条目, 相似度)；没有未过期且相似度不低于threshold的条目时返回None"""
+        vector = self._normalize(vector)
+        now = time.time()
+        with self._lock:
+            index = self._indexes.get(namespace)
+            if vector is None or index is None or index.size == 0 or index.matrix.shape[1] != vector.shape[0]:
+                self.stats["misses"] += 1
+                return None
+
+            similarities = index.matrix[:index.size] @ vector
+            # 过期条目不参与匹配
+            for i in np.argsort(-similarities):
+                similarity = float(similarities[i])
+                if similarity < threshold:
+                    break
+                entry = index.entries[i]
+                if entry["expires_at"] > now:
+                    index.last_used[i] = now
+                    self.stats["hits"] += 1
+                    return entry, similarity
+
+            self.stats["misses"] += 1
+            return None
+
+    def add(self, namespace: str, vector: np.ndarray, query: str, result: dict, ttl: float) -> None:
+        """记录成功结果；失败结果不缓存"""
+        vector = self._normalize(vector)
+        if vector is None or not result.get("success") or ttl <= 0:
+            return
+        now = time.time()
+        payload = {k: v for k, v in result.items() if k not in RUNTIME_FIELDS}
+        with self._lock:
+            index = self._indexes.get(namespace)
+            if index is None or index.matrix.shape[1] != vector.shape[0]:
+                index = self._indexes[namespace] = _VectorIndex(vector.shape[0], self.capacity)
+            slot = index.slot_for_insert(now)
+            if index.entries[slot] is not None and index.entries[slot]["expires_at"] > now:
+                self.stats["evictions"] += 1
+            index.matrix[slot] = vector
+            index.entries[slot] = {"query": query, "result": payload, "stored_at": now, "expires_at": now + ttl}
+            index.last_used[slot] = now
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            entries = sum(index.size for index in self._indexes.values())
+            return {**self.stats, "entries": entries}
+
+
+_cache: Optional[SemanticCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_semantic_cache() -> SemanticCache:
+    """获取进程内共享的语义缓存"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SemanticCache()
+        return _cache
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+task_budget.py - 任务的步数、时间和token预算
+预算在Worker内执行，不依赖进程池超时杀进程：
+  - max_steps: 传给agent.run，达到后browser_use自行结束
+  - max_wall_seconds: 每步结束后按已完成步骤的平均耗时预估下一步，预计超出时停止Agent；
+    单步卡住时由调用方的硬超时（remaining_seconds）兜底
+  - max_llm_tokens: 按LLM回调统计的实际token用量，同样按每步平均用量预估
+预算用尽时Agent正常停止，调用方从已有历史中整理部分结果并标记truncated
+"""
+
+import os
+import time
+from typing import Any, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# 插件请求的最长时间为300秒（main.py中的MAX_REQUEST_TIMEOUT），任务时间预算需在此之前结束
+MAX_WALL_SECONDS = 270
+DEFAULT_MAX_WALL_SECONDS = float(os.environ.get("BROWSER_MAX_WALL_SECONDS", "150"))
+DEFAULT_MAX_LLM_TOKENS = int(os.environ.get("BROWSER_MAX_LLM_TOKENS", "0"))
+# 进程池超时比时间预算多出的余量：留给整理结果、清理上下文和返回
+WALL_GRACE_SECONDS = 20
+# 停止后整理结果所需的时间（秒），预估下一步时一并扣除
+FINISH_RESERVE_SECONDS = 5
+
+
+def clamp_wall_seconds(value: Any) -> float:
+    try:
+        seconds = float(value) if value not in (None, "") else DEFAULT_MAX_WALL_SECONDS
+    except (TypeError, ValueError):
+        seconds = DEFAULT_MAX_WALL_SECONDS
+    return min(max(seconds, 10.0), MAX_WALL_SECONDS)
+
+
+class _TokenCounter(BaseCallbackHandler):
+    run_inline = True
+
+    def __init__(self, budget: "TaskBudget"):
+        self.budget = budget
+
+    def on_llm_end(self, response, **kwargs) -> None:
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        if usage:
+            self.budget.llm_tokens += int(usage.get("total_tokens") or 0)
+            return
+        for generations in response.generations:
+            for generation in generations:
+                metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if metadata:
+                    self.budget.llm_tokens += int(metadata.get("total_tokens", 0))
+
+
+class TaskBudget:
+    """max_wall_seconds和max_llm_tokens为0时不限制"""
+
+    def __init__(self, max_steps: int, max_wall_seconds: float = 0, max_llm_tokens: int = 0,
+                 started_at: Optional[float] = None):
+        self.max_steps = max(1, max_steps)
+        self.max_wall_seconds = max_wall_seconds
+        self.max_llm_tokens = max(0, max_llm_tokens)
+        self.started_at = started_at if started_at is not None else time.monotonic()
+        self.llm_tokens = 0
+        self.steps = 0
+        self.stopped_by: Optional[str] = None
+        self.llm_callback = _TokenCounter(self)
+        self._agent_started_at: Optional[float] = None
+        self._agent_tokens_start = 0
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def remaining_seconds(self) -> Optional[float]:
+        if not self.max_wall_seconds:
+            return None
+        return max(0.0, self.max_wall_seconds - self.elapsed())
+
+    async def on_step_start(self, agent: Any) -> None:
+        if self._agent_started_at is None:
+            self._agent_started_at = time.monotonic()
+            self._agent_tokens_start = self.llm_tokens
+
+    async def on_step_end(self, agent: Any) -> None:
+        """按已完成步骤的平均耗时和token用量预估下一步，预计超出预算时停止Agent"""
+        self.steps += 1
+        if self._agent_started_at is None:
+            return
+        step_s = (time.monotonic() - self._agent_started_at) / self.steps
+        step_tokens = (self.llm_tokens - self._agent_tokens_start) / self.steps
+        if self.max_wall_seconds and self.elapsed() + step_s + FINISH_RESERVE_SECONDS > self.max_wall_seconds:
+            self.stop(agent, "max_wall_seconds")
+        elif self.max_llm_tokens and self.llm_tokens + step_tokens > self.max_llm_tokens:
+            self.stop(agent, "max_llm_tokens")
+
+    def stop(self, agent: Any, reason: str) -> None:
+        if self.stopped_by is None:
+            self.stopped_by = reason
+            print(f"⏹️ 预算即将用尽（{reason}），停止Agent，已用{self.elapsed():.1f}s、{self.llm_tokens} tokens")
+        if agent is not None:
+            agent.stop()
+
+    def snapshot(self) -> dict:
+        return {
+            "max_steps": self.max_steps,
+            "max_wall_seconds": self.max_wall_seconds,
+            "max_llm_tokens": self.max_llm_tokens,
+            "steps": self.steps,
+            "elapsed_s": round(self.elapsed(), 2),
+            "llm_tokens": self.llm_tokens,
+            "stopped_by": self.stopped_by,
+        }
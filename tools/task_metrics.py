@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+task_metrics.py - 任务级与Worker级的性能指标
+TaskMetrics记录单个任务的各阶段耗时和资源占用，随结果以metrics字段返回：
+  - 阶段: Worker启动、浏览器启动/取上下文、总耗时
+  - 每步: LLM调用耗时（流式输出时另有首token耗时）、prompt/completion token数、DOM提取耗时、动作执行耗时
+  - 模型: 按模型汇总的LLM调用次数、耗时和token数（启用模型分级路由时区分快速模型与推理模型）
+  - 页面: 每次导航的页面加载耗时（Navigation Timing）
+  - 资源: 任务期间Worker进程和Chromium的峰值RSS，以及内存治理的决策（见memory_governor.py）
+WorkerMetrics在Worker内累计所有任务，每个任务结束后写入Prometheus文本格式文件，
+可由node_exporter的textfile collector采集
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Worker级指标文件目录，可通过环境变量覆盖
+DEFAULT_METRICS_DIR = Path(os.environ.get("BROWSER_METRICS_DIR", Path(tempfile.gettempdir()) / "browser_use_metrics"))
+RESOURCE_SAMPLE_INTERVAL = 0.5
+
+NAVIGATION_TIMING_JS = """() => {
+    const entry = performance.getEntriesByType('navigation')[0];
+    if (!entry) return null;
+    const end = entry.loadEventEnd > 0 ? entry.loadEventEnd : entry.domContentLoadedEventEnd;
+    return {origin: performance.timeOrigin, url: entry.name, load_ms: end > 0 ? end - entry.startTime : null};
+}"""
+
+
+def process_rss_mb() -> float:
+    if psutil is None:
+        return 0.0
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+
+def worker_started_at() -> float:
+    """Worker进程的创建时间，用于计算解释器启动和依赖导入的耗时"""
+    if psutil is not None:
+        try:
+            return psutil.Process().create_time()
+        except psutil.Error:
+            pass
+    return time.time()
+
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """LangChain回调：按调用记录耗时、首token时间和token用量，归属到调用发生时的Agent步骤"""
+
+    run_inline = True
+
+    def __init__(self, metrics: "TaskMetrics"):
+        self.metrics = metrics
+        self._started: dict[Any, tuple[float, int, str]] = {}
+        self._first_token: dict[Any, float] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs) -> None:
+        self._started[run_id] = (time.monotonic(), self.metrics.current_step, self._model(kwargs))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs) -> None:
+        self._started[run_id] = (time.monotonic(), self.metrics.current_step, self._model(kwargs))
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs) -> None:
+        self._first_token.setdefault(run_id, time.monotonic())
+
+    def on_llm_end(self, response, *, run_id, **kwargs) -> None:
+        started, step, model = self._started.pop(run_id, (None, self.metrics.current_step, ""))
+        if started is None:
+            return
+        first_token = self._first_token.pop(run_id, None)
+        prompt_tokens, completion_tokens = self._usage(response)
+        self.metrics.record_llm_call(
+            step,
+            total_s=time.monotonic() - started,
+            ttft_s=first_token - started if first_token is not None else None,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            model=model,
+        )
+
+    def on_llm_error(self, error, *, run_id, **kwargs) -> None:
+        self._started.pop(run_id, None)
+        self._first_token.pop(run_id, None)
+
+    @staticmethod
+    def _model(kwargs: dict) -> str:
+        params = kwargs.get("invocation_params") or {}
+        return str(params.get("model") or params.get("model_name") or "unknown")
+
+    @staticmethod
+    def _usage(response) -> tuple[int, int]:
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        if usage:
+            return int(usage.get("prompt_tokens", 0)), int(usage.get("completion_tokens", 0))
+        for generations in response.generations:
+            for generation in generations:
+                metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if metadata:
+                    return int(metadata.get("input_tokens", 0)), int(metadata.get("output_tokens", 0))
+        return 0, 0
+
+
+class TaskMetrics:
+    """单个任务的指标记录器；instrument_agent后自动采集每步数据，任务结束时调用finish"""
+
+    def __init__(self, worker_startup_s: Optional[float] = None, worker_task_index: int = 0):
+        self.started_at = time.monotonic()
+        self.stages: dict[str, float] = {}
+        if worker_startup_s is not None:
+            self.stages["worker_startup_s"] = round(worker_startup_s, 3)
+        self.worker_task_index = worker_task_index
+        self.current_step = 0
+        self.steps: dict[int, dict] = {}
+        self.models: dict[str, dict] = {}
+        self.page_loads: dict[float, dict] = {}
+        self.peak_worker_rss_mb = 0.0
+        self.peak_chromium_rss_mb = 0.0
+        self.memory: list[dict] = []
+        self.total_s: Optional[float] = None
+        self.llm_callback = LLMMetricsCallback(self)
+        self._sampler: Optional[asyncio.Task] = None
+        self._restore: list[tuple[Any, str]] = []
+
+    def stage(self, name: str, seconds: float) -> None:
+        self.stages[name] = round(seconds, 3)
+
+    def _step(self, step: int) -> dict:
+        return self.steps.setdefault(step, {
+            "step": step, "llm_calls": 0, "llm_s": 0.0, "ttft_s": None,
+            "prompt_tokens": 0, "completion_tokens": 0, "dom_s": 0.0, "action_s": 0.0,
+        })
+
+    def record_llm_call(self, step: int, total_s: float, ttft_s: Optional[float],
+                        prompt_tokens: int, completion_tokens: int, model: str = "unknown") -> None:
+        totals = self.models.setdefault(model, {"calls": 0, "llm_s": 0.0, "prompt_tokens": 0, "completion_tokens": 0})
+        totals["calls"] += 1
+        totals["llm_s"] += total_s
+        totals["prompt_tokens"] += prompt_tokens
+        totals["completion_tokens"] += completion_tokens
+        entry = self._step(step)
+        entry["llm_calls"] += 1
+        entry["llm_s"] += total_s
+        if ttft_s is not None and entry["ttft_s"] is None:
+            entry["ttft_s"] = round(ttft_s, 3)
+        entry["prompt_tokens"] += prompt_tokens
+        entry["completion_tokens"] += completion_tokens
+
+    def record_memory(self, decision: dict) -> None:
+        self.memory.append(decision)
+
+    def _timed(self, target: Any, name: str, key: str) -> None:
+        """用计时包装替换实例上的异步方法；BrowserSession是pydantic模型，需绕过其__setattr__"""
+        original = getattr(target, name)
+
+        async def wrapper(*args, **kwargs):
+            started = time.monotonic()
+            try:
+                return await original(*args, **kwargs)
+            finally:
+                self._step(self.current_step)[key] += time.monotonic() - started
+
+        object.__setattr__(target, name, wrapper)
+        self._restore.append((target, name))
+
+    def instrument_agent(self, agent: Any) -> None:
+        """统计Agent每步的DOM提取（get_state_summary）和动作执行（multi_act）耗时"""
+        self._timed(agent.browser_session, "get_state_summary", "dom_s")
+        self._timed(agent, "multi_act", "action_s")
+
+    async def on_step_start(self, agent: Any) -> None:
+        self.current_step = agent.state.n_steps
+
+    async def on_step_end(self, agent: Any) -> None:
+        """每步结束后读取当前页面的Navigation Timing，同一次导航只记录一次"""
+        try:
+            page = await agent.browser_session.get_current_page()
+            timing = await page.evaluate(NAVIGATION_TIMING_JS)
+            if timing and timing.get("load_ms") is not None and timing["origin"] not in self.page_loads:
+                self.page_loads[timing["origin"]] = {"url": timing["url"], "load_ms": round(timing["load_ms"], 1)}
+        except Exception:
+            pass
+
+    async def _sample_resources(self, chromium_rss: Any) -> None:
+        while True:
+            try:
+                self.peak_worker_rss_mb = max(self.peak_worker_rss_mb, process_rss_mb())
+                self.peak_chromium_rss_mb = max(self.peak_chromium_rss_mb, chromium_rss())
+            except Exception:
+                pass
+            await asyncio.sleep(RESOURCE_SAMPLE_INTERVAL)
+
+    def start_sampling(self, chromium_rss: Any) -> None:
+        """chromium_rss: 返回Chromium总RSS（MB）的函数，见context_pool.chromium_rss_mb"""
+        self._sampler = asyncio.create_task(self._sample_resources(chromium_rss))
+
+    def finish(self) -> None:
+        if self._sampler is not None:
+            self._sampler.cancel()
+            self._sampler = None
+        for target, name in self._restore:
+            target.__dict__.pop(name, None)
+        self._restore.clear()
+        self.total_s = time.monotonic() - self.started_at
+
+    def model_totals(self) -> dict:
+        """按模型汇总的LLM调用次数、耗时和token用量"""
+        return {model: {**totals, "llm_s": round(totals["llm_s"], 3)} for model, totals in self.models.items()}
+
+    def snapshot(self) -> dict:
+        steps = []
+        for step in sorted(self.steps.values(), key=lambda s: s["step"]):
+            steps.append({**step, "llm_s": round(step["llm_s"], 3), "dom_s": round(step["dom_s"], 3),
+                          "action_s": round(step["action_s"], 3)})
+        total_s = self.total_s if self.total_s is not None else time.monotonic() - self.started_at
+        return {
+            **self.stages,
+            "worker_task_index": self.worker_task_index,
+            "total_s": round(total_s, 3),
+            "llm_s": round(sum(s["llm_s"] for s in steps), 3),
+            "llm_calls": sum(s["llm_calls"] for s in steps),
+            "prompt_tokens": sum(s["prompt_tokens"] for s in steps),
+            "completion_tokens": sum(s["completion_tokens"] for s in steps),
+            "models": self.model_totals(),
+            "dom_s": round(sum(s["dom_s"] for s in steps), 3),
+            "action_s": round(sum(s["action_s"] for s in steps), 3),
+            "page_loads": list(self.page_loads.values()),
+            "peak_worker_rss_mb": round(self.peak_worker_rss_mb, 1),
+            "peak_chromium_rss_mb": round(self.peak_chromium_rss_mb, 1),
+            "memory": self.memory,
+            "steps": steps,
+        }
+
+
+class WorkerMetrics:
+    """Worker进程内所有任务的累计指标，写入<目录>/worker_<pid>.prom"""
+
+    COUNTERS = ("llm_s", "llm_calls", "prompt_tokens", "completion_tokens", "dom_s", "action_s", "total_s")
+
+    def __init__(self, directory: Path = DEFAULT_METRICS_DIR):
+        self.path = Path(directory) / f"worker_{os.getpid()}.prom"
+        self.tasks = 0
+        self.failures = 0
+        self.totals = {name: 0.0 for name in self.COUNTERS}
+        self.peak_worker_rss_mb = 0.0
+        self.peak_chromium_rss_mb = 0.0
+        self.startup_s = 0.0
+
+    def record(self, metrics: dict, success: bool) -> None:
+        self.tasks += 1
+        self.failures += 0 if success else 1
+        for name in self.COUNTERS:
+            self.totals[name] += metrics.get(name, 0) or 0
+        self.peak_worker_rss_mb = max(self.peak_worker_rss_mb, metrics.get("peak_worker_rss_mb", 0))
+        self.peak_chromium_rss_mb = max(self.peak_chromium_rss_mb, metrics.get("peak_chromium_rss_mb", 0))
+        self.startup_s = metrics.get("worker_startup_s", self.startup_s)
+
+    def render(self) -> str:
+        labels = f'{{pid="{os.getpid()}"}}'
+        lines = [
+            f"browser_worker_startup_seconds{labels} {self.startup_s}",
+            f"browser_worker_tasks_total{labels} {self.tasks}",
+            f"browser_worker_task_failures_total{labels} {self.failures}",
+            f"browser_worker_task_seconds_sum{labels} {round(self.totals['total_s'], 3)}",
+            f"browser_worker_llm_calls_total{labels} {int(self.totals['llm_calls'])}",
+            f"browser_worker_llm_seconds_sum{labels} {round(self.totals['llm_s'], 3)}",
+            f"browser_worker_prompt_tokens_total{labels} {int(self.totals['prompt_tokens'])}",
+            f"browser_worker_completion_tokens_total{labels} {int(self.totals['completion_tokens'])}",
+            f"browser_worker_dom_seconds_sum{labels} {round(self.totals['dom_s'], 3)}",
+            f"browser_worker_action_seconds_sum{labels} {round(self.totals['action_s'], 3)}",
+            f"browser_worker_peak_rss_megabytes{labels} {round(self.peak_worker_rss_mb, 1)}",
+            f"browser_chromium_peak_rss_megabytes{labels} {round(self.peak_chromium_rss_mb, 1)}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def write(self) -> None:
+        """原子写入，采集方不会读到半个文件"""
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            tmp_path.write_text(self.render(), encoding="utf-8")
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"⚠️ 写入Worker指标文件失败: {e}")
+
+    def remove(self) -> None:
+        """Worker正常退出时删除指标文件，避免采集到已退出Worker的数据"""
+        try:
+            self.path.unlink()
+        except OSError:
+            pass
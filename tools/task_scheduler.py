@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+task_scheduler.py - Worker槽位的优先级与租户公平调度
+多个Dify应用共享一个插件实例时，一个工作流并发发起的大量调用会占满所有Worker，其他应用的任务只能一直排队。
+这里替代进程池原来的先到先得槽位队列：
+  - 优先级: interactive（对话中的单次调用）与batch（批量模式、异步任务），按权重分配Worker
+  - 租户公平: 按(优先级, 租户)分流做加权公平排队（WFQ），每个流按权重轮流获得空闲Worker，
+    同一流内按提交顺序执行；租户权重可通过BROWSER_TENANT_WEIGHTS配置
+  - 有界队列: 排队总数或单个租户的排队数达到上限时立即拒绝，并根据平均执行时间给出建议的重试等待时间
+  - 指标: 当前排队深度（按优先级、租户）、排队等待时间分布（直方图）、拒绝次数
+所有方法都在进程池的监督循环中调用；snapshot()可从其他线程读取
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import os
+from typing import Any, Optional
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BATCH = "batch"
+# 各优先级的权重：同时排队时interactive获得的Worker是batch的8倍，batch不会被完全饿死
+PRIORITY_WEIGHTS = {PRIORITY_INTERACTIVE: 8.0, PRIORITY_BATCH: 1.0}
+DEFAULT_TENANT = "default"
+
+# 排队任务总数上限，超过时新任务立即被拒绝
+DEFAULT_QUEUE_MAX = int(os.environ.get("BROWSER_QUEUE_MAX", "32"))
+# 单个租户的排队任务数上限
+DEFAULT_QUEUE_MAX_PER_TENANT = int(os.environ.get("BROWSER_QUEUE_MAX_PER_TENANT", "16"))
+# 租户权重，格式: "app_id_1=2,app_id_2=0.5"，未配置的租户权重为1
+DEFAULT_TENANT_WEIGHTS = os.environ.get("BROWSER_TENANT_WEIGHTS", "")
+
+# 尚无执行记录时估算单个任务的执行时间（秒）
+DEFAULT_SERVICE_SECONDS = 30.0
+# 执行时间滑动平均的平滑系数
+SERVICE_EWMA_ALPHA = 0.2
+RETRY_AFTER_MIN = 1
+RETRY_AFTER_MAX = 300
+# 排队等待时间直方图的桶上界（毫秒）
+WAIT_BUCKETS_MS = (100, 500, 1000, 5000, 10000, 30000, 60000, 120000)
+
+
+class SchedulerBusy(Exception):
+    """排队已满，retry_after为建议的重试等待秒数"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_tenant_weights(raw: str) -> dict[str, float]:
+    weights = {}
+    for item in raw.split(","):
+        tenant, _, value = item.partition("=")
+        try:
+            weight = float(value)
+        except ValueError:
+            continue
+        if tenant.strip() and weight > 0:
+            weights[tenant.strip()] = weight
+    return weights
+
+
+def normalize_priority(priority: Optional[str]) -> str:
+    return priority if priority in PRIORITY_WEIGHTS else PRIORITY_INTERACTIVE
+
+
+class TaskScheduler:
+    """
+    加权公平的槽位队列，接口与原asyncio.Queue槽位队列一致（put_nowait/get），get额外指定租户和优先级
+    - capacity: 槽位数（进程池大小），用于估算重试等待时间
+    - max_queue / max_per_tenant: 排队上限，0表示不限制
+    每个排队的任务按开始标签S=max(V, 该流上次的结束标签)、结束标签F=S+1/权重排序，
+    槽位交给F最小的任务，虚拟时间V推进到该任务的S
+    """
+
+    def __init__(self, capacity: int,
+                 max_queue: int = DEFAULT_QUEUE_MAX,
+                 max_per_tenant: int = DEFAULT_QUEUE_MAX_PER_TENANT,
+                 tenant_weights: Optional[dict[str, float]] = None):
+        self.capacity = max(1, capacity)
+        self.max_queue = max(0, max_queue)
+        self.max_per_tenant = max(0, max_per_tenant)
+        self.tenant_weights = tenant_weights if tenant_weights is not None else parse_tenant_weights(
+            DEFAULT_TENANT_WEIGHTS)
+
+        self._free: list[Any] = []
+        # (结束标签, 序号, 开始标签, 流, future)
+        self._waiters: list[tuple[float, int, float, tuple[str, str], asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._virtual_time = 0.0
+        self._last_finish: dict[tuple[str, str], float] = {}
+        self._depth: dict[tuple[str, str], int] = {}
+        self._service_s = DEFAULT_SERVICE_SECONDS
+
+        self.stats = {
+            "dispatched": 0,
+            "rejected_busy": 0,
+            "wait_ms_total": 0.0,
+        }
+        self.wait_histogram = {priority: [0] * (len(WAIT_BUCKETS_MS) + 1) for priority in PRIORITY_WEIGHTS}
+        self.wait_ms_sum = {priority: 0.0 for priority in PRIORITY_WEIGHTS}
+        self.rejected = {priority: 0 for priority in PRIORITY_WEIGHTS}
+
+    # ---------------------------------------------------------------- 槽位
+    def put_nowait(self, item: Any) -> None:
+        """归还槽位：交给加权结束标签最小的排队任务，没有排队任务时放入空闲列表"""
+        while self._waiters:
+            _, _, start, flow, future = heapq.heappop(self._waiters)
+            self._leave(flow)
+            if future.done():
+                continue
+            self._virtual_time = max(self._virtual_time, start)
+            future.set_result(item)
+            return
+        self._free.append(item)
+
+    async def get(self, tenant: str = DEFAULT_TENANT, priority: str = PRIORITY_INTERACTIVE) -> Any:
+        """取一个槽位；有空闲槽位且无人排队时立即返回，排队已满时抛出SchedulerBusy"""
+        priority = normalize_priority(priority)
+        tenant = tenant or DEFAULT_TENANT
+        if self._free and not self._queued():
+            return self._free.pop()
+
+        busy = self.check(tenant)
+        if busy is not None:
+            self.stats["rejected_busy"] += 1
+            self.rejected[priority] += 1
+            raise busy
+
+        flow = (priority, tenant)
+        weight = PRIORITY_WEIGHTS[priority] * self.tenant_weights.get(tenant, 1.0)
+        start = max(self._virtual_time, self._last_finish.get(flow, 0.0))
+        finish = start + 1.0 / weight
+        self._last_finish[flow] = finish
+        future = asyncio.get_running_loop().create_future()
+        entry = (finish, next(self._sequence), start, flow, future)
+        heapq.heappush(self._waiters, entry)
+        self._depth[flow] = self._depth.get(flow, 0) + 1
+        try:
+            return await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 已分到槽位后才被取消（如等待超时恰好同时发生）时归还槽位，避免槽位丢失
+                self.put_nowait(future.result())
+            elif entry in self._waiters:
+                # 等待超时或调用方放弃，立即移出队列，不再占用排队名额
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self._leave(flow)
+            raise
+
+    def check(self, tenant: str = DEFAULT_TENANT) -> Optional[SchedulerBusy]:
+        """新任务是否会因排队已满被拒绝，会被拒绝时返回对应的SchedulerBusy（不计入拒绝次数）"""
+        if self._free and not self._queued():
+            return None
+        tenant = tenant or DEFAULT_TENANT
+        if self.max_queue and self._queued() >= self.max_queue:
+            return SchedulerBusy(f"进程池繁忙（排队{self._queued()}个任务）", self.retry_after())
+        tenant_depth = self._tenant_depth(tenant)
+        if self.max_per_tenant and tenant_depth >= self.max_per_tenant:
+            return SchedulerBusy(f"进程池繁忙（当前应用已有{tenant_depth}个任务排队）", self.retry_after(tenant_depth))
+        return None
+
+    def _leave(self, flow: tuple[str, str]) -> None:
+        self._depth[flow] -= 1
+        if not self._depth[flow]:
+            del self._depth[flow]
+            # 流已空且结束标签落后于虚拟时间时可以丢弃，重新排队的任务从当前虚拟时间开始
+            if self._last_finish.get(flow, 0.0) <= self._virtual_time:
+                self._last_finish.pop(flow, None)
+
+    def _queued(self) -> int:
+        return sum(self._depth.values())
+
+    def _tenant_depth(self, tenant: str) -> int:
+        return sum(depth for (_, flow_tenant), depth in self._depth.items() if flow_tenant == tenant)
+
+    def qsize(self) -> int:
+        return len(self._free)
+
+    # ---------------------------------------------------------------- 背压与指标
+    def retry_after(self, ahead: Optional[int] = None) -> int:
+        """按平均执行时间估算排在前面的任务全部开始执行所需的秒数"""
+        ahead = self._queued() if ahead is None else ahead
+        seconds = self._service_s * (ahead + 1) / self.capacity
+        return int(min(RETRY_AFTER_MAX, max(RETRY_AFTER_MIN, math.ceil(seconds))))
+
+    def record_wait(self, priority: str, wait_ms: float) -> None:
+        priority = normalize_priority(priority)
+        self.stats["dispatched"] += 1
+        self.stats["wait_ms_total"] += wait_ms
+        self.wait_ms_sum[priority] += wait_ms
+        index = next((i for i, bound in enumerate(WAIT_BUCKETS_MS) if wait_ms <= bound), len(WAIT_BUCKETS_MS))
+        self.wait_histogram[priority][index] += 1
+
+    def record_service(self, seconds: float) -> None:
+        """记录一个任务占用Worker的时间，用于估算重试等待时间"""
+        self._service_s += SERVICE_EWMA_ALPHA * (seconds - self._service_s)
+
+    def snapshot(self) -> dict:
+        depth = dict(self._depth)
+        by_priority = {priority: 0 for priority in PRIORITY_WEIGHTS}
+        by_tenant: dict[str, int] = {}
+        for (priority, tenant), count in depth.items():
+            by_priority[priority] += count
+            by_tenant[tenant] = by_tenant.get(tenant, 0) + count
+        histogram = {}
+        for priority, counts in self.wait_histogram.items():
+            cumulative = list(itertools.accumulate(counts))
+            histogram[priority] = {
+                "buckets": {**{str(bound): cumulative[i] for i, bound in enumerate(WAIT_BUCKETS_MS)},
+                            "+Inf": cumulative[-1]},
+                "count": cumulative[-1],
+                "sum_ms": round(self.wait_ms_sum[priority], 1),
+            }
+        return {
+            **self.stats,
+            "queue_depth": sum(by_priority.values()),
+            "queue_depth_by_priority": by_priority,
+            "queue_depth_by_tenant": by_tenant,
+            "queue_max": self.max_queue,
+            "queue_max_per_tenant": self.max_per_tenant,
+            "rejected_by_priority": dict(self.rejected),
+            "wait_ms_histogram": histogram,
+            "service_s_avg": round(self._service_s, 1),
+        }
+
+    def render_prometheus(self, labels: str = "") -> str:
+        """排队深度、等待时间分布和拒绝次数的Prometheus文本格式，labels为附加的标签（如'pid="123"'）"""
+        snapshot = self.snapshot()
+        prefix = f"{labels}," if labels else ""
+        lines = [f"browser_pool_queue_depth{{{labels}}} {snapshot['queue_depth']}"]
+        for priority, count in snapshot["queue_depth_by_priority"].items():
+            lines.append(f'browser_pool_queue_depth_by_priority{{{prefix}priority="{priority}"}} {count}')
+        for priority, count in snapshot["rejected_by_priority"].items():
+            lines.append(f'browser_pool_rejected_busy_total{{{prefix}priority="{priority}"}} {count}')
+        for priority, histogram in snapshot["wait_ms_histogram"].items():
+            for bound, count in histogram["buckets"].items():
+                le = bound if bound == "+Inf" else f"{int(bound) / 1000:g}"
+                lines.append(f'browser_pool_queue_wait_seconds_bucket{{{prefix}priority="{priority}",le="{le}"}} {count}')
+            lines.append(f'browser_pool_queue_wait_seconds_sum{{{prefix}priority="{priority}"}} '
+                         f'{round(histogram["sum_ms"] / 1000, 3)}')
+            lines.append(f'browser_pool_queue_wait_seconds_count{{{prefix}priority="{priority}"}} {histogram["count"]}')
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,690 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+worker_pool.py - 常驻Browser Worker进程池
+每个Worker进程只导入一次browser_use/langchain_openai并预先启动Chromium，
+之后通过stdin/stdout帧协议（见ipc_protocol.py）持续接收任务，避免每次调用都冷启动解释器和浏览器
+
+所有Worker由一个后台asyncio事件循环（监督线程）统一管理：子进程读写、截止时间、心跳检查都在该循环中完成，
+插件调用线程只在自己的消息队列上等待，不再为每个Worker占用一个阻塞线程
+终止Worker时连同其整个进程树一起终止，并定期回收孤儿Chromium进程和残留临时文件（见process_reaper.py）
+启用fork-server模式时Worker由已完成导入的模板进程fork得到，跳过解释器启动和依赖导入（见fork_server.py）
+主机内存接近上限时新任务排队等待，超时仍未回落则拒绝；每个Worker按主机上限均分内存上限（见memory_governor.py）
+空闲Worker按优先级和租户加权公平分配，排队已满时立即拒绝并给出重试等待时间（见task_scheduler.py）
+"""
+
+import asyncio
+import atexit
+import concurrent.futures
+import os
+import queue
+import sys
+import tempfile
+import threading
+import time
+from collections.abc import Callable, Generator
+from pathlib import Path
+from typing import Any, Optional, Union
+
+from tools.fork_server import FORK_SUPPORTED, ForkedProcess, ForkServer, ForkServerError
+from tools.ipc_protocol import HEARTBEAT_TIMEOUT, ProtocolError, encode_frame, read_frame_async
+from tools.memory_governor import ADMIT_POLL_INTERVAL, ADMIT_WAIT_SECONDS, host_under_pressure, worker_memory_cap_mb
+from tools.process_reaper import (POOL_ID_ENV, descendants, kill_process_group, kill_process_tree, kill_processes,
+                                  new_pool_id, reap_orphans)
+from tools.task_scheduler import (DEFAULT_TENANT, PRIORITY_BATCH, PRIORITY_INTERACTIVE, SchedulerBusy,
+                                  TaskScheduler)
+
+WORKER_SCRIPT = Path(__file__).parent / "browser_worker_file.py"
+
+# 进程池配置，可通过环境变量覆盖
+DEFAULT_POOL_SIZE = int(os.environ.get("BROWSER_POOL_SIZE", "2"))
+DEFAULT_MAX_TASKS_PER_WORKER = int(os.environ.get("BROWSER_POOL_MAX_TASKS", "20"))
+DEFAULT_WORKER_START_TIMEOUT = float(os.environ.get("BROWSER_WORKER_START_TIMEOUT", "60"))
+# 为1时通过模板进程fork新Worker（仅支持os.fork的平台），模板不可用时退回直接启动
+DEFAULT_FORK_SERVER = os.environ.get("BROWSER_FORK_SERVER", "0") == "1"
+# 超时或调用方放弃后，等待Worker响应取消请求的时间，期间返回结果则Worker可继续复用
+CANCEL_GRACE_SECONDS = 5.0
+# 监督循环检查心跳的间隔
+WATCHDOG_INTERVAL = 1.0
+# 回收孤儿Chromium进程和残留临时文件的间隔（秒），0表示不回收
+DEFAULT_REAP_INTERVAL = float(os.environ.get("BROWSER_REAP_INTERVAL", "60"))
+# 进程池调度指标文件目录（与task_metrics.py的Worker指标文件相同），可由node_exporter的textfile collector采集
+DEFAULT_METRICS_DIR = Path(os.environ.get("BROWSER_METRICS_DIR", Path(tempfile.gettempdir()) / "browser_use_metrics"))
+
+
+class WorkerError(Exception):
+    """Worker进程启动或通信失败"""
+
+
+def worker_env() -> dict:
+    """Worker（及模板进程）的环境变量"""
+    env = os.environ.copy()
+    env["ANONYMIZED_TELEMETRY"] = "false"
+    env["OPENAI_API_KEY"] = "fake_key"
+    env["PYTHONIOENCODING"] = "utf-8"
+    env["PYTHONUTF8"] = "1"
+    return env
+
+
+class WorkerProcess:
+    """
+    单个常驻Worker进程，通过stdin/stdout管道收发长度前缀的JSON帧；所有方法都在监督循环中调用
+    由模板进程fork得到时process为ForkedProcess，帧通过套接字收发
+    """
+
+    def __init__(self, worker_script: Path = WORKER_SCRIPT, memory_cap_mb: float = 0, pool_id: str = ""):
+        self.worker_script = worker_script
+        self.memory_cap_mb = memory_cap_mb
+        self.pool_id = pool_id
+        self.process: Optional[Union[asyncio.subprocess.Process, ForkedProcess]] = None
+        self.tasks_done = 0
+        self.last_seen = time.monotonic()
+        self.busy = False
+        self._ready: Optional[asyncio.Future] = None
+        self._subscribers: dict[str, asyncio.Queue] = {}
+        self._reader: Optional[asyncio.Task] = None
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self.process.pid if self.process else None
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    async def start(self, timeout: float = DEFAULT_WORKER_START_TIMEOUT,
+                    fork_server: Optional[ForkServer] = None) -> None:
+        """启动Worker并等待其就绪；传入fork_server时由模板进程fork，失败抛出ForkServerError"""
+        extra_env = {"BROWSER_WORKER_MEMORY_MB": str(self.memory_cap_mb)} if self.memory_cap_mb else {}
+        if self.pool_id:
+            # Chromium继承该变量，孤儿进程回收只认本进程池启动的浏览器
+            extra_env[POOL_ID_ENV] = self.pool_id
+
+        loop = asyncio.get_running_loop()
+        self._ready = loop.create_future()
+        if fork_server is not None:
+            self.process = await fork_server.spawn(extra_env)
+        else:
+            # stderr继承主进程，Worker的日志输出仍然可见；
+            # Worker作为新会话的组长启动，超时或取消时按进程组连同Playwright驱动一起终止
+            self.process = await asyncio.create_subprocess_exec(
+                sys.executable, str(self.worker_script), "--serve",
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                env={**worker_env(), **extra_env},
+                cwd=str(self.worker_script.parent),
+                start_new_session=True,
+            )
+        self._reader = loop.create_task(self._read_loop())
+
+        try:
+            message = await asyncio.wait_for(asyncio.shield(self._ready), timeout)
+        except asyncio.TimeoutError:
+            self.kill()
+            raise WorkerError(f"Worker启动超时（{int(timeout)}秒）")
+        if message is None:
+            self.kill()
+            raise WorkerError("Worker未能就绪: 进程已退出")
+        if not message.get("ok", False):
+            self.kill()
+            raise WorkerError(f"Worker初始化失败: {message.get('error', '')}")
+
+    async def _read_loop(self) -> None:
+        """逐帧读取Worker消息：ready唤醒start()，progress/result按task_id分发，心跳只刷新last_seen"""
+        try:
+            while True:
+                message = await read_frame_async(self.process.stdout)
+                if message is None:
+                    break
+                self.last_seen = time.monotonic()
+                message_type = message.get("type")
+                if message_type == "ready":
+                    if not self._ready.done():
+                        self._ready.set_result(message)
+                elif message_type in ("progress", "result"):
+                    subscriber = self._subscribers.get(message.get("task_id"))
+                    if subscriber is not None:
+                        subscriber.put_nowait(message)
+        except ProtocolError as e:
+            print(f"❌ Worker通道数据异常，PID: {self.pid}，{e}")
+        finally:
+            # None表示通道已关闭
+            if not self._ready.done():
+                self._ready.set_result(None)
+            for subscriber in self._subscribers.values():
+                subscriber.put_nowait(None)
+
+    async def send(self, message: dict) -> None:
+        try:
+            self.process.stdin.write(encode_frame(message))
+            await self.process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError, OSError) as e:
+            raise WorkerError(f"发送消息失败: {e}")
+
+    def subscribe(self, task_id: str) -> None:
+        self._subscribers[task_id] = asyncio.Queue()
+
+    def unsubscribe(self, task_id: str) -> None:
+        self._subscribers.pop(task_id, None)
+
+    async def run_task(self, task: dict, deadline: float, on_message: Callable[[dict], None]) -> dict:
+        """
+        发送任务，progress消息交给on_message，返回result消息中的结果
+        超过deadline抛出asyncio.TimeoutError；Worker退出或失联抛出WorkerError
+        """
+        task_id = task.get("task_id")
+        self.subscribe(task_id)
+        try:
+            await self.send({"type": "task", **task})
+            self.last_seen = time.monotonic()
+            return await self.wait_result(task_id, deadline, on_message)
+        finally:
+            self.unsubscribe(task_id)
+
+    async def wait_result(self, task_id: str, deadline: float, on_message: Callable[[dict], None]) -> dict:
+        subscriber = self._subscribers[task_id]
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise asyncio.TimeoutError
+            message = await asyncio.wait_for(subscriber.get(), remaining)
+            if message is None:
+                raise WorkerError(f"Worker进程意外退出，返回码: {self.process.returncode}")
+            if message.get("type") == "result":
+                self.tasks_done += 1
+                return message.get("result", {})
+            on_message(message)
+
+    async def cancel(self, task_id: str, grace: float = CANCEL_GRACE_SECONDS) -> bool:
+        """请求Worker取消任务并等待其返回结果，返回Worker是否仍可复用；未及时响应则强制终止"""
+        self.subscribe(task_id)
+        try:
+            await self.send({"type": "cancel", "task_id": task_id})
+            await self.wait_result(task_id, time.monotonic() + grace, lambda _: None)
+            return True
+        except (asyncio.TimeoutError, WorkerError):
+            pass
+        finally:
+            self.unsubscribe(task_id)
+        print(f"⚠️ Worker未响应取消请求，强制终止，PID: {self.pid}")
+        self.kill()
+        return False
+
+    async def stop(self, timeout: float = 10) -> None:
+        """请求Worker优雅退出，超时后强制终止"""
+        if not self.is_alive():
+            return
+        try:
+            await self.send({"type": "shutdown"})
+            await asyncio.wait_for(self.process.wait(), timeout)
+        except Exception:
+            pass
+        self.kill()
+
+    def kill(self) -> None:
+        """终止Worker及其整个进程树（Playwright驱动、Chromium）；Worker已退出时清理其进程组中的残留进程"""
+        if self.process is None:
+            return
+        if isinstance(self.process, ForkedProcess):
+            # fork出的Worker由模板进程回收，PID随时可能被复用：先取子孙进程，确认Worker仍未退出后它们才属于该Worker，
+            # Worker本身只通过pidfd终止
+            children = descendants(self.process.pid) if self.process.returncode is None else []
+            if self.process.has_exited():
+                children = []
+            self.process.kill()
+            kill_processes(children)
+            kill_process_group(self.process.pid)
+        elif self.process.returncode is None:
+            kill_process_tree(self.process.pid)
+        else:
+            kill_process_group(self.process.pid)
+
+
+class WorkerPool:
+    """
+    固定大小的Worker进程池
+    - size: 同时存在的Worker数量
+    - max_tasks_per_worker: 单个Worker执行多少个任务后回收重建
+    - 记录任务等待空闲Worker的排队时间
+    - 空闲Worker由TaskScheduler按优先级和租户加权公平分配，排队已满时任务以busy结果立即返回
+    所有进程管理都在后台监督线程的事件循环中进行，对外提供线程安全的stream()/submit()
+    """
+
+    def __init__(self,
+                 size: int = DEFAULT_POOL_SIZE,
+                 max_tasks_per_worker: int = DEFAULT_MAX_TASKS_PER_WORKER,
+                 start_timeout: float = DEFAULT_WORKER_START_TIMEOUT,
+                 fork_server: bool = DEFAULT_FORK_SERVER):
+        self.size = max(1, size)
+        self.max_tasks_per_worker = max(1, max_tasks_per_worker)
+        self.start_timeout = start_timeout
+        self.worker_memory_cap_mb = worker_memory_cap_mb(self.size)
+        self.use_fork_server = fork_server and FORK_SUPPORTED
+        self.pool_id = new_pool_id()
+        self._fork_server: Optional[ForkServer] = None
+        self._fork_server_lock = asyncio.Lock()
+
+        # 调度器中的每个元素代表一个槽位：已就绪的Worker或None（需要新建）
+        self._slots = TaskScheduler(self.size)
+        for _ in range(self.size):
+            self._slots.put_nowait(None)
+        self._workers: set[WorkerProcess] = set()
+        # stream()中可取消的任务，task_id -> 监督循环中执行该任务的future
+        self._cancellable: dict[str, concurrent.futures.Future] = {}
+        self._queued = 0
+        self._in_flight = 0
+
+        self._closed = False
+        self._metrics_path = DEFAULT_METRICS_DIR / f"pool_{os.getpid()}.prom"
+        self._metrics_dirty = False
+        self.stats = {
+            "tasks": 0,
+            "workers_started": 0,
+            "workers_forked": 0,
+            "workers_recycled": 0,
+            "workers_lost": 0,
+            "tasks_cancelled": 0,
+            "queue_wait_ms_total": 0.0,
+            "queue_wait_ms_max": 0.0,
+            "tasks_rejected_memory": 0,
+            "tasks_rejected_busy": 0,
+            "memory_wait_ms_total": 0.0,
+            "orphans_reaped": 0,
+            "stale_files_removed": 0,
+        }
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name="browser-worker-supervisor", daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._watchdog(), self._loop)
+        if DEFAULT_REAP_INTERVAL > 0:
+            asyncio.run_coroutine_threadsafe(self._reaper(DEFAULT_REAP_INTERVAL), self._loop)
+
+    def _run_loop(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def prewarm(self) -> None:
+        """后台预启动所有Worker，让首个任务也尽量拿到热进程"""
+        for _ in range(self.size):
+            asyncio.run_coroutine_threadsafe(self._prewarm_one(), self._loop)
+
+    async def _prewarm_one(self) -> None:
+        worker = await self._slots.get()
+        if worker is not None and worker.is_alive():
+            self._slots.put_nowait(worker)
+            return
+        await self._refill_slot()
+
+    async def _refill_slot(self) -> None:
+        """启动新Worker填回槽位，失败时放回None由调用方重试"""
+        try:
+            worker = await self._spawn()
+        except WorkerError as e:
+            print(f"⚠️ 预启动Worker失败: {e}")
+            worker = None
+        self._slots.put_nowait(worker)
+
+    async def _get_fork_server(self) -> Optional[ForkServer]:
+        """返回运行中的模板进程，未启动或已退出时（重新）启动；启动失败时返回None，本次改为直接启动Worker"""
+        async with self._fork_server_lock:
+            if self._fork_server is not None and self._fork_server.is_alive():
+                return self._fork_server
+            fork_server = ForkServer(WORKER_SCRIPT)
+            try:
+                await fork_server.start(worker_env(), self.start_timeout)
+            except (ForkServerError, OSError) as e:
+                print(f"⚠️ Worker模板进程启动失败，改为直接启动Worker: {e}")
+                return None
+            print(f"🧬 Worker模板进程已启动，导入耗时{fork_server.startup_s:.2f}s，PID: {fork_server.process.pid}")
+            self._fork_server = fork_server
+            return fork_server
+
+    async def _spawn(self) -> WorkerProcess:
+        worker = WorkerProcess(memory_cap_mb=self.worker_memory_cap_mb, pool_id=self.pool_id)
+        fork_server = await self._get_fork_server() if self.use_fork_server else None
+        if fork_server is not None:
+            try:
+                await worker.start(timeout=self.start_timeout, fork_server=fork_server)
+                self.stats["workers_forked"] += 1
+            except ForkServerError as e:
+                print(f"⚠️ 模板进程fork失败，改为直接启动Worker: {e}")
+                fork_server = None
+        if fork_server is None:
+            worker = WorkerProcess(memory_cap_mb=self.worker_memory_cap_mb, pool_id=self.pool_id)
+            await worker.start(timeout=self.start_timeout)
+        self._workers.add(worker)
+        self.stats["workers_started"] += 1
+        print(f"✅ Worker已就绪，PID: {worker.pid}")
+        return worker
+
+    def _release_slot(self, worker: Optional[WorkerProcess]) -> None:
+        if worker is not None:
+            worker.busy = False
+            if not worker.is_alive():
+                self._workers.discard(worker)
+                worker = None
+        if worker is None and not self._closed:
+            # 被回收或终止的Worker在后台重建，排队的任务直接等到热进程
+            self._loop.create_task(self._refill_slot())
+            return
+        self._slots.put_nowait(worker)
+
+    async def _watchdog(self) -> None:
+        """定期检查所有Worker的心跳，失联的Worker被终止，其上的任务随即以WorkerError结束；顺便刷新调度指标文件"""
+        while not self._closed:
+            await asyncio.sleep(WATCHDOG_INTERVAL)
+            if self._metrics_dirty:
+                self._write_metrics()
+            now = time.monotonic()
+            for worker in list(self._workers):
+                if worker.busy and worker.is_alive() and now - worker.last_seen > HEARTBEAT_TIMEOUT:
+                    print(f"💀 Worker心跳超时（{int(HEARTBEAT_TIMEOUT)}秒无响应），终止，PID: {worker.pid}")
+                    self.stats["workers_lost"] += 1
+                    worker.kill()
+
+    async def _reaper(self, interval: float) -> None:
+        """定期回收已脱离Worker的Chromium进程和残留的browser_task_*临时文件；遍历进程表较慢，放到线程中执行"""
+        while not self._closed:
+            await asyncio.sleep(interval)
+            try:
+                reaped = await self._loop.run_in_executor(None, reap_orphans, self.pool_id)
+            except Exception as e:
+                print(f"⚠️ 回收孤儿进程失败: {e}")
+                continue
+            self.stats["orphans_reaped"] += reaped["processes"]
+            self.stats["stale_files_removed"] += reaped["files"]
+            if reaped["processes"] or reaped["files"]:
+                print(f"🧹 已回收{reaped['processes']}个孤儿Chromium进程，删除{reaped['files']}个残留临时文件")
+
+    async def _admit(self, deadline: float) -> Optional[dict]:
+        """主机内存达到高水位时等待回落，最多等待ADMIT_WAIT_SECONDS（不超过任务截止时间）；仍未回落时返回主机内存占用"""
+        started = time.monotonic()
+        wait_until = min(deadline, started + ADMIT_WAIT_SECONDS)
+        pressure, memory = await self._loop.run_in_executor(None, host_under_pressure)
+        if not pressure:
+            return None
+        print(f"🧠 主机内存{memory['used_mb']:.0f}/{memory['limit_mb']:.0f}MB接近上限，新任务等待内存回落")
+        while time.monotonic() < wait_until:
+            await asyncio.sleep(ADMIT_POLL_INTERVAL)
+            pressure, memory = await self._loop.run_in_executor(None, host_under_pressure)
+            if not pressure:
+                break
+        self.stats["memory_wait_ms_total"] += (time.monotonic() - started) * 1000
+        return memory if pressure else None
+
+    def _record_wait(self, wait_ms: float) -> None:
+        self.stats["tasks"] += 1
+        self.stats["queue_wait_ms_total"] += wait_ms
+        self.stats["queue_wait_ms_max"] = max(self.stats["queue_wait_ms_max"], wait_ms)
+
+    async def _execute(self, task: dict, timeout: float, emit: Callable[[dict], None],
+                       tenant: str = DEFAULT_TENANT, priority: str = PRIORITY_INTERACTIVE) -> None:
+        """在监督循环中执行一个任务的完整生命周期：排队、取Worker、截止时间、取消与回收"""
+        query = task.get("query", "")
+        task_id = task.get("task_id")
+        deadline = time.monotonic() + timeout
+
+        wait_start = time.monotonic()
+        self._queued += 1
+        self._metrics_dirty = True
+        try:
+            # 先等主机内存回落再排队取Worker：等待期间不占用槽位，空闲Worker仍可交给其他任务
+            memory = await self._admit(deadline)
+            if memory is not None:
+                self.stats["tasks_rejected_memory"] += 1
+                emit({"type": "result", "task_id": task_id, "result": {
+                    "success": False,
+                    "task": query,
+                    "result": "",
+                    "error": f"主机内存不足（{memory['used_mb']:.0f}/{memory['limit_mb']:.0f}MB），请稍后重试",
+                    "pool": {"queue_wait_ms": round((time.monotonic() - wait_start) * 1000, 1)}
+                }})
+                return
+            worker = await asyncio.wait_for(self._slots.get(tenant, priority), max(0.0, deadline - time.monotonic()))
+        except SchedulerBusy as e:
+            self.stats["tasks_rejected_busy"] += 1
+            self._metrics_dirty = True
+            print(f"🚦 {e}，拒绝新任务（{priority}/{tenant}），建议{e.retry_after}秒后重试")
+            emit({"type": "result", "task_id": task_id, "result": {
+                "success": False,
+                "task": query,
+                "result": "",
+                "error": f"{e}，请{e.retry_after}秒后重试",
+                "retry_after": e.retry_after,
+                "pool": {"queue_wait_ms": round((time.monotonic() - wait_start) * 1000, 1)}
+            }})
+            return
+        except asyncio.TimeoutError:
+            emit({"type": "result", "task_id": task_id, "result": {
+                "success": False,
+                "task": query,
+                "result": "",
+                "error": "等待空闲Worker超时",
+                "pool": {"queue_wait_ms": round((time.monotonic() - wait_start) * 1000, 1)}
+            }})
+            return
+        finally:
+            self._queued -= 1
+
+        queue_wait_ms = (time.monotonic() - wait_start) * 1000
+        self._record_wait(queue_wait_ms)
+        self._slots.record_wait(priority, queue_wait_ms)
+        self._metrics_dirty = True
+        dispatched_at = time.monotonic()
+
+        self._in_flight += 1
+        result = None
+        try:
+            if worker is None or not worker.is_alive():
+                worker = await self._spawn()
+            worker.busy = True
+
+            try:
+                result = await worker.run_task(task, deadline, emit)
+            except asyncio.TimeoutError:
+                print(f"⏰ Worker执行超时，发送取消请求，PID: {worker.pid}")
+                self.stats["tasks_cancelled"] += 1
+                await worker.cancel(task_id)
+                result = {
+                    "success": False,
+                    "task": query,
+                    "result": "",
+                    "error": f"执行超时（{int(timeout)}秒），任务已被取消"
+                }
+
+            if worker.is_alive() and worker.tasks_done >= self.max_tasks_per_worker:
+                print(f"♻️ Worker已执行{worker.tasks_done}个任务，回收重建，PID: {worker.pid}")
+                await worker.stop()
+                self.stats["workers_recycled"] += 1
+
+        except WorkerError as e:
+            if worker is not None:
+                worker.kill()
+            result = {
+                "success": False,
+                "task": query,
+                "result": "",
+                "error": str(e)
+            }
+
+        except asyncio.CancelledError:
+            # 调用方中途放弃，取消Worker上仍在执行的任务
+            if worker is not None and worker.is_alive():
+                print(f"🛑 任务被调用方中止，发送取消请求，PID: {worker.pid}")
+                self.stats["tasks_cancelled"] += 1
+                await worker.cancel(task_id)
+            raise
+
+        finally:
+            self._in_flight -= 1
+            self._slots.record_service(time.monotonic() - dispatched_at)
+            self._metrics_dirty = True
+            self._release_slot(worker)
+
+        result["pool"] = {"queue_wait_ms": round(queue_wait_ms, 1)}
+        emit({"type": "result", "task_id": task_id, "result": result})
+
+    def submit(self, task: dict, timeout: float, tenant: str = DEFAULT_TENANT,
+               priority: str = PRIORITY_INTERACTIVE) -> dict:
+        """在空闲Worker上执行任务，返回结果字典（附带pool指标）"""
+        result = {}
+        for message in self.stream(task, timeout, tenant, priority):
+            if message.get("type") == "result":
+                result = message["result"]
+        return result
+
+    def stream(self, task: dict, timeout: float, tenant: str = DEFAULT_TENANT,
+               priority: str = PRIORITY_INTERACTIVE,
+               cancelled: Optional[Callable[[], bool]] = None) -> Generator[dict, None, None]:
+        """
+        在空闲Worker上执行任务，实时产出progress消息，最后产出result消息（附带pool指标）
+        tenant/priority决定排队时的调度顺序（见task_scheduler.py），排队已满时result中带retry_after
+        调用线程只阻塞在自己的消息队列上；超时或调用方提前关闭生成器时向Worker发送取消请求，
+        Worker未及时响应才会被终止
+        cancelled: 调用方的取消标志，任务登记为可取消后立即检查一次，弥补登记之前到达的cancel()
+        """
+        yield from self._stream(lambda emit: self._execute(task, timeout, emit, tenant, priority),
+                                1, timeout, task.get("task_id"), cancelled)
+
+    def check_busy(self, tenant: str = DEFAULT_TENANT) -> Optional[SchedulerBusy]:
+        """提交前检查排队是否已满，已满时返回SchedulerBusy（含retry_after），可从任意线程调用"""
+        async def check() -> Optional[SchedulerBusy]:
+            return self._slots.check(tenant)
+
+        return asyncio.run_coroutine_threadsafe(check(), self._loop).result(timeout=5)
+
+    def cancel(self, task_id: str) -> bool:
+        """
+        取消stream()中排队或执行中的任务，可从任意线程调用；Worker上的任务收到取消请求，未及时响应时Worker被终止
+        对应的stream()随即抛出WorkerError；任务不存在或已结束时返回False
+        """
+        future = self._cancellable.get(task_id)
+        return future is not None and future.cancel()
+
+    def stream_batch(self, tasks: list[dict], timeout: float,
+                     max_concurrency: int = DEFAULT_POOL_SIZE, tenant: str = DEFAULT_TENANT,
+                     priority: str = PRIORITY_BATCH) -> Generator[dict, None, None]:
+        """
+        并发执行一批任务，按完成先后产出各任务的progress/result消息（通过task_id区分）
+        同时执行的任务数不超过max_concurrency和进程池大小；timeout是单个任务的截止时间，
+        从该任务开始执行时计算，不包含等待同批其他任务的时间；同批任务默认按batch优先级调度
+        """
+        concurrency = max(1, min(max_concurrency, self.size))
+        rounds = -(-len(tasks) // concurrency)
+        yield from self._stream(lambda emit: self._execute_batch(tasks, timeout, concurrency, emit, tenant, priority),
+                                len(tasks), timeout * max(1, rounds))
+
+    async def _execute_batch(self, tasks: list[dict], timeout: float, concurrency: int,
+                             emit: Callable[[dict], None], tenant: str, priority: str) -> None:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run_one(task: dict) -> None:
+            async with semaphore:
+                await self._execute(task, timeout, emit, tenant, priority)
+
+        await asyncio.gather(*(run_one(task) for task in tasks))
+
+    def _stream(self, start: Callable[[Callable[[dict], None]], Any], expected_results: int,
+                timeout: float, task_id: Optional[str] = None,
+                cancelled: Optional[Callable[[], bool]] = None) -> Generator[dict, None, None]:
+        """
+        在监督循环中运行start(emit)，把产生的消息转交给调用线程，收到expected_results个结果后结束
+        传入task_id时可通过cancel(task_id)取消
+        """
+        if self._closed:
+            raise WorkerError("进程池已关闭")
+
+        messages: "queue.Queue[dict]" = queue.Queue()
+        future = asyncio.run_coroutine_threadsafe(start(messages.put), self._loop)
+        if task_id is not None:
+            self._cancellable[task_id] = future
+        # 调用方先置取消标志再调用cancel()：登记之前到达的取消在这里生效，排队中的任务不会再占用Worker
+        if cancelled is not None and cancelled():
+            future.cancel()
+        # 截止时间由监督循环负责，这里只做兜底，防止监督线程异常时调用方永久阻塞
+        fallback_deadline = time.monotonic() + timeout + CANCEL_GRACE_SECONDS + self.start_timeout + 30
+
+        remaining = expected_results
+        try:
+            while remaining > 0:
+                try:
+                    message = messages.get(timeout=1.0)
+                except queue.Empty:
+                    if future.cancelled():
+                        raise WorkerError("任务已取消")
+                    if future.done() and future.exception() is not None:
+                        raise WorkerError(f"监督循环执行失败: {future.exception()}")
+                    if time.monotonic() > fallback_deadline:
+                        raise WorkerError("等待任务结果超时")
+                    continue
+                if message.get("type") == "result":
+                    remaining -= 1
+                yield message
+        finally:
+            if task_id is not None:
+                self._cancellable.pop(task_id, None)
+            if remaining > 0:
+                future.cancel()
+
+    def snapshot(self) -> dict[str, Any]:
+        stats = dict(self.stats)
+        tasks = stats["tasks"]
+        stats["queue_wait_ms_avg"] = round(stats["queue_wait_ms_total"] / tasks, 1) if tasks else 0.0
+        stats["size"] = self.size
+        stats["queued"] = self._queued
+        stats["in_flight"] = self._in_flight
+        stats["scheduler"] = self._slots.snapshot()
+        return stats
+
+    def _write_metrics(self) -> None:
+        """把进程池与调度指标原子写入<目录>/pool_<pid>.prom，由监督循环在有新任务后定期调用"""
+        self._metrics_dirty = False
+        labels = f'pid="{os.getpid()}"'
+        lines = [
+            f"browser_pool_size{{{labels}}} {self.size}",
+            f"browser_pool_in_flight{{{labels}}} {self._in_flight}",
+            f"browser_pool_tasks_total{{{labels}}} {self.stats['tasks']}",
+            f"browser_pool_rejected_memory_total{{{labels}}} {self.stats['tasks_rejected_memory']}",
+        ]
+        try:
+            self._metrics_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self._metrics_path.with_suffix(".tmp")
+            tmp_path.write_text("\n".join(lines) + "\n" + self._slots.render_prometheus(labels), encoding="utf-8")
+            os.replace(tmp_path, self._metrics_path)
+        except OSError as e:
+            print(f"⚠️ 写入进程池指标文件失败: {e}")
+
+    async def _shutdown(self) -> None:
+        self._closed = True
+        await asyncio.gather(*(worker.stop() for worker in list(self._workers)), return_exceptions=True)
+        self._workers.clear()
+        if self._fork_server is not None:
+            await self._fork_server.stop()
+        try:
+            self._metrics_path.unlink()
+        except OSError:
+            pass
+
+    def shutdown(self) -> None:
+        if self._closed:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result(timeout=30)
+        except Exception as e:
+            print(f"⚠️ 关闭Worker池时出错: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+_pool: Optional[WorkerPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_worker_pool() -> WorkerPool:
+    """获取进程内共享的Worker池（首次调用时创建并预热）"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkerPool()
+            _pool.prewarm()
+            atexit.register(_pool.shutdown)
+        return _pool